@@ -0,0 +1,339 @@
+"""tinywin benchmark suite
+
+Runs the core tinywin operations against a headless terminal and reports throughput (ops/sec) and peak
+memory as JSON, so results can be compared between releases:
+    python tests/benchmarks.py --output bench.json
+    python tests/benchmarks.py --quick --filter scroll_pane
+
+Each benchmark is timed without tracing first, then a single extra iteration is run under tracemalloc to
+measure peak memory.
+"""
+import os
+import sys
+import gc
+import json
+import time
+import argparse
+import tempfile
+import platform
+import tracemalloc
+import itertools
+import curses
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from tinywin import screen, panes, core, headless
+
+
+def make_lines(count):
+    return [core.Text_Line('Job ', curses.color_pair(7), f'{i} ', curses.color_pair(2), 'running on build host', curses.color_pair(1)) for i in range(0, count)]
+
+
+def make_scroll_pane(term, lines, scroll_type=panes.Scroll_Pane_Type.MULTI_SELECT, height=40, width=100, virtualized=False):
+    pane = panes.Scroll_Pane(scroll_type, title='Benchmark', virtualized=virtualized)
+    pane.set_contents(lines)
+    pane.assign_win(term.stdscr.derwin(height, width, 0, 0))
+    pane.focus()
+    return pane
+
+
+class Benchmark(object):
+    def __init__(self, name, setup, run, params=None, min_time=0.5, max_iterations=100000):
+        self.name = name
+        self.setup = setup
+        self.run = run
+        self.params = params if params is not None else {}
+        self.min_time = min_time
+        self.max_iterations = max_iterations
+
+    def measure(self):
+        state = self.setup()
+        gc.collect()
+        iterations = 0
+        start = time.perf_counter()
+        elapsed = 0
+        while elapsed < self.min_time and iterations < self.max_iterations:
+            self.run(state)
+            iterations = iterations + 1
+            elapsed = time.perf_counter() - start
+
+        tracemalloc.start()
+        tracemalloc.reset_peak()
+        self.run(state)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        return {
+            'name': self.name,
+            'params': self.params,
+            'iterations': iterations,
+            'seconds': elapsed,
+            'seconds_per_op': elapsed / iterations,
+            'ops_per_sec': iterations / elapsed,
+            'peak_memory_bytes': peak,
+        }
+
+
+def set_contents_benchmarks(sizes):
+    benchmarks = []
+    for virtualized in [False, True]:
+        for size in sizes:
+            def setup(size=size, virtualized=virtualized):
+                term = headless.Virtual_Terminal(50, 120)
+                lines = make_lines(size)
+                return (term, make_scroll_pane(term, lines, virtualized=virtualized), lines)
+
+            def run(state):
+                _, pane, lines = state
+                pane.set_contents(lines)
+
+            benchmarks.append(Benchmark('scroll_pane.set_contents', setup, run, params={'lines': size, 'virtualized': virtualized}, max_iterations=1000))
+    return benchmarks
+
+
+def append_contents_benchmarks(sizes):
+    benchmarks = []
+    for size in sizes:
+        def setup(size=size):
+            term = headless.Virtual_Terminal(50, 120)
+            pane = make_scroll_pane(term, make_lines(size), virtualized=True)
+            return {'pane': pane, 'new_lines': make_lines(5)}
+
+        def run(state):
+            # Append a few rows and drop as many from the top, like a live feed
+            state['pane'].append_contents(state['new_lines'])
+            state['pane'].remove_contents(0, len(state['new_lines']))
+
+        benchmarks.append(Benchmark('scroll_pane.append_contents', setup, run, params={'lines': size, 'rows_per_op': 5}))
+    return benchmarks
+
+
+def log_pane_benchmarks(capacities):
+    benchmarks = []
+    for capacity in capacities:
+        def setup(capacity=capacity):
+            term = headless.Virtual_Terminal(50, 120)
+            pane = panes.Log_Pane(capacity=capacity, title='Benchmark')
+            pane.assign_win(term.stdscr.derwin(40, 100, 0, 0))
+            # Start full, so every append also evicts
+            pane.append_lines(make_lines(capacity))
+            return {'pane': pane, 'new_lines': make_lines(100)}
+
+        def run(state):
+            state['pane'].append_lines(state['new_lines'])
+            state['pane'].draw()
+
+        benchmarks.append(Benchmark('log_pane.append_lines', setup, run, params={'capacity': capacity, 'lines_per_op': 100}))
+    return benchmarks
+
+
+def file_view_benchmarks(sizes):
+    benchmarks = []
+    for size in sizes:
+        def setup(size=size):
+            f = tempfile.NamedTemporaryFile('w', suffix='.log', delete=False)
+            for line in make_lines(size):
+                f.write(str(line) + '\n')
+            f.close()
+            term = headless.Virtual_Terminal(50, 120)
+            pane = panes.File_View_Pane(f.name, title='Benchmark')
+            pane.assign_win(term.stdscr.derwin(40, 100, 0, 0))
+            while not pane.get_indexing_done():
+                time.sleep(0.01)
+                pane.process(time.time())
+            os.unlink(f.name)
+            return {'pane': pane, 'size': size, 'line': 0}
+
+        def run(state):
+            # Jump around the file, so most rows miss the line cache
+            state['line'] = (state['line'] + 7919) % state['size']
+            state['pane'].goto_line(state['line'])
+            state['pane'].draw()
+
+        benchmarks.append(Benchmark('file_view_pane.goto_line', setup, run, params={'lines': size}))
+    return benchmarks
+
+
+def selection_benchmarks(sizes):
+    benchmarks = []
+    for size in sizes:
+        def setup(size=size):
+            term = headless.Virtual_Terminal(50, 120)
+            pane = make_scroll_pane(term, make_lines(size), virtualized=True)
+            return {'pane': pane, 'keys': [32, 258, 32, 1, 0, 27]}  # Space, Down, Space, control-a, control-space, Escape
+
+        def run(state):
+            for k in state['keys']:
+                state['pane'].key_input(screen.Input_Event(k))
+
+        benchmarks.append(Benchmark('scroll_pane.selection_keys', setup, run, params={'lines': size, 'keys_per_op': 6}))
+    return benchmarks
+
+
+def scroll_draw_benchmarks(sizes):
+    benchmarks = []
+    for size in sizes:
+        def setup(size=size):
+            term = headless.Virtual_Terminal(50, 120)
+            pane = make_scroll_pane(term, make_lines(size), virtualized=True)
+            pane.draw()
+            return {'pane': pane, 'step': 1}
+
+        def run(state):
+            pane = state['pane']
+            if pane.get_cursor() >= pane._num_options - 1:
+                state['step'] = -1
+            elif pane.get_cursor() <= 0:
+                state['step'] = 1
+            pane._step_by(state['step'], screen.Input_Event(-1))
+            pane.draw()
+
+        benchmarks.append(Benchmark('scroll_pane.draw_scrolling', setup, run, params={'lines': size}))
+    return benchmarks
+
+
+def process_resize_benchmarks(grids):
+    benchmarks = []
+    for divs, constraints in [(divs, constraints) for divs in grids for constraints in (False, True)]:
+        def setup(divs=divs, constraints=constraints):
+            term = headless.Virtual_Terminal(120, 240)
+            layout = screen.Layout()
+            if constraints:
+                sizes = [screen.Fixed_Size(20)] + [screen.Proportional_Size(i + 1, min_size=5) for i in range(1, divs)]
+                layout.set_size(divs, divs, columns=sizes, rows=sizes)
+            else:
+                layout.set_size(divs, divs)
+            for x in range(0, divs):
+                for y in range(0, divs):
+                    pane = panes.Scroll_Pane(panes.Scroll_Pane_Type.SINGLE_SELECT, title=f'{x},{y}')
+                    pane.set_contents(make_lines(100))
+                    layout.add_pane(pane, x, y, 1, 1)
+            layout.assign_win(term.stdscr)
+            layout.calculate_all_pane_windows()
+            return {'term': term, 'layout': layout, 'sizes': [(120, 240), (110, 220)], 'index': 0}
+
+        def run(state):
+            state['index'] = (state['index'] + 1) % len(state['sizes'])
+            state['term'].stdscr.resize(*state['sizes'][state['index']])
+            state['layout'].process_resize()
+
+        benchmarks.append(Benchmark('layout.process_resize', setup, run, params={'panes': divs * divs, 'constraints': constraints}))
+    return benchmarks
+
+
+def key_dispatch_benchmarks(grids):
+    benchmarks = []
+    for divs, focused_key_input in itertools.product(grids, (False, True)):
+        def setup(divs=divs, focused_key_input=focused_key_input):
+            term = headless.Virtual_Terminal(120, 240)
+            layout = screen.Layout()
+            layout.set_size(divs, divs + 1)
+            keys = iter('abcdefghijklmnopqrstuvwxyz0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ')
+            for x in range(0, divs):
+                for y in range(0, divs):
+                    pane = panes.Scroll_Pane(panes.Scroll_Pane_Type.SINGLE_SELECT, title=f'{x},{y}')
+                    pane.set_contents(make_lines(100))
+                    layout.add_pane(pane, x, y, 1, 1, focus_key=next(keys))
+            items = [core.Menu_Item(f'Item {i}', lambda: None, hotkey=next(keys)) for i in range(0, divs)]
+            layout.add_pane(panes.Menu_Pane(*items), 0, divs, divs, 1)
+            layout.assign_win(term.stdscr)
+            scr = screen.Screen(term.stdscr, sub_screen=True, focused_key_input=focused_key_input)
+            scr.build(layout)
+            # A focus key, a menu hotkey and a key that nothing binds
+            return {'screen': scr, 'keys': [ord('a'), items[-1].get_hotkey(), ord('~')]}
+
+        def run(state):
+            for key in state['keys']:
+                state['screen'].key_input(screen.Input_Event(key))
+
+        benchmarks.append(Benchmark('screen.key_input', setup, run, params={'panes': divs * divs + 1,
+                                                                           'focused_key_input': focused_key_input}))
+    return benchmarks
+
+
+def tab_focus_benchmarks(counts):
+    benchmarks = []
+    for count in counts:
+        def setup(count=count):
+            term = headless.Virtual_Terminal(120, 240)
+            layout = screen.Layout()
+            layout.set_size(count, 1)
+            for x in range(0, count):
+                layout.add_pane(panes.Scroll_Pane(panes.Scroll_Pane_Type.SINGLE_SELECT, title=str(x)), x, 0, 1, 1)
+            layout.assign_win(term.stdscr)
+            scr = screen.Screen(term.stdscr, sub_screen=True)
+            scr.build(layout)
+            return {'layout': layout}
+
+        def run(state):
+            state['layout'].key_input(screen.Input_Event(9))
+
+        benchmarks.append(Benchmark('tab_chain.tab_forward', setup, run, params={'panes': count}))
+    return benchmarks
+
+
+def shorten_benchmarks():
+    def setup():
+        return {'lines': make_lines(1000), 'widths': [20, 30]}
+
+    def run(state):
+        for w in state['widths']:
+            for l in state['lines']:
+                l.shorten_to_length(w)
+
+    return [Benchmark('text_line.shorten_to_length', setup, run, params={'lines_per_op': 2000})]
+
+
+def get_version():
+    try:
+        with open(os.path.join(os.path.dirname(__file__), '..', 'VERSION'), 'r') as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='tinywin benchmark suite')
+    parser.add_argument('--output', '-o', help='Write the JSON report to this file instead of stdout')
+    parser.add_argument('--filter', '-k', default='', help='Only run benchmarks whose name contains this string')
+    parser.add_argument('--quick', action='store_true', help='Skip the largest list sizes')
+    args = parser.parse_args(argv)
+
+    sizes = [1000, 100000] if args.quick else [1000, 100000, 1000000]
+    benchmarks = []
+    benchmarks.extend(set_contents_benchmarks(sizes))
+    benchmarks.extend(append_contents_benchmarks(sizes))
+    benchmarks.extend(log_pane_benchmarks(sizes))
+    benchmarks.extend(file_view_benchmarks(sizes))
+    benchmarks.extend(selection_benchmarks(sizes))
+    benchmarks.extend(scroll_draw_benchmarks(sizes))
+    benchmarks.extend(process_resize_benchmarks([2, 4, 8]))
+    benchmarks.extend(key_dispatch_benchmarks([2, 4, 6]))
+    benchmarks.extend(tab_focus_benchmarks([4, 16, 64]))
+    benchmarks.extend(shorten_benchmarks())
+
+    results = []
+    # Install the headless curses functions once; each benchmark draws to its own terminal
+    with headless.Virtual_Terminal():
+        for b in benchmarks:
+            if args.filter not in b.name:
+                continue
+            result = b.measure()
+            results.append(result)
+            sys.stderr.write(f'{result["name"]} {result["params"]}: {result["ops_per_sec"]:.1f} ops/sec, peak {result["peak_memory_bytes"] / 1024:.0f} KiB\n')
+
+    report = {
+        'tinywin_version': get_version(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output is None:
+        print(output)
+    else:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+import pytest
+
+from tinywin import headless, core, screen
+
+
+def test_text_line_shortening_keeps_the_full_text():
+    line = core.Text_Line('abcdefghij', None)
+    line.shorten_to_length(6)
+    assert line.get_shortened_length() == 6
+    assert str(line) == 'abc...' and len(line) == 6
+    assert line.get_text() == 'abcdefghij'
+
+
+def test_text_line_shortening_spans_colored_segments_and_is_cached():
+    with headless.Virtual_Terminal():
+        line = core.Text_Line('one ', 1, 'two three', 2, ellipsis_text='~')
+        line.shorten_to_length(6)
+        assert str(line) == 'one t~'
+        first = line._shortened_text_objects
+        line.shorten_to_length(20)
+        assert str(line) == 'one two three'
+        line.shorten_to_length(6)
+        assert line._shortened_text_objects is first
+        with pytest.raises(core.TerminalTooSmallError):
+            line.shorten_to_length(1)
+
+
+def test_ring_buffer_evicts_oldest():
+    rb = core.Ring_Buffer(3)
+    for i in range(0, 5):
+        rb.append(i)
+    assert len(rb) == 3
+    assert list(rb) == [2, 3, 4]
+    assert rb[0] == 2 and rb[-1] == 4
+    assert rb[1:] == [3, 4]
+    assert rb.get_evicted_count() == 2
+    with pytest.raises(IndexError):
+        rb[3]
+
+
+def test_ring_buffer_clear_and_capacity():
+    rb = core.Ring_Buffer(2)
+    rb.append('a')
+    rb.clear()
+    assert len(rb) == 0 and list(rb) == []
+    assert rb.get_capacity() == 2
+    with pytest.raises(ValueError):
+        core.Ring_Buffer(0)
+
+
+def test_keymap_tries_handlers_in_order_until_one_uses_the_key():
+    keymap = core.Keymap()
+    calls = []
+    keymap.bind('a', lambda ie: calls.append('first') or False)
+    keymap.bind('a', lambda ie: calls.append('second') or True)
+    keymap.bind('a', lambda ie: calls.append('third') or True)
+    ie = keymap.dispatch(screen.Input_Event(ord('a')))
+    assert ie.key is None
+    assert calls == ['first', 'second']
+
+    ie = keymap.dispatch(screen.Input_Event(ord('b')))
+    assert ie.key == ord('b')
+
+
+def test_keymap_owner_rebinds_and_unbinds():
+    keymap = core.Keymap()
+    owner = object()
+    calls = []
+    keymap.bind('x', lambda ie: calls.append(1) or True, owner=owner)
+    keymap.bind('x', lambda ie: calls.append(2) or True, owner=owner)
+    keymap.bind_any(lambda ie: calls.append('any') or True, owner=owner)
+    keymap.dispatch(screen.Input_Event(ord('x')))
+    assert calls == [2]
+
+    keymap.dispatch_any(screen.Input_Event(ord('y')), skip=owner)
+    assert calls == [2]
+    keymap.dispatch_any(screen.Input_Event(ord('y')))
+    assert calls == [2, 'any']
+
+    keymap.unbind(owner)
+    assert not keymap.get_bound(ord('x'))
+    assert keymap.dispatch_any(screen.Input_Event(ord('y'))).key == ord('y')
@@ -0,0 +1,67 @@
+import curses
+
+import pytest
+
+from tinywin import headless, panes, core
+
+
+def test_virtual_clock_sleeps_instantly():
+    clock = headless.Virtual_Clock(5.0)
+    clock.sleep(1.5)
+    clock.sleep(-1)
+    clock.advance(0.5)
+    assert clock.time() == 7.0
+
+
+def test_windows_write_into_the_terminal_grid():
+    with headless.Virtual_Terminal(5, 20) as term:
+        win = term.stdscr.derwin(3, 10, 1, 5)
+        win.addstr(0, 0, 'hello')
+        # Like curses, writing past the bottom-right corner clips the text and raises
+        with pytest.raises(curses.error):
+            win.addstr(2, 8, 'xyz')
+        assert win.getbegyx() == (1, 5) and win.getmaxyx() == (3, 10)
+        assert term.get_line(1) == '     hello          '
+        assert term.get_line(3) == '             xy     '
+        win.erase()
+        assert term.get_lines() == [' ' * 20] * 5
+
+
+def test_keys_arrive_in_order_at_their_scripted_times():
+    with headless.Virtual_Terminal() as term:
+        term.script_keys(['a', 'b'], interval=1.0, start=1.0)
+        term.push_keys('c')
+        assert term.read_key(0.5) == -1 and term.clock.time() == 0.5
+        assert term.read_key(None) == ord('a') and term.clock.time() == 1.0
+        assert not term.wait_for_input(0.5)
+        assert term.wait_for_input(1.0) and term.clock.time() == 2.0
+        term.flush_input()
+        # 'c' was queued after 'b', so it could not arrive before it and was flushed with it
+        assert term.pending_keys() == 0
+
+
+def test_resize_keeps_contents_and_queues_key_resize():
+    with headless.Virtual_Terminal(4, 10) as term:
+        term.stdscr.addstr(0, 0, 'abcdefghij')
+        term.resize(6, 5)
+        assert term.get_size() == (6, 5)
+        assert term.get_lines() == ['abcde'] + [' ' * 5] * 5
+        assert term.read_key(0) == curses.KEY_RESIZE
+
+
+def test_screen_runs_headless_until_the_exit_key():
+    with headless.Virtual_Terminal(10, 40) as term:
+        class App(panes.Screen_Pane):
+            def __init__(self):
+                super(App, self).__init__()
+                self.configure_layout(1, 1)
+                pane = panes.Scroll_Pane(panes.Scroll_Pane_Type.SINGLE_SELECT, title='Items')
+                pane.set_contents([core.Text_Line(f'item {i}', None) for i in range(0, 20)])
+                self.add_pane(pane, 0, 0, 1, 1)
+
+        term.script_keys(['q'], start=1.0)
+        App().run_as_top_level(term.stdscr, log_file=None)
+        lines = term.get_lines()
+    assert term.clock.time() >= 1.0
+    assert any('Items' in l for l in lines)
+    assert any('item 0' in l for l in lines)
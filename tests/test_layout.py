@@ -0,0 +1,130 @@
+from tinywin import headless, panes, screen
+
+
+def make_layout(term, x_divs, y_divs, placements, **kwargs):
+    layout = screen.Layout()
+    layout.set_size(x_divs, y_divs, **kwargs)
+    layout_panes = []
+    for (x, y, w, h) in placements:
+        pane = panes.Scroll_Pane(panes.Scroll_Pane_Type.READ_ONLY)
+        layout.add_pane(pane, x, y, w, h)
+        layout_panes.append(pane)
+    layout.assign_win(term.stdscr)
+    layout.calculate_all_pane_windows()
+    return layout, layout_panes
+
+
+def geometry(pane):
+    return pane._base_win.getbegyx() + pane._base_win.getmaxyx()
+
+
+def run_resize(settle_time):
+    """Resizes a screen with a fixed and a proportional column, and returns the panes drawn and cleared for it"""
+    with headless.Virtual_Terminal(20, 80) as term:
+        layout, (fixed, stretched) = make_layout(term, 2, 1, [(0, 0, 1, 1), (1, 0, 1, 1)],
+                                                 columns=[screen.Fixed_Size(20), screen.Proportional_Size()])
+        for p in (fixed, stretched):
+            p.set_contents(['line'])
+        s = screen.Screen(term.stdscr, resize_settle_time=settle_time)
+        s.build(layout)
+        for _ in range(0, 5):
+            s.frame()
+        drawn, cleared = [], []
+        for p in (fixed, stretched):
+            p.draw = lambda p=p, draw=p.draw: (drawn.append(p) if p.get_needs_drawing() else None, draw())
+            p.clear = lambda p=p, clear=p.clear: (cleared.append(p), clear())
+
+        term.resize(20, 60)
+        while term.pending_keys() > 0 or s.get_resize_pending():
+            s.frame()
+        s.frame()
+        assert geometry(fixed) == (0, 0, 20, 20) and geometry(stretched) == (0, 20, 20, 40)
+        return [p is stretched for p in drawn], [p is stretched for p in cleared]
+
+
+def test_relayout_after_the_placeholder_redraws_every_pane_without_clearing():
+    drawn, cleared = run_resize(0.15)
+    assert sorted(drawn) == [False, True] and cleared == []
+
+
+def test_relayout_without_the_placeholder_only_redraws_changed_panes():
+    drawn, cleared = run_resize(0)
+    assert drawn == [True] and cleared == [True]
+
+
+def test_solve_sizes_fixed_and_proportional():
+    assert screen.solve_sizes(100, [screen.Fixed_Size(20), screen.Proportional_Size(), screen.Proportional_Size(3)]) == [0, 20, 40, 100]
+
+
+def test_solve_sizes_respects_bounds_and_fills_exactly():
+    sizes = [screen.Proportional_Size(max_size=10), screen.Proportional_Size(), screen.Proportional_Size(min_size=50)]
+    assert screen.solve_sizes(90, sizes) == [0, 10, 40, 90]
+    # Rounding remainders go to the largest fractions, so the total is filled exactly
+    assert screen.solve_sizes(10, [screen.Proportional_Size()] * 3)[-1] == 10
+
+
+def test_solve_sizes_cuts_off_what_does_not_fit():
+    assert screen.solve_sizes(10, [screen.Fixed_Size(8), screen.Proportional_Size(min_size=5)]) == [0, 8, 10]
+
+
+def test_even_grid_last_row_and_column_fill_the_window():
+    with headless.Virtual_Terminal(21, 81) as term:
+        _, (a, b, c) = make_layout(term, 2, 2, [(0, 0, 1, 1), (1, 0, 1, 1), (0, 1, 2, 1)])
+        assert geometry(a) == (0, 0, 10, 40)
+        assert geometry(b) == (0, 40, 10, 41)
+        assert geometry(c) == (10, 0, 11, 80)
+
+
+def test_constraint_layout_geometry_and_resize():
+    with headless.Virtual_Terminal(30, 100) as term:
+        columns = [screen.Fixed_Size(20), screen.Proportional_Size(), screen.Proportional_Size(2)]
+        rows = [screen.Proportional_Size(), screen.Fixed_Size(5)]
+        layout, (side, top, bottom) = make_layout(term, 3, 2, [(0, 0, 1, 2), (1, 0, 2, 1), (1, 1, 2, 1)],
+                                                  columns=columns, rows=rows)
+        assert geometry(side) == (0, 0, 30, 20)
+        assert geometry(top) == (0, 20, 25, 80)
+        assert geometry(bottom) == (25, 20, 5, 80)
+
+        term.stdscr.resize(20, 50)
+        layout.process_resize()
+        assert geometry(side) == (0, 0, 20, 20)
+        assert geometry(top) == (0, 20, 15, 30)
+        assert geometry(bottom) == (15, 20, 5, 30)
+
+
+def test_focus_manager_only_touches_the_two_panes_involved():
+    with headless.Virtual_Terminal(20, 90) as term:
+        layout, (a, b, c) = make_layout(term, 3, 1, [(0, 0, 1, 1), (1, 0, 1, 1), (2, 0, 1, 1)])
+        assert layout.get_focused_pane() is a
+        for p in (a, b, c):
+            p._needs_drawing = False
+
+        layout.get_focus_manager().focus(c)
+        assert layout.get_focused_pane() is c
+        assert [p.get_focus() for p in (a, b, c)] == [False, False, True]
+        assert [p.get_needs_drawing() for p in (a, b, c)] == [True, False, True]
+
+        b.focus()
+        assert layout.get_focused_pane() is b and not c.get_focus()
+
+        layout.unfocus_all()
+        assert layout.get_focused_pane() is None and not b.get_focus()
+
+
+def test_tab_chain_wraps_and_follows_reordering():
+    with headless.Virtual_Terminal(20, 90) as term:
+        layout, (a, b, c) = make_layout(term, 3, 1, [(0, 0, 1, 1), (1, 0, 1, 1), (2, 0, 1, 1)])
+        chain = screen.Tab_Chain(a, b, c)
+        layout.add_tab_order(chain)
+
+        assert chain.tab_forward() and layout.get_focused_pane() is b
+        assert chain.tab_forward() and chain.tab_forward() and layout.get_focused_pane() is a
+        assert chain.tab_back() and layout.get_focused_pane() is c
+
+        chain.chain_order.reverse()
+        assert chain.tab_forward() and layout.get_focused_pane() is b
+
+        no_wrap = screen.Tab_Chain(a, b, wrap=False)
+        layout.add_tab_order(no_wrap)
+        a.focus()
+        assert not no_wrap.tab_back() and layout.get_focused_pane() is a
@@ -0,0 +1,164 @@
+import curses
+
+from tinywin import headless, panes, core
+
+
+class Probe_Pane(panes.Scroll_Pane):
+    """A Scroll_Pane that runs scripted actions once the frame loop reaches their times"""
+    def __init__(self, name, actions=None, **kwargs):
+        super(Probe_Pane, self).__init__(panes.Scroll_Pane_Type.SINGLE_SELECT, title=name, **kwargs)
+        self.set_contents([core.Text_Line(f'{name} {i}', None) for i in range(0, 40)])
+        self._actions = sorted((actions or {}).items())
+
+    def process(self, time):
+        super(Probe_Pane, self).process(time)
+        while len(self._actions) > 0 and time >= self._actions[0][0]:
+            self._actions.pop(0)[1]()
+
+
+class App(panes.Screen_Pane):
+    def __init__(self, left, right):
+        super(App, self).__init__(border_style=core.Screen_Border_Style.BORDERLESS)
+        self.configure_layout(2, 1)
+        self.add_pane(left, 0, 0, 1, 1)
+        self.add_pane(right, 1, 0, 1, 1)
+
+
+def run(term, left=None, right=None, event_driven=False):
+    left = Probe_Pane('left') if left is None else left
+    right = Probe_Pane('right') if right is None else right
+    App(left, right).run_as_top_level(term.stdscr, event_driven=event_driven, log_file=None)
+    return left, right
+
+
+def column(lines, start, end):
+    return [l[start:end] for l in lines]
+
+
+def test_exit_key_ends_the_frame_loop():
+    for event_driven in (False, True):
+        with headless.Virtual_Terminal(20, 80) as term:
+            term.script_keys(['q'], start=1.0)
+            run(term, event_driven=event_driven)
+            assert 1.0 <= term.clock.time() < 1.5
+
+
+def test_arrow_keys_move_the_focused_cursor():
+    with headless.Virtual_Terminal(20, 80) as term:
+        term.script_keys([curses.KEY_DOWN] * 3 + ['q'])
+        left, right = run(term)
+        lines = term.get_lines()
+    assert left.get_cursor() == 3 and right.get_cursor() == 0
+    assert any('>3:' in l for l in column(lines, 0, 40))
+    assert any('>0:' in l for l in column(lines, 40, 80))
+
+
+def test_typeahead_is_read_in_one_frame_without_dropping_keys():
+    with headless.Virtual_Terminal(20, 80) as term:
+        term.push_keys(9, curses.KEY_DOWN, curses.KEY_DOWN, 'q')
+        left, right = run(term)
+        assert term.pending_keys() == 0 and term.clock.time() < 0.1
+    assert not left.get_focus() and right.get_focus()
+    assert left.get_cursor() == 0 and right.get_cursor() == 2
+
+
+def test_filter_typing_captures_exit_key():
+    with headless.Virtual_Terminal(20, 80) as term:
+        left = Probe_Pane('left', searchable=True)
+        left.set_contents([core.Text_Line(w, None) for w in ['apple', 'quince', 'pear', 'quail']])
+        term.script_keys(['/', 'q', 'u', 'a', 10, curses.KEY_DOWN], start=0.5)
+        term.script_keys(['q'], start=2.0)
+        run(term, left=left)
+        lines = column(term.get_lines(), 0, 40)
+    assert term.clock.time() >= 2.0
+    assert left.get_filter() == 'qua'
+    assert left.get_cursor() == 3
+    assert any('quail' in l for l in lines) and not any('apple' in l for l in lines)
+    assert any('/qua (1 of 4)' in l for l in lines)
+
+
+def test_resize_shows_placeholder_until_it_settles():
+    snapshots = {}
+    with headless.Virtual_Terminal(20, 80) as term:
+        def snapshot(name):
+            return lambda: snapshots.setdefault(name, term.get_lines())
+        # Keys arrive in the order they were queued, so the exit key is queued after the resize
+        left = Probe_Pane('left', {0.5: lambda: term.resize(16, 60), 0.55: snapshot('settling'),
+                                   1.0: snapshot('settled'), 1.5: lambda: term.push_keys('q')})
+        run(term, left=left)
+
+    assert len(snapshots['settling']) == 16
+    assert snapshots['settling'][8].strip() == '60 x 16'
+    settled = snapshots['settled']
+    assert all(len(l) == 60 for l in settled)
+    assert any('left 0' in l for l in column(settled, 0, 30))
+    assert any('right 0' in l for l in column(settled, 30, 60))
+
+
+def test_resize_storm_relayouts_once():
+    relayouts = []
+    with headless.Virtual_Terminal(20, 80) as term:
+        actions = {0.5 + i * 0.05: (lambda i=i: term.resize(20 - i, 80 - i)) for i in range(0, 5)}
+        actions[2.0] = lambda: term.push_keys('q')
+        left = Probe_Pane('left', actions)
+        orig = left.window_size_update
+        left.window_size_update = lambda: (relayouts.append(term.get_size()), orig())
+        run(term, left=left)
+    assert relayouts == [(16, 76)]
+
+
+def test_focus_key_and_menu_hotkey():
+    clicked = []
+    with headless.Virtual_Terminal(20, 80) as term:
+        class Menu_App(panes.Screen_Pane):
+            def __init__(self):
+                super(Menu_App, self).__init__(border_style=core.Screen_Border_Style.BORDERLESS)
+                self.configure_layout(2, 2)
+                self.left = Probe_Pane('left')
+                self.right = Probe_Pane('right')
+                self.add_pane(self.left, 0, 0, 1, 1, focus_key='1')
+                self.add_pane(self.right, 1, 0, 1, 1, focus_key='2')
+                self.add_pane(panes.Menu_Pane(core.Menu_Item('Go', lambda: clicked.append(term.clock.time()), hotkey='g')), 0, 1, 2, 1)
+
+        term.script_keys(['2', curses.KEY_DOWN, 'g', 'q'], interval=0.1)
+        app = Menu_App()
+        app.run_as_top_level(term.stdscr, log_file=None)
+    assert app.right.get_focus() and not app.left.get_focus()
+    assert app.right.get_cursor() == 1 and app.left.get_cursor() == 0
+    assert len(clicked) == 1
+
+
+class Reload_Pane(Probe_Pane):
+    """Handles a global 'r' hotkey in key_input, whether or not it is focused"""
+    def __init__(self, name):
+        super(Reload_Pane, self).__init__(name)
+        self.reloads = 0
+
+    def key_input(self, input_event):
+        if input_event.key == ord('r'):
+            self.reloads = self.reloads + 1
+            input_event.absorb()
+            return input_event
+        return super(Reload_Pane, self).key_input(input_event)
+
+
+class Reload_All_Keys_Pane(Reload_Pane):
+    RECEIVES_ALL_KEYS = True
+
+
+def test_unbound_keys_reach_unfocused_panes_by_default():
+    with headless.Virtual_Terminal(20, 80) as term:
+        term.script_keys(['r', curses.KEY_DOWN, 'q'])
+        right = Reload_Pane('right')
+        App(Probe_Pane('left'), right).run_as_top_level(term.stdscr, log_file=None)
+    assert right.reloads == 1 and not right.get_focus()
+
+
+def test_focused_key_input_only_offers_keys_to_the_focused_pane():
+    for right, reloads in ((Reload_Pane('right'), 0), (Reload_All_Keys_Pane('right'), 1)):
+        with headless.Virtual_Terminal(20, 80) as term:
+            term.script_keys(['r', curses.KEY_DOWN, 'q'])
+            left = Probe_Pane('left')
+            App(left, right).run_as_top_level(term.stdscr, log_file=None, focused_key_input=True)
+        assert right.reloads == reloads
+        assert left.get_cursor() == 1 and right.get_cursor() == 0
@@ -0,0 +1,227 @@
+import curses
+import time
+
+import pytest
+
+from tinywin import headless, panes, core, screen, tasks
+
+
+def make_pane(term, lines, scroll_type=panes.Scroll_Pane_Type.MULTI_SELECT, **kwargs):
+    pane = panes.Scroll_Pane(scroll_type, title='T', **kwargs)
+    pane.assign_win(term.stdscr.derwin(12, 60, 0, 0))
+    pane.set_contents(lines)
+    pane.focus()
+    return pane
+
+
+def draw(term, pane):
+    pane.draw()
+    core.present(pane._base_win)
+    return term.get_lines()
+
+
+def test_virtualized_pane_converts_lines_as_they_are_drawn():
+    with headless.Virtual_Terminal(12, 60) as term:
+        lines = [f'row {i}' for i in range(0, 1000)]
+        pane = make_pane(term, lines, scroll_type=panes.Scroll_Pane_Type.SINGLE_SELECT, virtualized=True)
+        assert isinstance(lines[500], str)
+        drawn = draw(term, pane)
+        assert any('row 0' in l for l in drawn)
+        assert isinstance(lines[0], core.Text_Line) and isinstance(lines[500], str)
+
+
+def press(pane, *keys):
+    for k in keys:
+        pane.key_input(screen.Input_Event(ord(k) if isinstance(k, str) else k))
+
+
+def test_insert_and_remove_keep_cursor_and_selection():
+    with headless.Virtual_Terminal(12, 60) as term:
+        pane = make_pane(term, [f'line {i}' for i in range(0, 10)])
+        press(pane, 258, 258, 258, ' ')
+        assert pane.get_cursor() == 3 and pane.get_selected() == [3]
+        pane.insert_contents(0, ['new a', 'new b'])
+        assert pane.get_cursor() == 5 and pane.get_selected() == [5]
+        pane.remove_contents(0, 4)
+        assert pane.get_cursor() == 1 and pane.get_selected() == [1]
+        pane.update_contents(1, 'replaced')
+        assert str(pane.get_contents()[1]) == 'replaced'
+        assert any('replaced' in l for l in draw(term, pane))
+
+
+def test_contents_methods_without_contents():
+    pane = panes.Scroll_Pane(panes.Scroll_Pane_Type.SINGLE_SELECT)
+    pane.remove_contents(0)
+    with pytest.raises(IndexError):
+        pane.update_contents(0, 'x')
+    pane.append_contents(['first'])
+    assert [str(l) for l in pane.get_contents()] == ['first']
+
+
+def test_selection_model_ranges():
+    s = panes.Selection_Model(10)
+    s.toggle_range(2, 5)
+    s.toggle(3)
+    assert s.get_selected() == [2, 4]
+    assert s.count() == 2 and s.first() == 2
+    assert s.has_selection_in(3, 4) is False and s.has_selection_in(0, 3)
+    s.invert()
+    assert s.count() == 8 and not s.is_selected(2)
+    s.clear()
+    assert s.get_selected() == [] and s.first() == -1
+
+
+def test_selection_model_follows_inserts_and_removes():
+    s = panes.Selection_Model(10)
+    s.set(5, True)
+    s.set(6, True)
+    s.insert(2, 3)
+    assert s.get_selected() == [8, 9] and s.get_length() == 13
+    s.remove(0, 9)
+    assert s.get_selected() == [0] and s.get_length() == 4
+
+
+def send_selection_keys(term, pane):
+    """Sends every selection key to a read only pane, which has no cursor or selection to change"""
+    for key in (' ', '+', '-', '_', 27, 1, 0):
+        ie = pane.key_input(screen.Input_Event(ord(key) if isinstance(key, str) else key))
+        assert ie.key is not None
+    term.push_mouse(5, 3, curses.BUTTON1_CLICKED)
+    pane.key_input(screen.Input_Event(term.read_key(0)))
+    return draw(term, pane)
+
+
+def test_log_pane_ignores_selection_keys():
+    with headless.Virtual_Terminal(12, 60) as term:
+        pane = panes.Log_Pane(capacity=5, title='Log')
+        pane.assign_win(term.stdscr.derwin(12, 60, 0, 0))
+        pane.append_lines([f'entry {i}' for i in range(0, 8)])
+        pane.focus()
+        lines = send_selection_keys(term, pane)
+    assert any('entry 7' in l for l in lines) and not any('entry 2' in l for l in lines)
+
+
+def make_file_view(term, tmp_path, count):
+    path = tmp_path / 'view.txt'
+    path.write_text(''.join(f'file line {i}\n' for i in range(0, count)))
+    pane = panes.File_View_Pane(str(path))
+    pane.assign_win(term.stdscr.derwin(12, 60, 0, 0))
+    pane.focus()
+    deadline = time.time() + 5
+    while not pane.get_indexing_done() and time.time() < deadline:
+        pane.process(time.time())
+    return pane
+
+
+def test_file_view_pane_ignores_selection_keys(tmp_path):
+    with headless.Virtual_Terminal(12, 60) as term:
+        pane = make_file_view(term, tmp_path, 100)
+        lines = send_selection_keys(term, pane)
+        pane.close()
+    assert pane.get_line_count() == 100
+    assert any('file line 0' in l for l in lines)
+
+
+def test_file_view_pane_is_only_released_when_closed(tmp_path):
+    with headless.Virtual_Terminal(12, 60) as term:
+        pane = make_file_view(term, tmp_path, 1000)
+        pane.cancel_tasks()
+        pane.goto_line(500)
+        assert any('file line 500' in l for l in draw(term, pane))
+
+        assert not pane._file_lines._file.closed
+
+
+def test_file_view_pane_is_closed_with_the_screen(tmp_path):
+    path = tmp_path / 'view.txt'
+    path.write_text('only line\n')
+    with headless.Virtual_Terminal(12, 60) as term:
+        app = panes.Screen_Pane()
+        app.configure_layout(1, 1)
+        pane = panes.File_View_Pane(str(path))
+        app.add_pane(pane, 0, 0, 1, 1)
+        term.script_keys(['q'], start=0.5)
+        app.run_as_top_level(term.stdscr, log_file=None)
+        assert any('only line' in l for l in term.get_lines())
+    assert pane._file_lines._file.closed
+
+
+def wait_for_tasks(done):
+    deadline = time.time() + 5
+    while not done() and time.time() < deadline:
+        time.sleep(0.01)
+        tasks.deliver_completed()
+    assert done()
+
+
+def test_filter_view_maps_indices():
+    view = panes.Filter_View(['a', 'b', 'c', 'd'], [1, 3])
+    assert len(view) == 2 and view[1] == 'd' and view[0:2] == ['b', 'd'] and list(view) == ['b', 'd']
+
+
+def test_filter_maps_cursor_and_selection_to_contents():
+    with headless.Virtual_Terminal(12, 60) as term:
+        pane = make_pane(term, [f'item {i}' for i in range(0, 30)], searchable=True)
+        press(pane, '/', '2', 10)
+        assert pane.get_filter() == '2'
+        lines = draw(term, pane)
+        assert any('item 2 ' in l or l.rstrip('│▊ ').endswith('item 2') for l in lines)
+        assert not any('item 3' in l for l in lines)
+
+        press(pane, 258, 258, ' ')   # Down twice to the third match (item 20), then select it
+        assert pane.get_cursor() == 20
+        assert pane.get_selected() == [20]
+
+        press(pane, 27)   # escape clears the filter and keeps the cursor on the same line
+        assert pane.get_filter() is None and pane.get_cursor() == 20
+
+        press(pane, 'n')
+        assert pane.get_cursor() == 21
+        press(pane, 'N', 'N')
+        assert pane.get_cursor() == 12
+
+
+def test_search_keys_are_opt_in():
+    with headless.Virtual_Terminal(12, 60) as term:
+        pane = make_pane(term, ['a', 'b'])
+        ie = screen.Input_Event(ord('/'))
+        assert pane.key_input(ie).key == ord('/')
+        assert not pane.get_captures_text_input()
+
+
+def test_large_lists_are_searched_in_the_background():
+    with headless.Virtual_Terminal(12, 60) as term:
+        count = panes.Scroll_Pane.FILTER_TASK_THRESHOLD * 2
+        lines = [core.Text_Line(f'row {i}' + (' needle' if i % 10000 == 7 else ''), None) for i in range(0, count)]
+        pane = make_pane(term, lines, scroll_type=panes.Scroll_Pane_Type.SINGLE_SELECT, searchable=True)
+        press(pane, '/', *'needle')
+        wait_for_tasks(lambda: not pane._filter_pending)
+        assert len(pane._filter_indices) == count // 10000
+        press(pane, 27)
+        assert pane.get_cursor() == 7
+
+        pane._filter_cache.clear()
+        assert pane.find_next() is True
+        assert pane.get_cursor() == 7   # the move happens when the search finishes
+        wait_for_tasks(lambda: pane._find_pending is None)
+        assert pane.get_cursor() == 10007
+        pane.find_next(reverse=True)
+        assert pane.get_cursor() == 7
+
+
+def test_rows_changed_in_place_are_drawn_again():
+    with headless.Virtual_Terminal(12, 60) as term:
+        lines = [core.Text_Line(f'row {i}', None) for i in range(0, 5)]
+        pane = make_pane(term, lines, scroll_type=panes.Scroll_Pane_Type.READ_ONLY)
+        drawn = draw(term, pane)
+        y = next(i for i, l in enumerate(drawn) if 'row 2' in l)
+        x = drawn[y].index('row 2')
+        assert term.get_attr(y, x) == 0
+
+        term.reset_counters()
+        lines[2].uniform_color(curses.color_pair(3))
+        pane.needs_drawing()
+        draw(term, pane)
+        assert term.get_attr(y, x) == curses.color_pair(3)
+        # Only that row was drawn again (a blanked row and its text)
+        assert 0 < term.cells_written < 2 * 60
@@ -0,0 +1,50 @@
+import time
+import threading
+
+from tinywin import tasks
+
+
+def wait_until(done):
+    deadline = time.time() + 5
+    while not done() and time.time() < deadline:
+        time.sleep(0.01)
+    assert done()
+
+
+def test_results_are_only_delivered_by_deliver_completed():
+    pool = tasks.Task_Pool(max_workers=2)
+    owner = object()
+    results = []
+    future = pool.submit(owner, lambda a, b: (a + b, threading.current_thread()), 2, 3,
+                         callback=lambda r: results.append((r[0], r[1] is threading.current_thread())))
+    wait_until(future.done)
+    assert results == []
+    assert pool.deliver_completed() == 1
+    assert results == [(5, False)]
+    assert pool.get_pending_count() == 0
+    pool.shutdown(wait=True)
+
+
+def test_errors_go_to_the_error_callback():
+    pool = tasks.Task_Pool(max_workers=1)
+    errors = []
+    future = pool.submit('owner', lambda: 1 // 0, callback=lambda r: None, error_callback=errors.append)
+    wait_until(future.done)
+    pool.deliver_completed()
+    assert len(errors) == 1 and isinstance(errors[0], ZeroDivisionError)
+    pool.shutdown(wait=True)
+
+
+def test_cancel_and_shutdown_discard_pending_work():
+    pool = tasks.Task_Pool(max_workers=1)
+    release = threading.Event()
+    ran = []
+    running = pool.submit('a', release.wait, 5, callback=ran.append)
+    queued = pool.submit('b', lambda: ran.append('b'))
+    pool.cancel('a')
+    assert queued.cancelled() is False and pool.get_pending_count('a') == 0
+    pool.shutdown()
+    assert queued.cancelled()
+    release.set()
+    wait_until(running.done)
+    assert pool.deliver_completed() == 0 and ran == []
@@ -1,9 +1,12 @@
 import curses
 import math
+import asyncio
 import logging
+import threading
+import collections
 from enum import Enum
 
-from tinywin import helpers
+from tinywin import helpers, tracing, tasks
 
 
 class Screen_Border_Style(Enum):
@@ -12,6 +15,109 @@ class Screen_Border_Style(Enum):
     NO_SIDES = 3  # Border with only top and bottom lines
     # THIN_BORDER = 4
 
+# When output is batched, windows only stage their changes with noutrefresh, and the top level Screen pushes
+# every staged change to the terminal with a single doupdate at the end of each frame.
+_batched_output = False
+
+def set_batched_output(enabled):
+    global _batched_output
+    _batched_output = enabled
+
+def get_batched_output():
+    return _batched_output
+
+def present(win):
+    """Push the changes in a window to the terminal, or stage them if output is batched"""
+    if _batched_output:
+        win.noutrefresh()
+    else:
+        win.refresh()
+
+def fit_derwin(win, parent, nlines, ncols, begin_y, begin_x):
+    """Fit a window derived from parent to a new size and position (relative to parent).
+
+    win is resized and moved in place when curses allows it, so a relayout doesn't build a new window tree. A new
+    derived window is returned instead if win is None or can't be moved.
+    """
+    if win is None:
+        return parent.derwin(nlines, ncols, begin_y, begin_x)
+    old_h, old_w = win.getmaxyx()
+    old_y, old_x = win.getparyx()
+    if (old_h, old_w, old_y, old_x) == (nlines, ncols, begin_y, begin_x):
+        return win
+    try:
+        # Shrink first, so the window stays inside its parent while it moves
+        win.resize(min(old_h, nlines), min(old_w, ncols))
+        win.mvderwin(begin_y, begin_x)
+        parent_y, parent_x = parent.getbegyx()
+        win.mvwin(parent_y + begin_y, parent_x + begin_x)
+        win.resize(nlines, ncols)
+        return win
+    except curses.error:
+        return parent.derwin(nlines, ncols, begin_y, begin_x)
+
+# Called when something outside the frame loop (such as a finished pane task) needs the screen to run a frame
+# right away, rather than at its next deadline.
+_wake_callback = None
+
+def set_wake_callback(callback):
+    global _wake_callback
+    _wake_callback = callback
+
+def wake():
+    """Ask the running screen to run a frame as soon as possible"""
+    if _wake_callback is not None:
+        _wake_callback()
+
+def get_running_loop():
+    """Get the running asyncio event loop (asyncio.get_running_loop needs Python 3.7, so get_event_loop is used
+    before that)"""
+    if hasattr(asyncio, 'get_running_loop'):
+        return asyncio.get_running_loop()
+    return asyncio.get_event_loop()
+
+class Update_Queue(object):
+    """Update Queue
+
+    A thread-safe queue of calls to run on the UI thread. Pane state must only be changed on the UI thread, so other
+    threads post the change instead, and the top level Screen runs every posted call once per frame.
+
+    Calls posted with the same coalesce_key replace each other, so only the latest one runs (in the position it
+    was posted). For example, several notifications posted before the next frame only draw the last one.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = collections.OrderedDict()
+
+    def post(self, func, *args, coalesce_key=None, **kwargs):
+        key = coalesce_key if coalesce_key is not None else object()
+        with self._lock:
+            self._calls.pop(key, None)
+            self._calls[key] = (func, args, kwargs)
+        wake()
+
+    def drain(self):
+        """Run every posted call. Must be called on the UI thread. Returns the number of calls that ran."""
+        with self._lock:
+            if len(self._calls) == 0:
+                return 0
+            calls = self._calls
+            self._calls = collections.OrderedDict()
+        for func, args, kwargs in calls.values():
+            func(*args, **kwargs)
+        return len(calls)
+
+_update_queue = Update_Queue()
+
+def post(func, *args, coalesce_key=None, **kwargs):
+    """Run func(*args, **kwargs) on the UI thread during the next frame. Safe to call from any thread."""
+    _update_queue.post(func, *args, coalesce_key=coalesce_key, **kwargs)
+
+def run_posted():
+    """Run every call posted with post. Called by the top level Screen once per frame."""
+    return _update_queue.drain()
+
 class PaneError(Exception):
     def __init__(self, msg):
         self.msg = msg
@@ -27,6 +133,10 @@ class Init(object):
         pass
 
 class Processable(object):
+    # Screens created with focused_key_input=True only offer keys to the focused pane (after the keymap). Set this to
+    # True for key_input to be offered every key that nothing else used there, focused or not.
+    RECEIVES_ALL_KEYS = False
+
     def __init__(self):    
         super(Processable, self).__init__()
         self._logging = logging.getLogger('Processable')
@@ -34,6 +144,14 @@ class Processable(object):
     def process(self, time):
         pass
 
+    def get_next_deadline(self, time):
+        """Get the time at which this object next needs to process, or None if it only reacts to input.
+
+        Screens running in event driven mode sleep until the earliest deadline or the next key press, so objects
+        that animate or time out on their own must overload this.
+        """
+        return None
+
     def key_input(self, ie):
         return ie
 
@@ -86,24 +204,23 @@ class Drawable(Processable):
 
     def needs_drawing(self, reason=''):
         self._needs_drawing = True
-        if reason != '':
+        if tracing.enabled and reason != '':
             self._draw_reasons.append(reason)
 
     def get_needs_drawing(self):
         return self._needs_drawing
 
     def get_draw_reasons(self):
+        """Get the reasons given for the pending draw. Reasons are only kept while tracing is enabled."""
         return '; '.join(self._draw_reasons)
 
     def _refresh(self):
-        self._base_win.refresh()
+        present(self._base_win)
         self._needs_drawing = False
-        reasons = self.get_draw_reasons()
-        if len(reasons) == 0:
-            self._logging.debug(f'refresh: {self} | no reasons given')
-        else:
-            self._logging.debug(f'refresh: {self} | reasons: {self.get_draw_reasons()}')
-        self._draw_reasons = []
+        if tracing.enabled:
+            tracing.record_draw(self, self._draw_reasons, logger=self._logging)
+        if len(self._draw_reasons) > 0:
+            self._draw_reasons = []
 
     def key_input(self, ie):
         return ie
@@ -117,6 +234,14 @@ class Pane(Drawable):
         self.line_counter = line_counter
         self._title = title
         self._border_style = border_style
+        self._upper_win = None
+        self._lower_win = None
+        self._calc_win_coords()
+
+        self._tasks = set()
+        self._key_bindings = {}
+        self._keymap = None
+        self._focus_manager = None
 
         self._logging = logging.getLogger('Pane')
 
@@ -137,8 +262,15 @@ class Pane(Drawable):
         # return self.__class__.__name__ + self._title
 
     def assign_win(self, win):
+        # When the same window is assigned again (after a resize), the windows derived from it are fitted to its
+        # new size instead of being created again
+        if win is self._base_win and self._win is not win:
+            old_win, old_upper_win, old_lower_win = self._win, self._upper_win, self._lower_win
+        else:
+            old_win, old_upper_win, old_lower_win = None, None, None
         super(Pane, self).assign_win(win)
-        self._logging.debug(f'assign_win: {self} {win}')
+        if tracing.enabled:
+            self._logging.debug('assign_win: %s %s', self, win)
         if self._border_style == Screen_Border_Style.NO_SIDES:
             self._lower_line = '─'*(self._base_w-2)
             if self._title == '':
@@ -147,13 +279,13 @@ class Pane(Drawable):
                 self._title_line = ' ' + self._title + ' '
             self._fillerl = ''.ljust(math.ceil((self._base_w-2)/2 - len(self._title_line)/2), '─')
             self._fillerr = ''.ljust(math.floor((self._base_w-2)/2 - len(self._title_line)/2), '─')
-            self._upper_win = self._base_win.derwin(0, self._base_w, 0, 0)
-            self._lower_win = self._base_win.derwin(0, self._base_w, self._base_h-1, 0)
+            self._upper_win = fit_derwin(old_upper_win, self._base_win, 1, self._base_w, 0, 0)
+            self._lower_win = fit_derwin(old_lower_win, self._base_win, 1, self._base_w, self._base_h-1, 0)
 
-            self._win = self._base_win.derwin(self._base_h - 1, self._base_w, 1, 0)
+            self._win = fit_derwin(old_win, self._base_win, self._base_h - 1, self._base_w, 1, 0)
 
         elif self._border_style == Screen_Border_Style.FULL:
-            self._win = self._base_win.derwin(self._base_h - 1, self._base_w, 0, 0)
+            self._win = fit_derwin(old_win, self._base_win, self._base_h - 1, self._base_w, 0, 0)
         elif self._border_style == Screen_Border_Style.BORDERLESS:
             self._win = self._base_win
         else:
@@ -185,9 +317,9 @@ class Pane(Drawable):
                 self._upper_win.addstr(0, 1, self._fillerl, curses.color_pair(2))
                 self._upper_win.addstr(0, 1 + len(self._fillerl), self._title_line, curses.color_pair(1))
                 self._upper_win.addstr(0, 1 + len(self._fillerl) + len(self._title_line), self._fillerr, curses.color_pair(2))
-                self._upper_win.refresh()
+                present(self._upper_win)
                 self._lower_win.addstr(0, 1, self._lower_line, curses.color_pair(2))
-                self._lower_win.refresh()
+                present(self._lower_win)
             except curses.error:
                 pass
         elif self._border_style == Screen_Border_Style.BORDERLESS:
@@ -197,7 +329,7 @@ class Pane(Drawable):
 
     def draw(self):
         super(Pane, self).draw()
-        self._win.refresh()
+        present(self._win)
         
         # self.draw_border()
 
@@ -216,14 +348,79 @@ class Pane(Drawable):
     def focus(self):
         self._focus = True
         self.needs_drawing(reason='focus=true')
+        if self._focus_manager is not None:
+            self._focus_manager.pane_focused(self)
 
     def unfocus(self):
         self._focus = False
         self.needs_drawing(reason='focus=false')
+        if self._focus_manager is not None:
+            self._focus_manager.pane_unfocused(self)
+
+    def set_focus_manager(self, focus_manager):
+        """Report focus changes to a screen.Focus_Manager, which unfocuses this pane when another pane it manages is
+        focused. Called by the layout when the pane is added to it."""
+        self._focus_manager = focus_manager
+        if self._focus:
+            focus_manager.pane_focused(self)
 
     def get_focus(self):
         return self._focus
 
+    def get_captures_text_input(self):
+        """Whether or not this pane is taking typed text (like a filter query). While it is, the screen sends keys
+        to it first, and the exit key is typed instead of closing the screen."""
+        return False
+
+    def spawn(self, coro, on_done=None):
+        """Run a coroutine on the running asyncio event loop (see Screen_Pane.run_as_top_level_async).
+
+        When the coroutine finishes, on_done is called with its result and the pane is marked as needing to be
+        drawn. Exceptions raised by the coroutine are logged.
+        """
+        task = get_running_loop().create_task(coro)
+        self._tasks.add(task)
+
+        def done(task):
+            self._tasks.discard(task)
+            if task.cancelled():
+                return
+            if task.exception() is not None:
+                self._logging.error('task failed: %s', self, exc_info=task.exception())
+            elif on_done is not None:
+                on_done(task.result())
+            self.needs_drawing(reason='task finished')
+            wake()
+
+        task.add_done_callback(done)
+        return task
+
+    def post(self, func, *args, coalesce_key=None, **kwargs):
+        """Run func(*args, **kwargs) on the UI thread during the next frame. Safe to call from any thread.
+        Calls with the same coalesce_key replace each other until they run."""
+        post(func, *args, coalesce_key=coalesce_key, **kwargs)
+
+    def submit_task(self, func, *args, callback=None, error_callback=None, use_processes=False):
+        """Run a blocking callable, func(*args), on a background worker thread (or process).
+
+        When it finishes, callback is called with its result (or error_callback with the exception it raised) on
+        the UI thread, during Screen.process, and the pane is marked as needing to be drawn. Returns a
+        concurrent.futures.Future.
+        """
+        return tasks.get_pool(use_processes).submit(self, func, *args, callback=callback, error_callback=error_callback)
+
+    def cancel_tasks(self):
+        """Cancel every coroutine started with spawn and every task submitted with submit_task that has not
+        finished yet. Results of tasks that are already running are discarded."""
+        for task in list(self._tasks):
+            task.cancel()
+        self._tasks.clear()
+        tasks.cancel(self)
+
+    def close(self):
+        """Release the resources held by this pane, such as open files. Called when the screen closes."""
+        pass
+
     def set_title(self, title):
         self._title = title
 
@@ -239,7 +436,7 @@ class Pane(Drawable):
 
     def _refresh(self):
         super(Pane, self)._refresh()
-        self._win.refresh()
+        present(self._win)
 
     def init_frame(self, title='', clear_interior=True, border_color=None, unfocused_line_color=None, single_line=False, omit_border=False, single_line_x=0, single_line_y=0):
         if not single_line:
@@ -285,8 +482,36 @@ class Pane(Drawable):
         #     except curses.error as e:
         #         pass
         #     input_event.absorb()
+        if self._keymap is None and input_event.key in self._key_bindings:
+            # Not on a screen, so the bindings aren't in a keymap
+            if self._key_bindings[input_event.key](input_event):
+                input_event.absorb()
         return input_event
 
+    def bind_key(self, key, callback, focused_only=True):
+        """Call callback() when key (a character or a key code) is pressed. The key is resolved through the screen's
+        keymap, so it is handled before the key is offered to each pane. Binding a key again replaces its callback.
+
+        Named Arguments:
+            focused_only: Only use the key while this pane is focused. Otherwise it is passed on. [True]
+        """
+        key = ord(key) if isinstance(key, str) else key
+
+        def handler(ie):
+            if focused_only and not self._focus:
+                return False
+            return callback() is not False
+
+        self._key_bindings[key] = handler
+        if self._keymap is not None:
+            self._keymap.bind(key, handler, owner=self)
+
+    def register_keys(self, keymap):
+        """Add this pane's key bindings to a keymap. Called by the screen when the pane is added to it."""
+        self._keymap = keymap
+        for key, handler in self._key_bindings.items():
+            keymap.bind(key, handler, owner=self)
+
     def draw_top_border(self, _title, focused_title_color=None, omit_side_borders=False, border_color=None, unfocused_line_color=None):
         self._base_win.move(0, 0)
         self._base_win.clrtoeol()
@@ -344,8 +569,72 @@ class Footer(Pane):
         super(Footer, self).__init__(border_style=Screen_Border_Style.BORDERLESS)
 
     
+class Keymap(object):
+    """Keymap
+
+    The handlers bound to each key, so a key press is resolved with one lookup instead of being offered to every
+    pane and menu item. A handler is called with the Input_Event and returns True if it used the key. The handlers
+    bound to a key are tried in the order they were bound, until one uses it.
+
+    User Functions:
+        bind:         Bind a handler to a key (a character or a key code). An owner replaces its earlier handler.
+        bind_any:     Bind a handler that is offered every key. An owner replaces its earlier handler.
+        unbind:       Remove an owner's handlers, from one key or from all of them.
+        dispatch:     Call the handlers bound to an Input_Event's key, absorbing the event if one uses it.
+        dispatch_any: Call the handlers bound with bind_any, absorbing the event if one uses it.
+    """
+    def __init__(self):
+        self._bindings = {}
+        self._any_key = []
+
+    def bind(self, key, handler, owner=None):
+        key = ord(key) if isinstance(key, str) else key
+        handlers = self._bindings.setdefault(key, [])
+        if owner is not None:
+            handlers[:] = [h for h in handlers if h[1] is not owner]
+        handlers.append((handler, owner))
+
+    def bind_any(self, handler, owner=None):
+        if owner is not None:
+            self._any_key = [h for h in self._any_key if h[1] is not owner]
+        self._any_key.append((handler, owner))
+
+    def unbind(self, owner, key=None):
+        if key is None:
+            self._any_key = [h for h in self._any_key if h[1] is not owner]
+        keys = list(self._bindings.keys()) if key is None else [ord(key) if isinstance(key, str) else key]
+        for k in keys:
+            handlers = [h for h in self._bindings.get(k, []) if h[1] is not owner]
+            if len(handlers) > 0:
+                self._bindings[k] = handlers
+            else:
+                self._bindings.pop(k, None)
+
+    def get_bound(self, key):
+        return key in self._bindings
+
+    def dispatch(self, ie):
+        handlers = self._bindings.get(ie.key)
+        if handlers is None:
+            return ie
+        for handler, owner in handlers:
+            if handler(ie):
+                ie.absorb()
+                break
+        return ie
+
+    def dispatch_any(self, ie, skip=None):
+        """Offer an Input_Event to the handlers bound with bind_any, except those owned by skip"""
+        for handler, owner in self._any_key:
+            if owner is not None and owner is skip:
+                continue
+            if handler(ie):
+                ie.absorb()
+                break
+        return ie
+
 class Pane_Holder(Processable):
-    def __init__(self, pane, start_x, start_y, width, height, can_be_focused=True, focus_key=None, one_line=False, fixed_to=None, unfocus_callback=None):
+    def __init__(self, pane, start_x, start_y, width, height, can_be_focused=True, focus_key=None, one_line=False, fixed_to=None, unfocus_callback=None, focus_callback=None):
         self._pane = pane
         self._start_x = start_x
         self._start_y = start_y
@@ -355,7 +644,12 @@ class Pane_Holder(Processable):
         self._focus_key = ord(focus_key) if focus_key is not None else None
         self._one_line = one_line
         self._unfocus_callback = unfocus_callback
+        # Called with the pane to focus it (like screen.Focus_Manager.focus), in place of unfocus_callback
+        self._focus_callback = focus_callback
         self._fixed_to = fixed_to
+        self._win = None
+        self._parent_win = None
+        self._geometry = None
 
 
     def get_coords(self):
@@ -371,6 +665,22 @@ class Pane_Holder(Processable):
         self._pane.assign_win(win)
         self._win = win
 
+    def update_win(self, parent, nlines, ncols, begin_y, begin_x):
+        """Give the pane a window of parent with this geometry (relative to parent), reusing the pane's current
+        window if it has one. The pane is only assigned the window again if its geometry changed, so unchanged
+        panes skip rebuilding their contents. Returns True if the geometry changed."""
+        geometry = (nlines, ncols, begin_y, begin_x)
+        if parent is not self._parent_win:
+            win = parent.derwin(*geometry)
+        elif geometry == self._geometry:
+            return False
+        else:
+            win = fit_derwin(self._win, parent, *geometry)
+        self._parent_win = parent
+        self._geometry = geometry
+        self.link_win(win)
+        return True
+
     def move_win(self, begin_y, begin_x):
         self._win.mvwin(begin_y, begin_x)
 
@@ -388,13 +698,92 @@ class Pane_Holder(Processable):
 
     def key_input(self, ie):
         if ie is not None and self._focus_key is not None and ie.key == self._focus_key:
-            if self._unfocus_callback is not None:
-                self._unfocus_callback()
-            self._pane.focus()
-            ie.absorb()
+            if self._focus_key_pressed(ie):
+                ie.absorb()
         return ie
 
+    def register_keys(self, keymap):
+        """Bind this pane's focus key in a keymap"""
+        if self._focus_key is not None:
+            keymap.bind(self._focus_key, self._focus_key_pressed, owner=self)
+
+    def _focus_key_pressed(self, ie):
+        if self._focus_callback is not None:
+            self._focus_callback(self._pane)
+            return True
+        if self._unfocus_callback is not None:
+            self._unfocus_callback()
+        self._pane.focus()
+        return True
+
+class Ring_Buffer(object):
+    """Ring Buffer
+
+    A fixed-capacity sequence. Appending to a full buffer evicts the oldest item, so appends are O(1) and memory
+    never grows past the capacity. Supports len, iteration, and indexing with integers or (step 1) slices, which
+    is all Scroll_Pane needs from its contents.
+    """
+
+    def __init__(self, capacity):
+        if capacity <= 0:
+            raise ValueError('Ring_Buffer capacity must be positive')
+        self._items = [None] * capacity
+        self._capacity = capacity
+        self._start = 0
+        self._len = 0
+        self._evicted = 0
+
+    def append(self, item):
+        """Append an item. Returns True if the oldest item was evicted to make room."""
+        if self._len < self._capacity:
+            self._items[(self._start + self._len) % self._capacity] = item
+            self._len = self._len + 1
+            return False
+        self._items[self._start] = item
+        self._start = (self._start + 1) % self._capacity
+        self._evicted = self._evicted + 1
+        return True
+
+    def clear(self):
+        self._items = [None] * self._capacity
+        self._start = 0
+        self._len = 0
+
+    def get_capacity(self):
+        return self._capacity
+
+    def get_evicted_count(self):
+        """Get the number of items evicted since the buffer was created"""
+        return self._evicted
+
+    def __len__(self):
+        return self._len
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._len)
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            if start >= stop:
+                return []
+            a = (self._start + start) % self._capacity
+            b = a + (stop - start)
+            if b <= self._capacity:
+                return self._items[a:b]
+            return self._items[a:] + self._items[0:b - self._capacity]
+        if index < 0:
+            index = index + self._len
+        if index < 0 or index >= self._len:
+            raise IndexError('Ring_Buffer index out of range')
+        return self._items[(self._start + index) % self._capacity]
+
+    def __iter__(self):
+        for i in range(0, self._len):
+            yield self._items[(self._start + i) % self._capacity]
+
 class Text_Wrapper(object):
+    __slots__ = ('text', 'color')
+
     def __init__(self, text, color):
         self.text = text
         self.color = color
@@ -428,13 +817,19 @@ class Text_Line(object):
         allowed_width:  Width allocated for this Text_Line. A value will force the Text_Line to shorten to the 
                         specified value. [None (no shortening)]
 
+    Text_Lines are kept compact, since lists of hundreds of thousands of them are common: they use __slots__,
+    cache their length and plain text, and only create the data dictionary when it is first accessed.
+
     User Functions:
         get_data():                  Gets the data dictionary associated with this Text_Line
         set_data(data):              Sets the data to be associated with this Text_Line
         output_to_window(win, y, x): Requests the Text_Line to draw to the specified window at the coords specified.
         uniform_color(color):        Sets all text in the Text_Line to the same, specified color.
         get_has_been_shortened():    Gets whether or not this text has been shortened.
+        get_shortened_length():      Gets the length this text was last shortened to (None if never shortened).
         shorten_to_length(length):   Requests the Text_Line to shorten its contents to fit the specified length.
+        get_revision():              Gets a counter that goes up whenever the line is changed in place (its colors,
+                                     allowed width or shortened text), so a drawn copy can be checked for changes.
 
     Operators:
         __len__: len(text_line): Length of a Text_Line is the length of characters of the text stored within. Color 
@@ -447,64 +842,74 @@ class Text_Line(object):
                                  the first object is not a Text_Line, the Text_Line object will be treated as a string
                                  with regards to the add.
     """
+    __slots__ = ('_data', '_has_been_shortened', '_shortened_length', '_ellipsis_color', '_ellipsis_text',
+                 '_text_objects', '_shortened_text_objects', '_allowed_width', '_str', '_shortened_str',
+                 '_shortened_cache', '_revision')
+
+    # Number of shortened widths remembered per line
+    SHORTENED_CACHE_SIZE = 4
+
     def __init__(self, *args, data=None, ellipsis_color=None, ellipsis_text='...', allowed_width=None):
-        self.data = data
+        self._data = data
         self._has_been_shortened = False
-        if self.data is None:
-            self.data = dict()
-        if ellipsis_color is None:
-            try:
-                self._ellipsis_color = curses.color_pair(2)
-            except curses.error:
-                self._ellipsis_color = None
-        else:
-            self._ellipsis_color = ellipsis_color
+        self._shortened_length = None
+        self._shortened_cache = None
+        self._revision = 0
+        # The default ellipsis color is looked up when it is first needed (see _get_ellipsis_color)
+        self._ellipsis_color = ellipsis_color
         self._ellipsis_text = ellipsis_text
-        texts = []
-        colors = []
-        current_arg_is_text = True
-        for arg in args:
-            if current_arg_is_text:
-                if isinstance(arg, Text_Line):
-                    texts.append(str(arg))
-                else:
-                    texts.append(arg)
-            else:
-                colors.append(arg)
-            current_arg_is_text = not current_arg_is_text
-
-        # if len(texts) != len(colors):
 
+        text_objects = []
+        for i in range(0, len(args), 2):
+            text = args[i]
+            if isinstance(text, Text_Line):
+                text = str(text)
+            color = args[i + 1] if i + 1 < len(args) else None
+            text_objects.append(Text_Wrapper(text, color))
+        self._text_objects = tuple(text_objects)
+        self._shortened_text_objects = self._text_objects
 
-        self._text_objects = []
-        self._shortened_text_objects = []
-
-        for i in range(0, len(texts)):
-            self._text_objects.append(Text_Wrapper(texts[i], colors[i]))
+        self._str = ''.join([t.text for t in text_objects])
+        self._shortened_str = self._str
 
         if allowed_width is None:
-            self._allowed_width = 0
-            for t in self._text_objects:
-                self._allowed_width = self._allowed_width + len(t)
+            self._allowed_width = len(self._str)
         else:
             self._allowed_width = allowed_width
 
-        self._shortened_text_objects = self._text_objects
+    @property
+    def data(self):
+        if self._data is None:
+            self._data = dict()
+        return self._data
+
+    @data.setter
+    def data(self, data):
+        self._data = data
 
     def get_data(self):
         return self.data
 
     def set_data(self, data):
-        self.data = data.copy()
+        self._data = data.copy()
         return self
 
     def set_allowed_width(self, width):
-        self._allowed_width = width
+        if width != self._allowed_width:
+            self._allowed_width = width
+            self._revision = self._revision + 1
         return self
 
+    def get_revision(self):
+        return self._revision
+
     def get_text_component(self, index):
         return self._text_objects[index]
 
+    def get_text(self):
+        """Get the full text of this line, ignoring any shortening"""
+        return self._str
+
     def output_to_window(self, win, line_counter, x_offset, highlight=0):
         try:
             len_counter = 0
@@ -530,124 +935,103 @@ class Text_Line(object):
         for t in self._shortened_text_objects:
             t.color = color
 
+        # Shortened results for other widths still have the old colors
+        self._shortened_cache = None
+        self._revision = self._revision + 1
         return self
 
     def get_has_been_shortened(self):
         return self._has_been_shortened
 
+    def get_shortened_length(self):
+        return self._shortened_length
+
+    def _get_ellipsis_color(self):
+        if self._ellipsis_color is None:
+            try:
+                self._ellipsis_color = curses.color_pair(2)
+            except curses.error:
+                return None
+        return self._ellipsis_color
+
     def shorten_to_length(self, length):
         self._allowed_width = length
         self._has_been_shortened = True
-        tmp_shortened_text_objects = []
-        for t in self._text_objects:
-            tmp_shortened_text_objects.append(t.copy())
-        total_len = 0
-        for t in tmp_shortened_text_objects:
-            total_len = total_len + len(t)
-        if total_len > length:
-            self._shortened_text_objects = []
-            # print(total_len, length)
-            index = len(tmp_shortened_text_objects) - 1  # Start at the end of the colored string
-            character_index = len(tmp_shortened_text_objects[index])-1  # Start at the last character in the last string
-            removing = True
-
-            while removing is True:
-                total_len = total_len - 1
-                character_index = character_index - 1
-                if character_index < 0:
-                    index = index - 1
-                    if index < 0:
-                        raise TerminalTooSmallError(f'Cannot shorten text "{self.__str__(use_unshortened_text=True)}" to length "{length}"')
-                    character_index = len(tmp_shortened_text_objects[index])-1
-                if total_len + len(self._ellipsis_text) <= length:
-                    removing = False
-
-            # We can use all text up to index, and the last piece of text can be used up to the character_index
-
-            tmp_shortened_text_objects[index].text = tmp_shortened_text_objects[index].text[0:character_index+1]  # Shorten last index text
-            if tmp_shortened_text_objects[index].text[len(tmp_shortened_text_objects[index].text)-1] == ' ':  # Trim a space if one exists
-                tmp_shortened_text_objects[index].text = tmp_shortened_text_objects[index].text[:-1]
-
-            for i in range(0, index+1):
-                self._shortened_text_objects.append(tmp_shortened_text_objects[i])
-            self._shortened_text_objects.append(Text_Wrapper(self._ellipsis_text, self._ellipsis_color))
+        if self._shortened_length == length:
+            return self
+        self._shortened_length = length
+        self._revision = self._revision + 1
+        if len(self._str) <= length:
+            self._shortened_text_objects = self._text_objects
+            self._shortened_str = self._str
+            return self
+
+        # Shortened results are cached per width, so laying out at a width seen recently does no work
+        if self._shortened_cache is None:
+            self._shortened_cache = {}
+        shortened = self._shortened_cache.get(length)
+        if shortened is None:
+            shortened = self._shorten(length)
+            if len(self._shortened_cache) >= self.SHORTENED_CACHE_SIZE:
+                del self._shortened_cache[next(iter(self._shortened_cache))]
+            self._shortened_cache[length] = shortened
+        self._shortened_text_objects, self._shortened_str = shortened
         return self
 
-    def __len__(self, use_unshortened_text=False):
-        counter = 0
-        if use_unshortened_text is True:
-            for t in self._text_objects:
-                counter = counter + len(t)
-        else:
-            for t in self._shortened_text_objects:
-                counter = counter + len(t)
-        return counter
+    def _shorten(self, length):
+        # Keep as many characters as fit alongside the ellipsis, found in a single pass over the segments
+        remaining = length - len(self._ellipsis_text)
+        if remaining < 1:
+            raise TerminalTooSmallError(f'Cannot shorten text "{self._str}" to length "{length}"')
+        text_objects = []
+        for t in self._text_objects:
+            if len(t.text) < remaining:
+                text_objects.append(t)
+                remaining = remaining - len(t.text)
+            else:
+                text_objects.append(Text_Wrapper(t.text[0:remaining], t.color))
+                break
 
-    def __add__(self, o):
-        if isinstance(o, Text_Line):
-            left_side = self
-            right_side = o
+        last = text_objects[-1]
+        if last.text[-1] == ' ':  # Trim a space if one exists
+            text_objects[-1] = Text_Wrapper(last.text[:-1], last.color)
 
-            l_objs = left_side._text_objects
-            r_objs = right_side._text_objects
+        text_objects.append(Text_Wrapper(self._ellipsis_text, self._get_ellipsis_color()))
+        return (tuple(text_objects), ''.join([t.text for t in text_objects]))
 
-            total_args = []
+    def __len__(self, use_unshortened_text=False):
+        if use_unshortened_text is True:
+            return len(self._str)
+        return len(self._shortened_str)
 
-            for l in l_objs:
-                total_args.append(l.text)
-                total_args.append(l.color)
-            for l in r_objs:
-                total_args.append(l.text)
-                total_args.append(l.color)
+    def _args(self):
+        total_args = []
+        for t in self._text_objects:
+            total_args.append(t.text)
+            total_args.append(t.color)
+        return total_args
 
-            return Text_Line(*total_args, data=left_side.data, ellipsis_color=left_side._ellipsis_color)
+    def __add__(self, o):
+        total_args = self._args()
+        if isinstance(o, Text_Line):
+            total_args.extend(o._args())
         else:
-            left_side = self
-            right_side = o
-
-            l_objs = left_side._text_objects
-
-            total_args = []
-
-            for l in l_objs:
-                total_args.append(l.text)
-                total_args.append(l.color)
-
-            total_args.append(right_side)
+            total_args.append(o)
             total_args.append(None)
-
-            return Text_Line(*total_args, data=left_side.data, ellipsis_color=left_side._ellipsis_color)
+        return Text_Line(*total_args, data=self._data, ellipsis_color=self._ellipsis_color)
 
     def __radd__(self, o):
         if isinstance(o, Text_Line):
-            left_side = o
-            right_side = self
-
-            l_objs = left_side._text_objects
-            r_objs = right_side._text_objects
-
-            total_args = []
-
-            for l in l_objs:
-                total_args.append(l.text)
-                total_args.append(l.color)
-            for l in r_objs:
-                total_args.append(l.text)
-                total_args.append(l.color)
-
-            return Text_Line(*total_args, data=left_side.data, ellipsis_color=left_side._ellipsis_color)
+            total_args = o._args()
+            total_args.extend(self._args())
+            return Text_Line(*total_args, data=o._data, ellipsis_color=o._ellipsis_color)
         else:
             return o + self.__str__()
 
     def __str__(self, use_unshortened_text=False):
-        string = ''
         if use_unshortened_text is True:
-            for t in self._text_objects:
-                string = string + t.text
-        else:
-            for t in self._shortened_text_objects:
-                string = string + t.text
-        return string
+            return self._str
+        return self._shortened_str
 
 class TerminalTooSmallError(PaneError):
     def __init__(self, msg='Terminal too small for application'):
@@ -692,6 +1076,13 @@ class Menu_Item(object):
 
         return input_event
 
+    def get_hotkey(self):
+        """Get the key code of this item's hotkey, or None"""
+        return self._hotkey_ord
+
+    def hotkey_pressed(self, input_event):
+        return self.click()
+
     def click(self):
         if self.callback is not None and not self._disabled:
             self.callback()
@@ -0,0 +1,457 @@
+import curses
+import time
+import bisect
+
+
+class Virtual_Clock(object):
+    """Virtual Clock
+
+    A stand-in for the time module used by headless screens. Sleeping advances the clock instantly, which
+    allows the frame loop to run at full speed while still honouring process and draw rates.
+    """
+
+    def __init__(self, start=0.0):
+        self._now = start
+
+    def time(self):
+        """Get the current virtual time, in seconds"""
+        return self._now
+
+    def sleep(self, seconds):
+        """Advance the virtual time by the specified number of seconds"""
+        if seconds > 0:
+            self._now = self._now + seconds
+
+    def advance(self, seconds):
+        """Advance the virtual time by the specified number of seconds"""
+        self.sleep(seconds)
+
+
+class Virtual_Window(object):
+    """Virtual Window
+
+    An in-memory implementation of the subset of the curses window API used by tinywin. Windows do not own any
+    cells themselves; like curses derived windows, they are views into the cell grid of their Virtual_Terminal.
+    """
+
+    def __init__(self, terminal, parent, nlines, ncols, begin_y, begin_x):
+        self._terminal = terminal
+        self._parent = parent
+        self._h = nlines
+        self._w = ncols
+        self._rel_y = begin_y
+        self._rel_x = begin_x
+        self._cy = 0
+        self._cx = 0
+        self._nodelay = False
+        self._timeout = -1
+        self._keypad = False
+
+    @property
+    def clock(self):
+        return self._terminal.clock
+
+    def _abs_coords(self):
+        if self._parent is None:
+            return (self._rel_y, self._rel_x)
+        py, px = self._parent._abs_coords()
+        return (py + self._rel_y, px + self._rel_x)
+
+    def getmaxyx(self):
+        return (self._h, self._w)
+
+    def getbegyx(self):
+        return self._abs_coords()
+
+    def getparyx(self):
+        if self._parent is None:
+            return (-1, -1)
+        return (self._rel_y, self._rel_x)
+
+    def getyx(self):
+        return (self._cy, self._cx)
+
+    def derwin(self, *args):
+        if len(args) == 2:
+            nlines, ncols = 0, 0
+            begin_y, begin_x = args
+        elif len(args) == 4:
+            nlines, ncols, begin_y, begin_x = args
+        else:
+            raise TypeError('derwin requires 2 or 4 arguments')
+        if nlines == 0:
+            nlines = self._h - begin_y
+        if ncols == 0:
+            ncols = self._w - begin_x
+        if begin_y < 0 or begin_x < 0 or nlines <= 0 or ncols <= 0 or begin_y + nlines > self._h or begin_x + ncols > self._w:
+            raise curses.error('derwin() returned NULL')
+        return Virtual_Window(self._terminal, self, nlines, ncols, begin_y, begin_x)
+
+    def subwin(self, *args):
+        if len(args) == 2:
+            nlines, ncols = 0, 0
+            begin_y, begin_x = args
+        else:
+            nlines, ncols, begin_y, begin_x = args
+        y, x = self._abs_coords()
+        return self.derwin(nlines, ncols, begin_y - y, begin_x - x)
+
+    def _write(self, y, x, text, attr):
+        if y < 0 or x < 0 or y >= self._h or x >= self._w:
+            raise curses.error('addwstr() returned ERR')
+        abs_y, abs_x = self._abs_coords()
+        chars = self._terminal.chars
+        attrs = self._terminal.attrs
+        pos = 0
+        length = len(text)
+        while pos < length:
+            newline = text.find('\n', pos)
+            end = length if newline == -1 else newline
+            while pos < end:
+                n = min(end - pos, self._w - x)
+                row = abs_y + y
+                col = abs_x + x
+                chars[row][col:col + n] = text[pos:pos + n]
+                attrs[row][col:col + n] = [attr] * n
+                self._terminal.cells_written = self._terminal.cells_written + n
+                pos = pos + n
+                x = x + n
+                if x >= self._w:
+                    if y + 1 >= self._h:
+                        # curses can't advance the cursor past the bottom-right corner
+                        self._cy, self._cx = y, self._w - 1
+                        raise curses.error('addwstr() returned ERR')
+                    y = y + 1
+                    x = 0
+            if newline != -1:
+                self._cy, self._cx = y, x
+                self.clrtoeol()
+                if y + 1 >= self._h:
+                    raise curses.error('addwstr() returned ERR')
+                y = y + 1
+                x = 0
+                pos = pos + 1
+        self._cy, self._cx = y, x
+
+    def _parse_str_args(self, args, with_n=False):
+        if isinstance(args[0], str):
+            y, x = self._cy, self._cx
+            rest = args
+        else:
+            y, x = args[0], args[1]
+            rest = args[2:]
+        text = rest[0]
+        n = -1
+        if with_n:
+            n = rest[1]
+            rest = rest[2:]
+        else:
+            rest = rest[1:]
+        attr = rest[0] if len(rest) > 0 else 0
+        if n >= 0:
+            text = text[:n]
+        return y, x, text, attr
+
+    def addstr(self, *args):
+        y, x, text, attr = self._parse_str_args(args)
+        self._write(y, x, text, attr)
+
+    def addnstr(self, *args):
+        y, x, text, attr = self._parse_str_args(args, with_n=True)
+        self._write(y, x, text, attr)
+
+    def insstr(self, *args):
+        y, x, text, attr = self._parse_str_args(args)
+        self._insert(y, x, text, attr)
+
+    def insnstr(self, *args):
+        y, x, text, attr = self._parse_str_args(args, with_n=True)
+        self._insert(y, x, text, attr)
+
+    def _insert(self, y, x, text, attr):
+        if y < 0 or x < 0 or y >= self._h or x >= self._w:
+            raise curses.error('insnstr() returned ERR')
+        abs_y, abs_x = self._abs_coords()
+        row_chars = self._terminal.chars[abs_y + y]
+        row_attrs = self._terminal.attrs[abs_y + y]
+        start = abs_x + x
+        end = abs_x + self._w
+        text = text[:self._w - x]
+        n = len(text)
+        row_chars[start:end] = (list(text) + row_chars[start:end])[:end - start]
+        row_attrs[start:end] = ([attr] * n + row_attrs[start:end])[:end - start]
+        self._terminal.cells_written = self._terminal.cells_written + n
+
+    def move(self, y, x):
+        if y < 0 or x < 0 or y >= self._h or x >= self._w:
+            raise curses.error('wmove() returned ERR')
+        self._cy, self._cx = y, x
+
+    def _blank(self, y, x, n):
+        abs_y, abs_x = self._abs_coords()
+        col = abs_x + x
+        self._terminal.chars[abs_y + y][col:col + n] = [' '] * n
+        self._terminal.attrs[abs_y + y][col:col + n] = [0] * n
+
+    def clrtoeol(self):
+        self._blank(self._cy, self._cx, self._w - self._cx)
+
+    def clrtobot(self):
+        self.clrtoeol()
+        for y in range(self._cy + 1, self._h):
+            self._blank(y, 0, self._w)
+
+    def erase(self):
+        for y in range(0, self._h):
+            self._blank(y, 0, self._w)
+        self._cy, self._cx = 0, 0
+
+    def clear(self):
+        self.erase()
+
+    def refresh(self):
+        self._terminal.refresh_count = self._terminal.refresh_count + 1
+
+    def noutrefresh(self):
+        self._terminal.noutrefresh_count = self._terminal.noutrefresh_count + 1
+
+    def resize(self, nlines, ncols):
+        if nlines <= 0 or ncols <= 0:
+            raise curses.error('wresize() returned ERR')
+        self._h = nlines
+        self._w = ncols
+        self._cy = min(self._cy, nlines - 1)
+        self._cx = min(self._cx, ncols - 1)
+
+    def mvwin(self, new_y, new_x):
+        if self._parent is None:
+            self._rel_y, self._rel_x = new_y, new_x
+        else:
+            py, px = self._parent._abs_coords()
+            self._rel_y, self._rel_x = new_y - py, new_x - px
+
+    def mvderwin(self, par_y, par_x):
+        if self._parent is None:
+            raise curses.error('mvderwin() returned ERR')
+        self._rel_y, self._rel_x = par_y, par_x
+
+    def enclose(self, y, x):
+        abs_y, abs_x = self._abs_coords()
+        return abs_y <= y < abs_y + self._h and abs_x <= x < abs_x + self._w
+
+    def keypad(self, flag):
+        self._keypad = flag
+
+    def nodelay(self, flag):
+        self._nodelay = flag
+
+    def timeout(self, delay):
+        self._timeout = delay
+
+    def wait_for_input(self, timeout):
+        return self._terminal.wait_for_input(timeout)
+
+    def getch(self, *args):
+        if len(args) == 2:
+            self.move(*args)
+        if self._nodelay:
+            return self._terminal.read_key(0)
+        if self._timeout >= 0:
+            return self._terminal.read_key(self._timeout / 1000)
+        return self._terminal.read_key(None)
+
+
+class Virtual_Terminal(object):
+    """Virtual Terminal
+
+    A headless terminal backend that keeps a grid of characters and attributes in memory instead of drawing to a
+    tty. The root window is available as `stdscr`, and can be passed anywhere tinywin expects a curses window:
+        with headless.Virtual_Terminal(24, 80) as term:
+            term.script_keys([curses.KEY_DOWN] * 10 + ['q'])
+            Main_Screen().run_as_top_level(term.stdscr)
+            print('\\n'.join(term.get_lines()))
+
+    While active (inside the `with` block), the module-level curses functions that require a real terminal
+    (color_pair, getmouse, flushinp, ...) are replaced with in-memory equivalents.
+
+    Key input is queued with push_keys (typeahead that has already arrived) or script_keys (keys that arrive at
+    scheduled times). Keys are only delivered once the terminal clock has reached their arrival time.
+
+    Named Arguments:
+        realtime: If True, the terminal uses wall-clock time. Otherwise a Virtual_Clock is used, and the frame loop
+                  runs as fast as possible. [False]
+    """
+
+    def __init__(self, height=24, width=80, realtime=False):
+        self.clock = time if realtime else Virtual_Clock()
+        self.chars = [[' '] * width for _ in range(0, height)]
+        self.attrs = [[0] * width for _ in range(0, height)]
+        self.stdscr = Virtual_Window(self, None, height, width, 0, 0)
+
+        self.refresh_count = 0
+        self.noutrefresh_count = 0
+        self.doupdate_count = 0
+        self.cells_written = 0
+
+        self._key_times = []
+        self._keys = []
+        self._mouse_events = []
+        self._saved_curses = None
+
+    ## Context management ##
+
+    def __enter__(self):
+        self.install()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.uninstall()
+        return False
+
+    def install(self):
+        """Replace the module-level curses functions that need a real terminal with in-memory versions"""
+        if self._saved_curses is not None:
+            return
+        replacements = {
+            'color_pair': lambda n: (n << 8) & 0xff00,
+            'pair_number': lambda attr: (attr & 0xff00) >> 8,
+            'getmouse': self._getmouse,
+            'flushinp': self.flush_input,
+            'doupdate': self._doupdate,
+            'curs_set': lambda visibility: 1,
+            'longname': lambda: 'tinywin virtual terminal',
+            'termname': lambda: 'virtual',
+        }
+        self._saved_curses = {}
+        for name, func in replacements.items():
+            self._saved_curses[name] = getattr(curses, name, None)
+            setattr(curses, name, func)
+
+    def uninstall(self):
+        """Restore the original curses functions"""
+        if self._saved_curses is None:
+            return
+        for name, func in self._saved_curses.items():
+            if func is None:
+                delattr(curses, name)
+            else:
+                setattr(curses, name, func)
+        self._saved_curses = None
+
+    ## Output ##
+
+    def _doupdate(self):
+        self.doupdate_count = self.doupdate_count + 1
+
+    def get_size(self):
+        return self.stdscr.getmaxyx()
+
+    def get_line(self, y):
+        """Get the text shown on a line of the terminal"""
+        return ''.join(self.chars[y])
+
+    def get_lines(self):
+        """Get the text shown on every line of the terminal"""
+        return [''.join(row) for row in self.chars]
+
+    def get_attr(self, y, x):
+        """Get the attributes of the cell at the specified location"""
+        return self.attrs[y][x]
+
+    def reset_counters(self):
+        """Reset the refresh and cell write counters"""
+        self.refresh_count = 0
+        self.noutrefresh_count = 0
+        self.doupdate_count = 0
+        self.cells_written = 0
+
+    def resize(self, height, width):
+        """Change the size of the terminal and queue a KEY_RESIZE event, as a real terminal would"""
+        old_h, old_w = self.get_size()
+        chars = [[' '] * width for _ in range(0, height)]
+        attrs = [[0] * width for _ in range(0, height)]
+        for y in range(0, min(old_h, height)):
+            n = min(old_w, width)
+            chars[y][0:n] = self.chars[y][0:n]
+            attrs[y][0:n] = self.attrs[y][0:n]
+        self.chars = chars
+        self.attrs = attrs
+        self.stdscr.resize(height, width)
+        self.push_keys(curses.KEY_RESIZE)
+
+    ## Input ##
+
+    def _queue_key(self, key, arrival_time):
+        if isinstance(key, str):
+            for c in key:
+                self._queue_key(ord(c), arrival_time)
+            return
+        # Keys are delivered in order, so a key can never arrive before the one queued ahead of it
+        if self._key_times and arrival_time < self._key_times[-1]:
+            arrival_time = self._key_times[-1]
+        self._key_times.append(arrival_time)
+        self._keys.append(key)
+
+    def push_keys(self, *keys):
+        """Queue keys that are immediately available (typeahead). Strings are split into characters."""
+        now = self.clock.time()
+        for k in keys:
+            self._queue_key(k, now)
+
+    def script_keys(self, keys, interval=0.05, start=None):
+        """Queue keys that arrive one at a time, `interval` seconds apart"""
+        t = self.clock.time() if start is None else start
+        for k in keys:
+            self._queue_key(k, t)
+            t = t + interval
+
+    def push_mouse(self, x, y, bstate, device_id=0, z=0):
+        """Queue a mouse event"""
+        self._mouse_events.append((device_id, x, y, z, bstate))
+        self.push_keys(curses.KEY_MOUSE)
+
+    def pending_keys(self):
+        """Get the number of keys that have not been read yet, including ones that have not arrived"""
+        return len(self._keys)
+
+    def _arrived_count(self):
+        return bisect.bisect_right(self._key_times, self.clock.time())
+
+    def read_key(self, timeout):
+        """Read a key, waiting up to `timeout` seconds for one to arrive (None waits for the next scripted key)"""
+        if not self._keys:
+            if timeout:
+                self.clock.sleep(timeout)
+            return -1
+        wait = self._key_times[0] - self.clock.time()
+        if wait > 0:
+            if timeout is not None and wait > timeout:
+                self.clock.sleep(timeout)
+                return -1
+            self.clock.sleep(wait)
+        self._key_times.pop(0)
+        return self._keys.pop(0)
+
+    def wait_for_input(self, timeout):
+        """Wait up to `timeout` seconds for a key to arrive. Returns True if a key is ready to be read."""
+        if self._keys:
+            wait = self._key_times[0] - self.clock.time()
+            if wait <= timeout:
+                self.clock.sleep(wait)
+                return True
+        self.clock.sleep(timeout)
+        return False
+
+    def flush_input(self):
+        """Discard every key that has already arrived"""
+        n = self._arrived_count()
+        del self._key_times[0:n]
+        for k in self._keys[0:n]:
+            if k == curses.KEY_MOUSE and self._mouse_events:
+                self._mouse_events.pop(0)
+        del self._keys[0:n]
+
+    def _getmouse(self):
+        if not self._mouse_events:
+            raise curses.error('getmouse() returned ERR')
+        return self._mouse_events.pop(0)
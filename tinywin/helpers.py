@@ -1,5 +1,9 @@
+import os
+import sys
 import curses
 import math
+import time
+import select
 
 
 def title(win, line, title, focused, unfocused_line_color=None, focused_line_color=None, unfocused_title_color=None, focused_title_color=None, omit_side_borders=False):
@@ -32,6 +36,49 @@ def title(win, line, title, focused, unfocused_line_color=None, focused_line_col
         win.addstr(line, 0, left_corner + fillerl, line_color)
         win.addstr(line, len(fillerl) + 1, fillerr + right_corner, line_color)
 
+def get_clock(win):
+    """Get the clock (an object with time() and sleep()) that should be used with a window.
+
+    Headless windows carry their own clock so the frame loop can run faster than real time. Real curses
+    windows use the time module.
+    """
+    clock = getattr(win, 'clock', None)
+    return clock if clock is not None else time
+
+def get_input_fd(win):
+    """Get the file descriptor that key input for a window is read from, or None for headless windows"""
+    if getattr(win, 'wait_for_input', None) is not None:
+        return None
+    try:
+        return sys.stdin.fileno()
+    except (OSError, ValueError):
+        return None
+
+def wait_for_input(win, timeout, wake_fd=None):
+    """Block until there is input to read from a window, or until `timeout` seconds have passed.
+
+    Returns True if input is ready. Headless windows provide their own wait_for_input, which advances their
+    clock instead of blocking. Real curses windows wait for stdin to become readable, or for anything to be
+    written to `wake_fd` (a non-blocking pipe, which is emptied).
+    """
+    wait = getattr(win, 'wait_for_input', None)
+    if wait is not None:
+        return wait(timeout)
+    fds = [sys.stdin] if wake_fd is None else [sys.stdin, wake_fd]
+    try:
+        ready, _, _ = select.select(fds, [], [], timeout)
+    except (OSError, ValueError):
+        # stdin can't be waited on, so fall back to sleeping
+        time.sleep(timeout)
+        return False
+    if wake_fd is not None and wake_fd in ready:
+        try:
+            while os.read(wake_fd, 1024):
+                pass
+        except (BlockingIOError, OSError):
+            pass
+    return sys.stdin in ready
+
 def curses_init():
     stdscr = curses.initscr()
     curses.noecho()
@@ -1,9 +1,15 @@
+import os
+import mmap
+import array
 import curses
 import math
+import bisect
 import logging
+import threading
+import collections
 from enum import Enum
 
-from tinywin import core, helpers, screen
+from tinywin import core, helpers, screen, tracing
 
 class Scroll_Area(object):
     """Scroll Area calculation helper object
@@ -13,11 +19,18 @@ class Scroll_Area(object):
     line index or forced scroll command can be used to scroll the contents.
     The results can be retrieved and used to draw the scroll area with the
     correct lines in view.
+
+    In virtualized mode, lines are only shortened to the scroll area width
+    when they come into view, so setting lines and resizing cost as much as
+    the visible window rather than the whole list.
     """
 
-    def __init__(self, height, width, current_cursor=0, force_scrolling_only=False, lines=None):
+    def __init__(self, height, width, current_cursor=0, force_scrolling_only=False, lines=None, virtualized=False):
         self.mouse_y_offset = 0
         self._org_lines = lines
+        self._virtualized = virtualized
+        self._height = height
+        self._org_width = width
         self.init_layout(height, width, current_cursor)
         self._scroll_value = 0
         self._force_scrolling_only = force_scrolling_only
@@ -32,6 +45,55 @@ class Scroll_Area(object):
         self._org_lines = lines
         self.init_layout(self._height, self._org_width, 0, update_org_width=update_org_width)
 
+    def lines_inserted(self, index, count):
+        """Updates the layout after `count` lines were inserted into the lines list at `index`"""
+        if count <= 0:
+            return
+        was_empty = self.total_num_lines == 0
+        self.total_num_lines = len(self._lines)
+        if not was_empty:
+            # Keep the cursor and the view on the same lines
+            if index <= self._current_cursor:
+                self._current_cursor = self._current_cursor + count
+            if index < self._first_index:
+                self._first_index = self._first_index + count
+        if self._check_scroll_bar_needed():
+            return
+        if not self._virtualized:
+            for i in range(index, index + count):
+                self._lines[i].shorten_to_length(self._width)
+
+    def lines_removed(self, index, count):
+        """Updates the layout after `count` lines were removed from the lines list at `index`"""
+        if count <= 0:
+            return
+        self.total_num_lines = len(self._lines)
+        if self._current_cursor >= index + count:
+            self._current_cursor = self._current_cursor - count
+        elif self._current_cursor >= index:
+            # The line under the cursor was removed. Move the cursor to the line that took its place.
+            self._current_cursor = min(index, self.total_num_lines - 1) if self.total_num_lines > 0 else 0
+        if self._first_index >= index + count:
+            self._first_index = self._first_index - count
+        elif self._first_index > index:
+            self._first_index = index
+        self._check_scroll_bar_needed()
+
+    def line_updated(self, index):
+        """Updates the layout after the line at `index` was replaced"""
+        if not self._virtualized:
+            self._lines[index].shorten_to_length(self._width)
+
+    def _check_scroll_bar_needed(self):
+        """Re-layout if the number of lines changed whether the scroll bar is needed. Returns True on re-layout."""
+        if (len(self._lines) >= self._height) == self.scroll_bar_needed:
+            return False
+        first_index = self._first_index
+        current_cursor = min(self._current_cursor, max(len(self._lines) - 1, 0))
+        self.init_layout(self._height, self._org_width, current_cursor, update_org_width=False)
+        self._first_index = first_index
+        return True
+
     def init_layout(self, height, width, current_cursor, update_org_width=True):
         """Calculate scrollbar layout information based upon the input pane dimensions"""
         if self._org_lines is None:
@@ -55,31 +117,64 @@ class Scroll_Area(object):
                 self.scroll_bar.append(False)
 
         # Trim the lines so they fit horizontally in the pane. If they are too lone, add '...' and cut off the end.
+        # Virtualized scroll areas defer this until the lines are in view (see calculate_trimmed_lines).
         self._trimmed_lines = []
-        self._lines = []
-        for l in self._org_lines:
-            l.shorten_to_length(self._width)
-            # l.data['selected'] = False
-            self._lines.append(l)
-
-        if self._lines:
-            # Mark the approperate line as selected
-            self._lines[current_cursor].data['cursor'] = True
+        self._lines = self._org_lines
+        if not self._virtualized:
+            for l in self._lines:
+                l.shorten_to_length(self._width)
 
         # Calculate the total number of lines that can fit in this scroll area
         self.total_num_lines = len(self._lines)
 
     def cursor(self, selection):
         """Sets the current line selection"""
-        # Remove the old selection
-        self._lines[self._current_cursor].data['cursor'] = False
-        # Assign and mark the current selection
+        if not self._lines:
+            self._current_cursor = 0
+            return
+        # Assign the current selection
         self._current_cursor = selection
         if self._current_cursor < 0:
             self._current_cursor = 0
         elif self._current_cursor > len(self._lines) - 1:
             self._current_cursor = len(self._lines) - 1
-        self._lines[self._current_cursor].data['cursor'] = True
+
+    def get_cursor(self):
+        """Gets the current line selection"""
+        return self._current_cursor
+
+    def get_width(self):
+        """Gets the width available to lines, after making room for the scroll bar"""
+        return self._width
+
+    def scroll_to_end(self):
+        """Scrolls so the last line is at the bottom of the scroll area"""
+        self._scroll_value = 0
+        if self.scroll_bar_needed:
+            self._first_index = max(self.total_num_lines - (self._height - 1), 0)
+
+    def scroll_to_start(self):
+        """Scrolls so the first line is at the top of the scroll area"""
+        self._scroll_value = 0
+        self._first_index = 0
+
+    def scroll_to(self, index):
+        """Scrolls so the line at `index` is at the top of the scroll area (or as close as the lines allow)"""
+        self._scroll_value = 0
+        if self.scroll_bar_needed:
+            self._first_index = min(max(index, 0), max(self.total_num_lines - (self._height - 1), 0))
+
+    def is_at_end(self):
+        """Checks if the last line is in view, including any scrolling that has not been applied yet"""
+        if not self.scroll_bar_needed:
+            return True
+        return self._first_index + self._scroll_value >= self.total_num_lines - (self._height - 1)
+
+    def set_width(self, width):
+        """Changes the width of the scroll area, keeping the cursor and view position"""
+        first_index = self._first_index
+        self.init_layout(self._height, width, self._current_cursor)
+        self._first_index = first_index
 
     def get_first_index(self):
         """Get the first index in lines which should appear in the scroll area"""
@@ -183,6 +278,197 @@ class Scroll_Area(object):
             self.mouse_y_offset = 0
             self._trimmed_lines = self._lines
 
+        if self._virtualized:
+            # Only the lines in view are converted from str and shortened. Lines already shortened to this width are
+            # left alone.
+            if not isinstance(self._trimmed_lines, list):
+                self._trimmed_lines = list(self._trimmed_lines)
+            for i, l in enumerate(self._trimmed_lines):
+                if isinstance(l, str):
+                    l = core.Text_Line(l, None)
+                    self._trimmed_lines[i] = l
+                    if isinstance(self._lines, list):
+                        self._lines[self.mouse_y_offset + i] = l
+                if l.get_shortened_length() != self._width:
+                    l.shorten_to_length(self._width)
+
+def _match_lines(lines, candidates, query, is_current=None):
+    """Get the indices in candidates of the lines that contain query. Case is ignored unless query has capitals.
+
+    If is_current is given, it is checked every few thousand lines, and None is returned once it returns False.
+    """
+    ignore_case = query == query.lower()
+    matches = []
+    for start in range(0, len(candidates), 4096):
+        if is_current is not None and not is_current():
+            return None
+        if ignore_case:
+            matches.extend([i for i in candidates[start:start + 4096] if query in _line_text(lines[i]).lower()])
+        else:
+            matches.extend([i for i in candidates[start:start + 4096] if query in _line_text(lines[i])])
+    return matches
+
+def _line_text(line):
+    # Virtualized panes only convert str lines to Text_Lines as they come into view
+    return line if isinstance(line, str) else line.get_text()
+
+class Filter_View(object):
+    """Filter View
+
+    A read only view of the lines of a sequence at a sorted list of indices. Scroll_Pane shows the lines that match
+    its filter through a Filter_View, so filtering never copies or rebuilds the lines themselves.
+    """
+
+    def __init__(self, lines, indices):
+        self._lines = lines
+        self._indices = indices
+
+    def __len__(self):
+        return len(self._indices)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._lines[i] for i in self._indices[index]]
+        return self._lines[self._indices[index]]
+
+    def __iter__(self):
+        for i in self._indices:
+            yield self._lines[i]
+
+class Selection_Model(object):
+    """Selection Model
+
+    Keeps track of which rows of a list are selected without storing anything per row. The selection is kept
+    as a sorted list of boundaries: a row is selected if an odd number of boundaries are at or before it.
+    Toggling a range of rows only adds or removes its two boundaries, and select-all, clear and invert only flip
+    an inverted flag, so none of the operations depend on the length of the list.
+    """
+
+    def __init__(self, length=0):
+        self.reset(length)
+
+    def reset(self, length=0):
+        """Clears the selection and sets the number of rows"""
+        self._length = length
+        self._edges = []
+        self._inverted = False
+
+    def get_length(self):
+        return self._length
+
+    def is_selected(self, index):
+        """Gets whether or not the row at index is selected"""
+        return (bisect.bisect_right(self._edges, index) % 2 == 1) != self._inverted
+
+    def has_selection_in(self, start, end):
+        """Gets whether or not any row in [start, end) is selected"""
+        if start >= end:
+            return False
+        if bisect.bisect_right(self._edges, start) != bisect.bisect_left(self._edges, end):
+            # The selection changes inside the range, so part of it is selected
+            return True
+        return self.is_selected(start)
+
+    def toggle(self, index):
+        """Toggles the selection of a single row"""
+        self.toggle_range(index, index + 1)
+
+    def toggle_range(self, start, end):
+        """Toggles the selection of every row in [start, end)"""
+        if start >= end:
+            return
+        self._toggle_edge(start)
+        self._toggle_edge(end)
+
+    def set(self, index, value):
+        """Sets the selection of a single row"""
+        if self.is_selected(index) != value:
+            self.toggle(index)
+
+    def select_all(self):
+        self._edges = []
+        self._inverted = True
+
+    def clear(self):
+        self._edges = []
+        self._inverted = False
+
+    def invert(self):
+        self._inverted = not self._inverted
+
+    def first(self):
+        """Gets the index of the first selected row, or -1 if nothing is selected"""
+        for start, _ in self._selected_ranges():
+            return start
+        return -1
+
+    def count(self):
+        """Gets the number of selected rows"""
+        total = 0
+        for start, end in self._selected_ranges():
+            total = total + end - start
+        return total
+
+    def get_selected(self):
+        """Gets a list of the selected row indices"""
+        selected = []
+        for start, end in self._selected_ranges():
+            selected.extend(range(start, end))
+        return selected
+
+    def insert(self, index, count):
+        """Shifts the selection after `count` unselected rows were inserted at index"""
+        if count <= 0:
+            return
+        i = bisect.bisect_left(self._edges, index)
+        for j in range(i, len(self._edges)):
+            self._edges[j] = self._edges[j] + count
+        self._length = self._length + count
+        if (i % 2 == 1) != self._inverted:
+            # The new rows landed inside a selected range. Cut them out of it.
+            self.toggle_range(index, index + count)
+
+    def remove(self, index, count):
+        """Shifts the selection after `count` rows were removed at index"""
+        if count <= 0:
+            return
+        end = index + count
+        lo = bisect.bisect_left(self._edges, index)
+        hi = bisect.bisect_right(self._edges, end)
+        edges = self._edges[:lo]
+        if lo % 2 != hi % 2:
+            # The row after the removed rows had a different state than the row before them
+            edges.append(index)
+        for e in self._edges[hi:]:
+            edges.append(e - count)
+        self._edges = edges
+        self._length = max(self._length - count, 0)
+
+    def _toggle_edge(self, edge):
+        i = bisect.bisect_left(self._edges, edge)
+        if i < len(self._edges) and self._edges[i] == edge:
+            del self._edges[i]
+        else:
+            self._edges.insert(i, edge)
+
+    def _selected_ranges(self):
+        if self._inverted:
+            start = 0
+            for i in range(0, len(self._edges), 2):
+                end = min(self._edges[i], self._length)
+                if end > start:
+                    yield (start, end)
+                start = self._edges[i + 1] if i + 1 < len(self._edges) else self._length
+            if start < self._length:
+                yield (start, self._length)
+        else:
+            for i in range(0, len(self._edges), 2):
+                start = self._edges[i]
+                end = self._edges[i + 1] if i + 1 < len(self._edges) else self._length
+                end = min(end, self._length)
+                if start < end:
+                    yield (start, end)
+
 class Scroll_Pane_Type(Enum):
     READ_ONLY = 1
     CURSOR_ONLY = 2
@@ -200,6 +486,16 @@ class Scroll_Pane(core.Pane):
         SINGLE_SELECT: Scrolls with cursor. A single item can be selected.
         MULTI_SELECT:  Scrolls with cursor. Multiple items can be selected.
 
+    Typing / starts a filter: only lines containing the query are shown, narrowing as each character is typed.
+    Enter keeps the filter, escape clears it, and n and N then move to the next and previous line matching the
+    query. Case is ignored unless the query has capitals. Lists of FILTER_TASK_THRESHOLD lines or more are
+    filtered on a background worker (see core.Pane.submit_task).
+
+    Named Arguments:
+        virtualized: Only shorten lines to the pane width as they scroll into view. Recommended for very long
+                     lists, since setting contents and resizing no longer touch every line. [False]
+        searchable:  Whether or not the /, n and N keys filter and search the contents. [False]
+
     User Functions:
         attach_selection_changed_callback(callback): Attaches a callback that will be ran if selection changes
         attach_cursor_moved_callback(callback):      Attaches a callback that will be ran if the cursor moves
@@ -207,10 +503,25 @@ class Scroll_Pane(core.Pane):
         set_footer_line(footer_line):                Sets the footer line (does not scroll with pane)
         get_contents():                              Gets the contents of this scroll pane (scrollable contents)
         set_contents(contents):                      Sets the contents of this scroll pane (scrollable contents)
+        post_contents(contents):                     Thread-safe set_contents, applied on the next frame
+        append_contents(contents):                   Appends lines to the end of the contents
+        insert_contents(index, contents):            Inserts lines before the specified index
+        update_contents(index, line):                Replaces the line at the specified index
+        remove_contents(index, count):               Removes lines starting at the specified index
         get_selected():                              Gets an array with the indices of the selected items
+        is_selected(index):                          Gets whether or not the item at the specified index is selected
         select(index):                               Selects an item at the specified index
         get_cursor():                                Gets the location of the cursor
         cursor(index):                               Sets the location of the cursor
+        set_filter(query):                           Shows only the lines containing query ('' shows every line)
+        clear_filter():                              Shows every line again
+        get_filter():                                Gets the query of the current filter, or None
+        find_next(reverse=False):                    Moves to the next (or previous) line matching the last query
+        invalidate_rows():                           Draws every row on the next frame. Only rows whose line,
+                                                     index, cursor, selection or scroll bar changed are drawn
+                                                     otherwise. Changes made through Text_Line's methods are seen
+                                                     (see Text_Line.get_revision), so this is only needed after
+                                                     changing a line's text components directly
 
     Overloaded Functions:
         key_input(input_event): Process this pane's key input events
@@ -221,6 +532,9 @@ class Scroll_Pane(core.Pane):
 
         Considerations:
             key_input:
+                The screen offers keys after the focus keys, menu hotkeys and bind_key bindings. Screens created
+                with focused_key_input=True only offer them to the focused pane; set RECEIVES_ALL_KEYS = True on
+                the class to be offered keys while not focused there too.
                 When intercepting key events, overload the key_input event with the following code:
                 def key_input(self, input_event):
                     input_event = super(<CLASS_NAME>, self).key_input(input_event)
@@ -255,7 +569,10 @@ class Scroll_Pane(core.Pane):
                 def process(self, process_time):
                     super(<CLASS_NAME>, self).process(process_time)
                     # Run code that needs to be ran at a regular interval.
-                    # Code MUST be non-blocking.
+                    # Code MUST be non-blocking. Blocking work can be moved to a background worker with
+                    # self.submit_task(func, *args, callback=callback). When running with
+                    # run_as_top_level_async, slow I/O can be awaited in a coroutine started with
+                    # self.spawn(coro, on_done=callback).
 
             draw:
                 When custom items need to be drawn to the screen using self.addstr, this must be done in the
@@ -270,34 +587,62 @@ class Scroll_Pane(core.Pane):
 
     """
 
-    def __init__(self, scroll_type, header=None, footer=None, title='', border_style=core.Screen_Border_Style.FULL):
+    # Filters over at least this many lines run on a background worker
+    FILTER_TASK_THRESHOLD = 20000
+
+    def __init__(self, scroll_type, header=None, footer=None, title='', border_style=core.Screen_Border_Style.FULL, virtualized=False, searchable=False):
         super(Scroll_Pane, self).__init__(title=title, border_style=border_style)
 
         self._scroll_type = scroll_type
+        self._virtualized = virtualized
+
+        self._searchable = searchable
+        self._filter_typing = False
+        self._filter_query = None
+        self._filter_indices = None
+        self._filter_pending = False
+        self._filter_stale = False
+        self._filter_generation = 0
+        # Matching indices for each query filtered since the contents last changed, so typing more narrows an
+        # earlier result and backspace is instant
+        self._filter_cache = {}
+        self._search_query = None
+        # A copy of the contents for background searches, made once per change of the contents
+        self._contents_snapshot = None
+        self._find_pending = None
 
         self._overall_width_reduction = 0
         self._overall_height_reduction = 0
-        self._header_width_reduction = self._overall_width_reduction
+        # Header and footer lines start after the left border, and stop before the right one
+        self._header_width_reduction = 2
 
+        self._header_line = None
+        self._footer_line = None
+        self._scroll_contents = None
+        self.scroll_area = None
         self.set_header_line(header)
         self.set_footer_line(footer)
 
-        self._scroll_contents = None
+        self._selection = Selection_Model()
 
         if self._scroll_type == Scroll_Pane_Type.READ_ONLY:
-            self._overall_width_reduction = math.ceil(self.border_width_reduction / 2)
+            # Lines are drawn two columns in (like the cursor of the other types), and stop before the scroll bar
+            self._overall_width_reduction = 4
         elif self._scroll_type == Scroll_Pane_Type.SINGLE_SELECT or self._scroll_type == Scroll_Pane_Type.MULTI_SELECT or self._scroll_type == Scroll_Pane_Type.CURSOR_ONLY:
             self.cursor_symbol = '>'
             self.cursor_no_symbol = ' '
             self._cursor = 0
+            self.num_pad_len = None
             self._selection_width_reduction = len(self.cursor_symbol)
             self._last_selected_index = -1
         else:
             raise ValueError(f'Unimplemented scroll type "{self._scroll_type}"')
 
-        self.scroll_area = None
-
-
+        self._drawn_rows = None
+        self._drawn_chrome = None
+        self._drawn_footer = None
+        self._drawn_layout = None
+        self._rows_y = 0
 
         self._selection_changed_callback = None
         self._cursor_moved_callback = None
@@ -314,23 +659,25 @@ class Scroll_Pane(core.Pane):
         self._header_line = header_line
         if self._header_line is not None:
             if self._footer_line is not None:
-                self._overall_height_reduction = self.border_height_reduction + 2
+                self._overall_height_reduction = 2
             else:
-                self._overall_height_reduction = self.border_height_reduction + 1
+                self._overall_height_reduction = 1
 
             if not isinstance(self._header_line, core.Text_Line):
-                self._header_line = core.Text_Line(self._header_Line, None)
+                self._header_line = core.Text_Line(self._header_line, None)
 
             if self._h is not None and update_scroll_area is True:
                 if self._scroll_contents is None:
                     if self.scroll_area._height != self._h - self._overall_height_reduction:
                         self.scroll_area = Scroll_Area(self._h - self._overall_height_reduction,
-                                            self._w - self._overall_width_reduction)
+                                            self._w - self._overall_width_reduction,
+                                            virtualized=self._virtualized)
                 else:
                     self.scroll_area = Scroll_Area(self._h - self._overall_height_reduction,
                                             self._w - self._overall_width_reduction,
-                                            lines=self._scroll_contents)
-                if self._cursor is not None:
+                                            lines=self._get_view(),
+                                            virtualized=self._virtualized)
+                if self._has_cursor():
                     self.scroll_area.cursor(self._cursor)
 
                 if self._scroll_type == Scroll_Pane_Type.READ_ONLY:
@@ -351,12 +698,14 @@ class Scroll_Pane(core.Pane):
                 if self._scroll_contents is None:
                     if self.scroll_area._height != self._h - self._overall_height_reduction:
                         self.scroll_area = Scroll_Area(self._h - self._overall_height_reduction,
-                                                   self._w - self._overall_width_reduction)
+                                                   self._w - self._overall_width_reduction,
+                                                   virtualized=self._virtualized)
                 else:
                     self.scroll_area = Scroll_Area(self._h - self._overall_height_reduction,
                                                    self._w - self._overall_width_reduction,
-                                                   lines=self._scroll_contents)
-                if self._cursor is not None:
+                                                   lines=self._get_view(),
+                                                   virtualized=self._virtualized)
+                if self._has_cursor():
                     self.scroll_area.cursor(self._cursor)
 
                 if self._scroll_type == Scroll_Pane_Type.READ_ONLY:
@@ -369,58 +718,271 @@ class Scroll_Pane(core.Pane):
         self._scroll_contents = contents
         self.z = len(contents)
         self._num_options = self.z
-
-        for i in range(0, len(self._scroll_contents)):
-            if isinstance(self._scroll_contents[i], str):
-                self._scroll_contents[i] = core.Text_Line(self._scroll_contents[i], None)
-            self._scroll_contents[i].data['cursor'] = False
-            self._scroll_contents[i].data['selected'] = False
+        self._filter_cache = {}
+        self._contents_snapshot = None
+        if self._filter_query is not None:
+            # The old matches don't apply to the new contents
+            self._filter_generation = self._filter_generation + 1
+            self._filter_indices = []
+            self._filter_stale = True
+
+        if isinstance(self._scroll_contents, list) and not self._virtualized:
+            # Other sequences (like a core.Ring_Buffer) must already hold Text_Lines. Virtualized panes convert
+            # lines as they come into view (see Scroll_Area.calculate_trimmed_lines).
+            for i in range(0, len(self._scroll_contents)):
+                if isinstance(self._scroll_contents[i], str):
+                    self._scroll_contents[i] = core.Text_Line(self._scroll_contents[i], None)
+        self._selection.reset(self.z)
 
         if self._scroll_type == Scroll_Pane_Type.SINGLE_SELECT or self._scroll_type == Scroll_Pane_Type.MULTI_SELECT or self._scroll_type == Scroll_Pane_Type.CURSOR_ONLY:
             self.num_pad_len = len(str(self.z))
             self.num_pad_len_width = self.num_pad_len + 2
             self._overall_width_reduction = self._selection_width_reduction + self.num_pad_len_width
         if self.scroll_area is not None:
-            self.scroll_area.update_lines(self._scroll_contents)
-            if self._cursor is not None:
-                self.scroll_area.cursor(self._cursor)
+            self.scroll_area.update_lines(self._get_view())
+            if self._has_cursor():
+                self.scroll_area.cursor(self._to_view_index(self._cursor))
+            elif self._scroll_type == Scroll_Pane_Type.READ_ONLY:
+                self.scroll_area.set_force_scrolling_only(True)
+        if self._filter_query is not None:
+            self.set_filter(self._filter_query)
         self.needs_drawing()
 
+    def post_contents(self, contents):
+        """Thread-safe version of set_contents. Only the latest contents posted before the next frame are set."""
+        self.post(self.set_contents, contents, coalesce_key=(self, 'set_contents'))
+
+    def append_contents(self, contents):
+        """Appends lines to the end of the contents, keeping the cursor, selection and scroll position"""
+        index = 0 if self._scroll_contents is None else len(self._scroll_contents)
+        self.insert_contents(index, contents)
+
+    def insert_contents(self, index, contents):
+        """Inserts lines before `index`, keeping the cursor, selection and scroll position"""
+        if self._scroll_contents is None:
+            self.set_contents(list(contents))
+            return
+        length = len(self._scroll_contents)
+        if index < 0:
+            index = max(length + index, 0)
+        index = min(index, length)
+
+        lines = [self._prepare_line(c) for c in contents]
+        count = len(lines)
+        if count == 0:
+            return
+        self._scroll_contents[index:index] = lines
+        self._filter_cache = {}
+        self._contents_snapshot = None
+        self.z = len(self._scroll_contents)
+        self._num_options = self.z
+        self._selection.insert(index, count)
+
+        if self._has_cursor() and self._last_selected_index >= index:
+            self._last_selected_index = self._last_selected_index + count
+
+        if self._filter_query is not None:
+            if self._has_cursor() and self._cursor >= index:
+                self._cursor = self._cursor + count
+            self._filter_contents_changed()
+        elif self.scroll_area is not None:
+            if self.scroll_area.get_lines() is None:
+                self.scroll_area.update_lines(self._scroll_contents)
+            else:
+                self.scroll_area.lines_inserted(index, count)
+            if self._has_cursor():
+                self._cursor = self.scroll_area.get_cursor()
+        self._update_num_pad_len()
+        self.needs_drawing(reason='contents inserted')
+
+    def update_contents(self, index, line):
+        """Replaces the line at `index`, keeping its selection state"""
+        if self._scroll_contents is None:
+            raise IndexError('list assignment index out of range')
+        line = self._prepare_line(line)
+        self._scroll_contents[index] = line
+        self._filter_cache = {}
+        self._contents_snapshot = None
+        if self._filter_query is not None:
+            self._filter_contents_changed()
+        elif self.scroll_area is not None:
+            self.scroll_area.line_updated(index)
+        self.needs_drawing(reason='contents updated')
+
+    def remove_contents(self, index, count=1):
+        """Removes `count` lines starting at `index`, keeping the cursor, selection and scroll position"""
+        if self._scroll_contents is None:
+            return
+        length = len(self._scroll_contents)
+        if index < 0:
+            index = length + index
+        if index < 0 or index >= length or count <= 0:
+            return
+        count = min(count, length - index)
+
+        selection_changed = self._selection.has_selection_in(index, index + count)
+        del self._scroll_contents[index:index + count]
+        self._filter_cache = {}
+        self._contents_snapshot = None
+        self.z = len(self._scroll_contents)
+        self._num_options = self.z
+        self._selection.remove(index, count)
+
+        cursor_moved = False
+        if self._has_cursor():
+            if self._last_selected_index >= index + count:
+                self._last_selected_index = self._last_selected_index - count
+            elif self._last_selected_index >= index:
+                self._last_selected_index = -1
+            cursor_moved = index <= self._cursor < index + count
+
+        if self.scroll_area is not None and self._filter_query is None:
+            self.scroll_area.lines_removed(index, count)
+            if self._has_cursor():
+                self._cursor = self.scroll_area.get_cursor()
+        elif self._has_cursor():
+            if self._cursor >= index + count:
+                self._cursor = self._cursor - count
+            elif self._cursor >= index:
+                self._cursor = max(min(index, self.z - 1), 0)
+        self._update_num_pad_len()
+        if self._filter_query is not None:
+            self._filter_contents_changed()
+
+        if cursor_moved:
+            self._try_cursor_moved_callback(self._cursor)
+        if selection_changed:
+            self._fire_selection_change()
+        self.needs_drawing(reason='contents removed')
+
     def get_selected(self):
         if self._scroll_type == Scroll_Pane_Type.SINGLE_SELECT:
-            lines = self.scroll_area.get_lines()
-            for i in range(0, len(lines)):
-                if lines[i].data['selected'] is True:
-                    return i
-            return -1
+            return self._selection.first()
         elif self._scroll_type == Scroll_Pane_Type.MULTI_SELECT:
-            lines = self.scroll_area.get_lines()
-            selected_indices = []
-            for i in range(0, len(lines)):
-                if lines[i].data['selected'] is True:
-                    selected_indices.append(i)
-            return selected_indices
+            return self._selection.get_selected()
         else:
             return None
 
+    def is_selected(self, index):
+        return self._selection.is_selected(index)
+
     def select(self, selection, clear=True):
         if clear:
-            for l in self.scroll_area.get_lines():
-                l.data['selected'] = False
-            self.scroll_area.get_lines()[selection].data['selected'] = True
+            self._selection.clear()
+            self._selection.set(selection, True)
         else:
-            self.scroll_area.get_lines()[selection].data['selected'] = not self.scroll_area.get_lines()[selection].data['selected']
+            self._selection.toggle(selection)
         self._fire_selection_change()
         self.needs_drawing()
 
     def get_cursor(self):
-        return self._cursor
+        return self._cursor if self._has_cursor() else None
 
     def cursor(self, cursor):
+        if self._filter_indices:
+            # Only lines that match the filter can hold the cursor
+            cursor = self._filter_indices[self._to_view_index(cursor)]
         self._cursor = cursor
-        self.scroll_area.cursor(self._cursor)
+        self.scroll_area.cursor(self._to_view_index(self._cursor))
         self._try_cursor_moved_callback(self._cursor)
 
+    def set_filter(self, query):
+        if self._scroll_contents is None:
+            return
+        if query == '':
+            self.clear_filter()
+            return
+        self._filter_query = query
+        self._search_query = query
+        self._filter_generation = self._filter_generation + 1
+        generation = self._filter_generation
+
+        indices = self._filter_cache.get(query)
+        if indices is not None:
+            self._filter_done(generation, query, indices)
+            return
+
+        # Narrow the smallest earlier result that this query extends, rather than searching every line
+        candidates = None
+        for q, i in self._filter_cache.items():
+            if query.startswith(q) and (candidates is None or len(i) < len(candidates)):
+                candidates = i
+        if candidates is None:
+            candidates = range(0, len(self._scroll_contents))
+
+        if len(candidates) >= self.FILTER_TASK_THRESHOLD and isinstance(self._scroll_contents, list):
+            if self._filter_stale:
+                # The lines shown were matched against the old contents
+                self._show_filter([])
+            self._filter_pending = True
+            self.submit_task(_match_lines, self._get_contents_snapshot(), candidates, query,
+                             lambda: generation == self._filter_generation,
+                             callback=lambda indices: self._filter_done(generation, query, indices))
+            self.needs_drawing(reason='filter started')
+        else:
+            self._filter_done(generation, query, _match_lines(self._scroll_contents, candidates, query))
+
+    def clear_filter(self):
+        if self._filter_query is None:
+            return
+        self._filter_query = None
+        self._filter_pending = False
+        self._filter_stale = False
+        self._filter_generation = self._filter_generation + 1
+        self._show_filter(None)
+
+    def get_filter(self):
+        return self._filter_query
+
+    def find_next(self, reverse=False):
+        """Moves the cursor (or the view, for READ_ONLY panes) to the next line matching the last query, wrapping
+        around. Returns False if no line matches. Lists of FILTER_TASK_THRESHOLD lines or more are searched on a
+        background worker the first time, and the move happens when the search finishes."""
+        if self._search_query is None or self._scroll_contents is None or self.scroll_area is None:
+            return False
+        if self._filter_query is not None:
+            # Every line shown matches
+            matches = self._filter_indices
+        else:
+            query = self._search_query
+            matches = self._filter_cache.get(query)
+            if matches is None:
+                count = len(self._scroll_contents)
+                if count >= self.FILTER_TASK_THRESHOLD and isinstance(self._scroll_contents, list):
+                    if self._find_pending != query:
+                        self._find_pending = query
+                        snapshot = self._get_contents_snapshot()
+                        self.submit_task(_match_lines, snapshot, range(0, count), query,
+                                         lambda: snapshot is self._contents_snapshot,
+                                         callback=lambda matches: self._find_done(snapshot, query, matches, reverse),
+                                         error_callback=lambda e: self._find_done(snapshot, query, None, reverse))
+                    return True
+                matches = _match_lines(self._scroll_contents, range(0, count), query)
+                self._filter_cache[query] = matches
+        if len(matches) == 0:
+            return False
+
+        if self._has_cursor():
+            position = self._cursor
+        else:
+            position = self._to_content_index(self.scroll_area.get_first_index())
+        if reverse:
+            i = bisect.bisect_left(matches, position) - 1
+        else:
+            i = bisect.bisect_right(matches, position)
+            if i == len(matches):
+                i = 0
+
+        if self._has_cursor():
+            self.cursor(matches[i])
+        else:
+            self.scroll_area.scroll_to(self._to_view_index(matches[i]))
+        self.needs_drawing(reason='found next')
+        return True
+
+    def get_captures_text_input(self):
+        return self._filter_typing and self._focus
+
     ## Overloaded Functions ##
 
     def key_input(self, input_event):
@@ -428,18 +990,21 @@ class Scroll_Pane(core.Pane):
         key = input_event.key
         if key is None or self._focus == False:
             return input_event
+        if self._searchable and self._filter_key_input(input_event):
+            input_event.absorb()
+            return input_event
         if key == 258:  # Down Arrow
-            return self._step_by(1, input_event)
+            return self._step_by(input_event.repeat, input_event)
         elif key == 336:  # Shift-Down Arrow
-            return self._step_by(5, input_event)
+            return self._step_by(5 * input_event.repeat, input_event)
         elif key == 259:  # Up Arrow
-            return self._step_by(-1, input_event)
+            return self._step_by(-input_event.repeat, input_event)
         elif key == 261:  # Right Arrow
             return self._return_to_end(input_event)
         elif key == 260:  # Left Arrow
             return self._return_to_begining(input_event)
         elif key == 337:  # Shift-Up Arrow
-            return self._step_by(-5, input_event)
+            return self._step_by(-5 * input_event.repeat, input_event)
         elif key == 32:   # Space
             return self._selection_event(input_event)
         elif key == 43:   # Plus
@@ -457,13 +1022,15 @@ class Scroll_Pane(core.Pane):
             if self.mouse_state == curses.BUTTON1_PRESSED or self.mouse_state == curses.BUTTON1_CLICKED:
                 offset_y, _ = self._win.getbegyx()
                 header_offset = 1 if self._header_line is not None else 0
-                self.cursor(self._my - offset_y + self.scroll_area.mouse_y_offset - header_offset)
+                if self._filter_indices is not None and len(self._filter_indices) == 0:
+                    return input_event
+                self.cursor(self._to_content_index(self._my - offset_y + self.scroll_area.mouse_y_offset - header_offset))
                 self.needs_drawing()
                 input_event.absorb()
             elif self.mouse_state == helpers.REPORT_MOUSE_POSITION: # Mouse wheel down
-                return self._step_by(1, input_event)
+                return self._step_by(input_event.repeat, input_event)
             elif self.mouse_state == curses.BUTTON4_PRESSED: # Mouse wheel up
-                return self._step_by(-1, input_event) 
+                return self._step_by(-input_event.repeat, input_event)
 
             return input_event
         else:
@@ -490,16 +1057,25 @@ class Scroll_Pane(core.Pane):
 
         if self._scroll_contents is None:
             self.scroll_area = Scroll_Area(self._h - self._overall_height_reduction,
-                                           self._w - self._overall_width_reduction)
+                                           self._w - self._overall_width_reduction,
+                                           virtualized=self._virtualized)
         else:
             self.scroll_area = Scroll_Area(self._h - self._overall_height_reduction,
                                            self._w - self._overall_width_reduction,
-                                           lines=self._scroll_contents)
+                                           lines=self._get_view(),
+                                           virtualized=self._virtualized)
 
         if self._scroll_type == Scroll_Pane_Type.READ_ONLY:
             self.scroll_area.set_force_scrolling_only(True)
+        elif self._scroll_contents is not None:
+            self.scroll_area.cursor(self._to_view_index(self._cursor))
+        self._drawn_rows = None
         self.needs_drawing()
 
+    def unfocus(self):
+        super(Scroll_Pane, self).unfocus()
+        self._filter_typing = False
+
     def window_size_update(self):
         super(Scroll_Pane, self).window_size_update()
 
@@ -509,88 +1085,290 @@ class Scroll_Pane(core.Pane):
     def draw(self):
         if not self.get_needs_drawing():
             return
-        self.draw_border()
-        # self.init_frame(title=self._title, unfocused_line_color=curses.color_pair(2))
 
         self.scroll_area.calculate_trimmed_lines()
         lines = self.scroll_area.get_trimmed_lines()
-        index = self.scroll_area.get_first_index()
+        first_index = self.scroll_area.get_first_index()
         scroll = self.scroll_area.get_scroll_bar()
-        screen_index = 0
+
+        # Only the parts of the pane that changed since the last frame are drawn. If the layout of the rows
+        # changed, everything is drawn again.
+        layout = (self.scroll_area, self.scroll_area.get_width(), self._overall_width_reduction,
+                  self._header_line is None, self._footer_line is None)
+        if self._drawn_rows is None or layout != self._drawn_layout:
+            # Rows drawn with the old layout are still on the window, so they have to be blanked too
+            self._drawn_rows = [False] * (0 if self._drawn_rows is None else len(self._drawn_rows))
+            self._drawn_chrome = None
+            self._drawn_layout = layout
+
+        chrome = (self._focus, self._title, None if self._header_line is None else str(self._header_line),
+                  self._get_filter_prompt())
+        if chrome != self._drawn_chrome:
+            self._draw_chrome()
+            self._drawn_chrome = chrome
+            self._drawn_footer = None
+
+        if self._footer_line is not None and str(self._footer_line) != self._drawn_footer:
+            self._draw_footer()
+            self._drawn_footer = str(self._footer_line)
+
+        has_cursor = self._has_cursor()
+        cursor_index = self.scroll_area.get_cursor() if has_cursor else -1
+        filter_indices = self._filter_indices
+        drawn_rows = self._drawn_rows
+        for screen_index in range(0, max(len(lines), len(drawn_rows))):
+            if screen_index < len(lines):
+                view_index = first_index + screen_index
+                # Rows show the index of the line in the contents, even while filtering
+                index = view_index if filter_indices is None else filter_indices[view_index]
+                bar = None if scroll is None else scroll[screen_index]
+                line = lines[screen_index]
+                # The revision catches lines changed in place (like uniform_color), not only replaced ones
+                if has_cursor:
+                    row = (line, line.get_revision(), index, view_index == cursor_index, self._selection.is_selected(index), bar)
+                else:
+                    row = (line, line.get_revision(), index, bar)
+            else:
+                row = None
+
+            if screen_index < len(drawn_rows):
+                if drawn_rows[screen_index] == row:
+                    continue
+                drawn_rows[screen_index] = row
+            else:
+                drawn_rows.append(row)
+            self._draw_row(self._rows_y + screen_index, row)
+        del drawn_rows[len(lines):]
+
+        super(Scroll_Pane, self).draw()
+
+    def clear(self):
+        super(Scroll_Pane, self).clear()
+        self.invalidate_rows()
+
+    def invalidate_rows(self):
+        """Draw every row on the next frame, not only the ones that changed"""
+        self._drawn_rows = None
+        self.needs_drawing(reason='rows invalidated')
+
+    ## Private Functions ##
+
+    def _blank_row(self, y):
+        x = 1 if self._border_style == core.Screen_Border_Style.FULL else 0
+        self._win.addstr(y, x, ' ' * (self._w - 1 - x))
+
+    def _draw_chrome(self):
+        self.draw_border()
 
         if self._header_line is not None:
             if self._header_line.get_has_been_shortened() is False:
                 self._header_line.shorten_to_length(self._w - self._header_width_reduction)
+            try:
+                self._blank_row(self.line_counter)
+            except curses.error:
+                pass
             self._header_line.output_to_window(self._win, self.line_counter, 1)
             self.inc()
 
-        if self._footer_line is not None:
-            if self._footer_line.get_has_been_shortened() is False:
-                self._footer_line.shorten_to_length(self._w - self._header_width_reduction)
-            self._footer_line.output_to_window(self._win, self._h - math.ceil(self._overall_height_reduction/2) - 1, 1)
+        self._rows_y = self.line_counter
 
-        if self._scroll_type == Scroll_Pane_Type.READ_ONLY:
-            for l in lines:
-                l.output_to_window(self._win, self.line_counter, self._overall_width_reduction)
-                if scroll is not None:
-                    if not scroll[screen_index]:
-                        self.addstr_auto(self._w-4, '▊', color=curses.color_pair(2), inc=False)
-                    else:
-                        self.addstr_auto(self._w-4, '▊', color=curses.color_pair(1), inc=False)
-                self.inc()
-                index = index + 1
-                screen_index = screen_index + 1
-        elif self._scroll_type == Scroll_Pane_Type.SINGLE_SELECT or self._scroll_type == Scroll_Pane_Type.MULTI_SELECT or self._scroll_type == Scroll_Pane_Type.CURSOR_ONLY:
-            for l in lines:
-                c = l.data['cursor']
-                s = l.data['selected']
+        prompt = self._get_filter_prompt()
+        if prompt is not None:
+            self._draw_filter_prompt(prompt)
 
+    def _draw_footer(self):
+        if self._footer_line.get_has_been_shortened() is False:
+            self._footer_line.shorten_to_length(self._w - self._header_width_reduction)
+        # The footer sits on the row after the last row of the scroll area
+        footer_y = self._rows_y + self.scroll_area._height - 1
+        try:
+            self._blank_row(footer_y)
+        except curses.error:
+            pass
+        self._footer_line.output_to_window(self._win, footer_y, 1)
+
+    def _draw_row(self, y, row):
+        try:
+            self._blank_row(y)
+            if row is None:
+                return
+            if self._scroll_type == Scroll_Pane_Type.READ_ONLY:
+                l, _, _, bar = row
+                l.output_to_window(self._win, y, 2)
+            elif self._scroll_type == Scroll_Pane_Type.SINGLE_SELECT or self._scroll_type == Scroll_Pane_Type.MULTI_SELECT or self._scroll_type == Scroll_Pane_Type.CURSOR_ONLY:
+                l, _, index, c, s, bar = row
                 selected_color_mod = curses.A_REVERSE if s else 0
-
-
-                self.addstr_auto(0, self.cursor_symbol if c else self.cursor_no_symbol, curses.color_pair(1) | selected_color_mod, inc=False)
-
-                self.addstr_auto(len(self.cursor_symbol), (str(index)+':').ljust(self.num_pad_len_width, ' '), curses.color_pair(1) | selected_color_mod, inc=False)
-
-                l.output_to_window(self._win, self.line_counter, len(self.cursor_symbol)+self.num_pad_len_width+2, highlight=selected_color_mod)
-                # self.addstr_auto(len(self.cursor_symbol)+self.num_pad_len_width, str(l), inc=False)
-                if scroll is not None:
-                    if not scroll[screen_index]:
-                        self.addstr_auto(self._w-4, '▊', color=curses.color_pair(2), inc=False)
-                    else:
-                        self.addstr_auto(self._w-4, '▊', color=curses.color_pair(1), inc=False)
-                self.inc()
-                index = index + 1
-                screen_index = screen_index + 1
+                self.addstr(y, 0, self.cursor_symbol if c else self.cursor_no_symbol, curses.color_pair(1) | selected_color_mod)
+                self.addstr(y, len(self.cursor_symbol), (str(index)+':').ljust(self.num_pad_len_width, ' '), curses.color_pair(1) | selected_color_mod)
+                l.output_to_window(self._win, y, len(self.cursor_symbol)+self.num_pad_len_width+2, highlight=selected_color_mod)
+            else:
+                raise ValueError(f'Unimplemented scroll type "{self._scroll_type}"')
+            if bar is not None:
+                self.addstr(y, self._w-4, '▊', color=curses.color_pair(1) if bar else curses.color_pair(2))
+        except curses.error:
+            pass
+
+    def _get_filter_prompt(self):
+        if not self._filter_typing and self._filter_query is None:
+            return None
+        prompt = '/' + ('' if self._filter_query is None else self._filter_query)
+        if self._filter_pending:
+            return prompt + ' (filtering)'
+        if self._filter_query is not None:
+            return prompt + f' ({len(self._filter_indices)} of {self.z})'
+        return prompt
+
+    def _draw_filter_prompt(self, prompt):
+        # The prompt goes on the lower border, like the title on the upper one
+        if self._border_style == core.Screen_Border_Style.FULL:
+            win, y = self._base_win, self._base_h - 1
+        elif self._border_style == core.Screen_Border_Style.NO_SIDES:
+            win, y = self._lower_win, 0
         else:
-            raise ValueError(f'Unimplemented scroll type "{self._scroll_type}"')
-
-        super(Scroll_Pane, self).draw()
+            return
+        try:
+            win.addstr(y, 2, f' {prompt} '[0:max(self._base_w - 4, 0)], curses.color_pair(1))
+            core.present(win)
+        except curses.error:
+            pass
+
+    def _filter_key_input(self, input_event):
+        """Handles the filter and search keys. Returns True if the key was used."""
+        key = input_event.key
+        if self._filter_typing:
+            query = '' if self._filter_query is None else self._filter_query
+            if 32 <= key <= 126:
+                self.set_filter(query + chr(key))
+            elif key == curses.KEY_BACKSPACE or key == 127 or key == 8:
+                self.set_filter(query[0:-1])
+            elif key == 10 or key == 13 or key == curses.KEY_ENTER:
+                self._filter_typing = False
+            elif key == 27:  # Escape
+                self._filter_typing = False
+                self.clear_filter()
+            else:
+                return False
+        elif key == 47:  # Slash
+            self._filter_typing = True
+            self.clear_filter()
+        elif key == 27 and self._filter_query is not None:  # Escape
+            self.clear_filter()
+        elif (key == 110 or key == 78) and self._search_query is not None:  # n or N
+            self.find_next(reverse=key == 78)
+        else:
+            return False
+        self.needs_drawing(reason='filter key')
+        return True
 
-    ## Private Functions ##
+    def _filter_done(self, generation, query, indices):
+        if generation != self._filter_generation:
+            # The query or the contents changed since this filter started
+            return
+        self._filter_pending = False
+        self._filter_stale = False
+        self._filter_cache[query] = indices
+        self._show_filter(indices)
+
+    def _find_done(self, snapshot, query, matches, reverse):
+        if self._find_pending == query:
+            self._find_pending = None
+        if matches is None or snapshot is not self._contents_snapshot:
+            # The contents changed since the search started
+            return
+        self._filter_cache[query] = matches
+        if query == self._search_query and self._filter_query is None:
+            self.find_next(reverse)
+
+    def _get_contents_snapshot(self):
+        # Background searches get their own copy of the list, so the contents can change while they run. The copy is
+        # only made again once the contents change.
+        if self._contents_snapshot is None:
+            self._contents_snapshot = list(self._scroll_contents)
+        return self._contents_snapshot
+
+    def _filter_contents_changed(self):
+        """Filter the contents again after they changed under an active filter"""
+        self._filter_cache = {}
+        self._contents_snapshot = None
+        self._filter_stale = True
+        self.set_filter(self._filter_query)
+
+    def _show_filter(self, indices):
+        """Show the lines at indices (every line if None), keeping the cursor (or the top line) where it was"""
+        top = None
+        if self.scroll_area is not None and not self._has_cursor() and self.scroll_area.total_num_lines > 0:
+            top = self._to_content_index(self.scroll_area.get_first_index())
+        self._filter_indices = indices
+        cursor_moved = False
+        if self._has_cursor() and indices:
+            cursor = indices[self._to_view_index(self._cursor)]
+            cursor_moved = cursor != self._cursor
+            self._cursor = cursor
+        if self.scroll_area is not None:
+            self.scroll_area.update_lines(self._get_view())
+            if self._has_cursor():
+                self.scroll_area.cursor(self._to_view_index(self._cursor))
+            elif top is not None:
+                self.scroll_area.scroll_to(self._to_view_index(top))
+        if cursor_moved:
+            self._try_cursor_moved_callback(self._cursor)
+        self.needs_drawing(reason='filter changed')
+
+    def _get_view(self):
+        """Get the lines the scroll area shows: the contents, or the lines that match the filter"""
+        if self._filter_indices is None or self._scroll_contents is None:
+            return self._scroll_contents
+        return Filter_View(self._scroll_contents, self._filter_indices)
+
+    def _to_view_index(self, index):
+        """Get the row showing the line at index in the contents, or the next shown row if it is filtered out"""
+        if self._filter_indices is None:
+            return index
+        return max(min(bisect.bisect_left(self._filter_indices, index), len(self._filter_indices) - 1), 0)
+
+    def _to_content_index(self, view_index):
+        if self._filter_indices is None:
+            return view_index
+        return self._filter_indices[max(min(view_index, len(self._filter_indices) - 1), 0)]
+
+    def _has_cursor(self):
+        return self._scroll_type == Scroll_Pane_Type.SINGLE_SELECT or self._scroll_type == Scroll_Pane_Type.MULTI_SELECT or self._scroll_type == Scroll_Pane_Type.CURSOR_ONLY
+
+    def _prepare_line(self, line):
+        if isinstance(line, str):
+            line = core.Text_Line(line, None)
+        return line
+
+    def _update_num_pad_len(self):
+        """Recalculate the width of the index column. The scroll area is only rebuilt if the width changed."""
+        if not self._has_cursor():
+            return
+        num_pad_len = len(str(self.z))
+        if num_pad_len == self.num_pad_len:
+            return
+        self.num_pad_len = num_pad_len
+        self.num_pad_len_width = self.num_pad_len + 2
+        self._overall_width_reduction = self._selection_width_reduction + self.num_pad_len_width
+        if self.scroll_area is not None and self._w is not None:
+            self.scroll_area.set_width(self._w - self._overall_width_reduction)
 
     def _fire_selection_change(self):
         self._last_selected_index = self._cursor
         if self._selection_changed_callback is not None:
-            lines = self.scroll_area.get_lines()
-            selection_arr = []
-            for i in range(0, len(lines) - 1):
-                if lines[i].data['selected'] == True:
-                    selection_arr.append(i)
-            self._selection_changed_callback(selection_arr)
+            self._selection_changed_callback(self._selection.get_selected())
 
     def _bulk_selection_event(self, input_event):
+        if self._scroll_type == Scroll_Pane_Type.READ_ONLY:  # No cursor or selection to change
+            return input_event
         if input_event.key == 27:  # Escape
-            for l in self.scroll_area.get_lines():
-                l.data['selected'] = False
+            self._selection.clear()
             self._fire_selection_change()
             self.needs_drawing()
             input_event.absorb()
             return input_event
         elif input_event.key == 1: # control-a
             if self._scroll_type == Scroll_Pane_Type.MULTI_SELECT:
-                for l in self.scroll_area.get_lines():
-                    l.data['selected'] = not l.data['selected']
+                self._selection.invert()
                 self._fire_selection_change()
                 self.needs_drawing()
                 input_event.absorb()
@@ -599,13 +1377,10 @@ class Scroll_Pane(core.Pane):
             if self._scroll_type == Scroll_Pane_Type.MULTI_SELECT:
                 if self._cursor == self._last_selected_index or self._last_selected_index == -1:
                     return input_event
-                lines = self.scroll_area.get_lines()
                 if self._cursor > self._last_selected_index:
-                    for i in range(self._last_selected_index + 1, self._cursor + 1):
-                        lines[i].data['selected'] = not lines[i].data['selected']
+                    self._selection.toggle_range(self._last_selected_index + 1, self._cursor + 1)
                 else:
-                    for i in range(self._cursor + 1, self._last_selected_index + 1):
-                        lines[i].data['selected'] = not lines[i].data['selected']
+                    self._selection.toggle_range(self._cursor + 1, self._last_selected_index + 1)
                 self._fire_selection_change()
                 self.needs_drawing()
                 input_event.absorb()
@@ -614,13 +1389,15 @@ class Scroll_Pane(core.Pane):
             raise ValueError(f'Unimplemented bulk selection key "{input_event.key}"')
 
     def _selection_event(self, input_event, force_to_value=None):
+        if self._scroll_type == Scroll_Pane_Type.READ_ONLY:  # No cursor or selection to change
+            return input_event
+        if self._filter_indices is not None and len(self._filter_indices) == 0:
+            return input_event
         if force_to_value is not None and (self._scroll_type == Scroll_Pane_Type.SINGLE_SELECT or self._scroll_type == Scroll_Pane_Type.MULTI_SELECT):
             if force_to_value is True:
-                for l in self.scroll_area.get_lines():
-                    l.data['selected'] = True
+                self._selection.select_all()
             else:
-                for l in self.scroll_area.get_lines():
-                    l.data['selected'] = False
+                self._selection.clear()
             self._fire_selection_change()
             self.needs_drawing()
             input_event.absorb()
@@ -648,14 +1425,20 @@ class Scroll_Pane(core.Pane):
         if self._scroll_type == Scroll_Pane_Type.READ_ONLY:
             end_stop = not self.scroll_area.scroll_by(step)
         elif self._scroll_type == Scroll_Pane_Type.SINGLE_SELECT or self._scroll_type == Scroll_Pane_Type.MULTI_SELECT or self._scroll_type == Scroll_Pane_Type.CURSOR_ONLY:
-            cur = self._cursor + step
+            if self._filter_indices is None:
+                num_rows = self._num_options
+            elif len(self._filter_indices) == 0:
+                return ie
+            else:
+                num_rows = len(self._filter_indices)
+            cur = self._to_view_index(self._cursor) + step
             if cur < 0:
                 cur = 0
                 end_stop = True
-            elif cur > self._num_options - 1:
-                cur = self._num_options - 1
+            elif cur > num_rows - 1:
+                cur = num_rows - 1
                 end_stop = True
-            self.cursor(cur)
+            self.cursor(self._to_content_index(cur))
             self.needs_drawing()
         else:
             raise ValueError(f'Unimplemented scroll type "{self._scroll_type}"')
@@ -667,19 +1450,126 @@ class Scroll_Pane(core.Pane):
         return ie
 
     def _return_to_begining(self, ie):
-        self.cursor(0)
+        if self._filter_indices is not None and len(self._filter_indices) == 0:
+            return ie
+        self.cursor(self._to_content_index(0))
         ie.absorb()
         self.needs_drawing()
         return ie
 
     def _return_to_end(self, ie):
-        self.cursor(self._num_options - 1)
+        if self._filter_indices is None:
+            self.cursor(self._num_options - 1)
+        elif len(self._filter_indices) == 0:
+            return ie
+        else:
+            self.cursor(self._filter_indices[-1])
         ie.absorb()
         self.needs_drawing()
         return ie
 
 # TODO: Finish allowing specific border modes to be set with set_border_mode
 
+class Log_Pane(Scroll_Pane):
+    """Log Pane
+
+    A read only scroll pane for streaming output, such as a tailed service log. Lines are kept in a fixed-capacity
+    core.Ring_Buffer, so appending a line is O(1), drawing costs as much as the lines in view, and memory never
+    grows past the capacity. The oldest lines are evicted once the buffer is full, and the footer line shows how
+    many have been evicted.
+
+    The pane follows the tail (keeps the newest line in view) until the user scrolls up, and follows it again once
+    they scroll back to the bottom or press the right arrow. The left arrow jumps to the oldest line.
+
+    Named Arguments:
+        capacity: The number of lines kept [10000]
+
+    User Functions:
+        append_line(line):    Appends a line (a string or core.Text_Line)
+        append_lines(lines):  Appends several lines
+        clear_lines():        Removes every line
+        get_evicted_count():  Gets the number of lines evicted since the pane was created
+        set_follow(follow):   Sets whether or not the pane follows the tail
+        get_follow():         Gets whether or not the pane follows the tail
+    """
+    def __init__(self, capacity=10000, header=None, title='', border_style=core.Screen_Border_Style.FULL):
+        super(Log_Pane, self).__init__(Scroll_Pane_Type.READ_ONLY, header=header, footer=core.Text_Line('', None),
+                                       title=title, border_style=border_style, virtualized=True, searchable=False)
+        self._buffer = core.Ring_Buffer(capacity)
+        self._follow = True
+        self._footer_status = None
+        self.set_contents(self._buffer)
+
+    def append_line(self, line):
+        if not isinstance(line, core.Text_Line):
+            line = core.Text_Line(line, None)
+        evicted = self._buffer.append(line)
+        self.z = len(self._buffer)
+        self._num_options = self.z
+        if self.scroll_area is not None:
+            if evicted:
+                self.scroll_area.lines_removed(0, 1)
+            self.scroll_area.lines_inserted(self.z - 1, 1)
+            if self._follow:
+                self.scroll_area.scroll_to_end()
+        self.needs_drawing(reason='line appended')
+
+    def append_lines(self, lines):
+        for l in lines:
+            self.append_line(l)
+
+    def clear_lines(self):
+        self._buffer.clear()
+        self.set_contents(self._buffer)
+        self._follow = True
+
+    def get_evicted_count(self):
+        return self._buffer.get_evicted_count()
+
+    def set_follow(self, follow):
+        self._follow = follow
+        if follow and self.scroll_area is not None:
+            self.scroll_area.scroll_to_end()
+        self.needs_drawing(reason='follow changed')
+
+    def get_follow(self):
+        return self._follow
+
+    def assign_win(self, win):
+        super(Log_Pane, self).assign_win(win)
+        if self._follow:
+            self.scroll_area.scroll_to_end()
+
+    def key_input(self, input_event):
+        key = input_event.key
+        if key is not None and self._focus and self.scroll_area is not None:
+            if key == 261:  # Right Arrow
+                self.set_follow(True)
+                input_event.absorb()
+                return input_event
+            elif key == 260:  # Left Arrow
+                self._follow = False
+                self.scroll_area.scroll_to_start()
+                self.needs_drawing(reason='scrolled to start')
+                input_event.absorb()
+                return input_event
+
+        input_event = super(Log_Pane, self).key_input(input_event)
+        if self.scroll_area is not None:
+            # Scrolling up stops following the tail, and scrolling back to the bottom starts it again
+            self._follow = self.scroll_area.is_at_end()
+        return input_event
+
+    def draw(self):
+        if not self.get_needs_drawing():
+            return
+        status = (len(self._buffer), self._buffer.get_evicted_count(), self._follow)
+        if status != self._footer_status:
+            self._footer_status = status
+            lines, evicted, follow = status
+            self._footer_line = core.Text_Line(f'{lines} lines, {evicted} evicted' + ('' if follow else ' (paused)'), None)
+        super(Log_Pane, self).draw()
+
 class Screen_Pane(core.Pane):
     def __init__(self, title='', border_style=core.Screen_Border_Style.NO_SIDES):
         super(Screen_Pane, self).__init__(title=title, border_style=border_style)
@@ -689,11 +1579,13 @@ class Screen_Pane(core.Pane):
         self._screen = None
         self._layout = None
         self._top_level = False
+        self._screen_options = {}
+        self._profiler = None
 
     def set_border_mode(self, mode):
         self._border_mode = mode
 
-    def run_as_top_level(self, stdscr):
+    def run_as_top_level(self, stdscr, batched_output=True, event_driven=False, log_file='tinywin.log', focused_key_input=False):
         # h, w = stdscr.getmaxyx()
         # try:
         #     # Check to see if we can write to the bottom right space. If not, we need
@@ -704,25 +1596,50 @@ class Screen_Pane(core.Pane):
         #     # Resize the screen to remove the last line
         #     stdscr.resize(h-1, w)
 
-        # FORMAT = '%(asctime)-15s %(clientip)s %(user)-8s %(message)s'
-        FORMAT = '%(asctime)-15s %(levelname)s %(message)s'
-        logging.basicConfig(format=FORMAT, filename='tinywin.log', level=logging.DEBUG)
+        self._init_top_level(stdscr, batched_output, {'event_driven': event_driven, 'focused_key_input': focused_key_input}, log_file)
+        try:
+            interacting = True
+            while interacting:
+                interacting = self._screen.frame()
+        finally:
+            self._screen.close()
+            tracing.stop_file_logging()
+
+    async def run_as_top_level_async(self, stdscr, batched_output=True, log_file='tinywin.log', focused_key_input=False):
+        """Run this pane as the top level screen on the running asyncio event loop:
+            curses.wrapper(lambda stdscr: asyncio.run(Main_Screen().run_as_top_level_async(stdscr)))
+
+        Key input is read through the event loop, and panes can start coroutines with spawn().
+        """
+        self._init_top_level(stdscr, batched_output, {'event_driven': True, 'focused_key_input': focused_key_input}, log_file)
+        try:
+            await self._screen.run_async()
+        finally:
+            self._screen.close()
+            tracing.stop_file_logging()
+
+    def _init_top_level(self, stdscr, batched_output, screen_options, log_file):
+        if log_file is not None:
+            # Log records are written from a background thread. Debug records are only produced while tracing
+            # is enabled (see tracing.enable).
+            tracing.start_file_logging(log_file, level=logging.DEBUG if tracing.enabled else logging.INFO)
         logging.info('Started logging session')
-        logging.info(f'{curses.longname()} {curses.termname()}')
+        logging.info('%s %s', curses.longname(), curses.termname())
 
 
+        # Panes only stage their changes, and the screen writes them to the terminal once per frame
+        core.set_batched_output(batched_output)
+
         self._stdscr = stdscr
         self._top_level = True
+        self._screen_options = screen_options
         self.assign_win(stdscr)
         self._screen.add_drawable_object_to_begining_of_queue(self)
-        interacting = True
-        while interacting:
-            interacting = self._screen.frame()
 
     def focus(self):
         super(Screen_Pane, self).focus()
         if self._last_focused_pane is not None:
-            self._last_focused_pane.focus()
+            self._layout.get_focus_manager().focus(self._last_focused_pane)
         else:
             self._layout.focus_default()
         # self._layout.set_focus_location_from_object(self._last_focused_pane)
@@ -737,32 +1654,86 @@ class Screen_Pane(core.Pane):
         self.assign_win(self._win)
 
     def assign_win(self, win):
+        if self._screen is not None and win is self._base_win and self._screen.get_layout() is self._layout:
+            # The same window again, after it was resized. The screen is kept and fitted to the new size.
+            self.fit_to_window()
+            return
+
         super(Screen_Pane, self).assign_win(win)
         if self._layout is None:
             raise Exception('Configure a layout before assigning a window')
 
+        geometry = self._get_sub_win_geometry()
+        self._sub_win = self._win if geometry is None else win.derwin(*geometry)
+        self._layout.assign_win(self._sub_win)
+
+        self._screen = screen.Screen(win, sub_screen=(not self._top_level), **self._screen_options)
+        self._screen.build(self._layout)
+        self._screen.set_profiler(self._profiler)
+        self._screen.force_needs_drawing()
+
+    def fit_to_window(self, erased=True):
+        """Fit this screen to the current size of its window, reusing its windows. Only panes whose size changes
+        are given their windows again, and, unless the window was erased, drawn again. Called by the screen after
+        the terminal is resized."""
+        super(Screen_Pane, self).assign_win(self._base_win)
+        geometry = self._get_sub_win_geometry()
+        if geometry is None:
+            self._sub_win = self._win
+        else:
+            self._sub_win = core.fit_derwin(self._sub_win if self._sub_win is not self._base_win else None, self._base_win, *geometry)
+        self._layout.resize_win(self._sub_win, erased=erased)
+
+    def _get_sub_win_geometry(self):
+        # The sub window is derived from the base window (rather than self._win), so it can be fitted to the base
+        # window's new size
         if self._border_style == core.Screen_Border_Style.FULL:
-            self._sub_win = self._win.derwin(self._h - 1, self._w - 2, 1, 1)
+            return (self._base_h - 2, self._base_w - 2, 1, 1)
         elif self._border_style == core.Screen_Border_Style.BORDERLESS:
-            self._sub_win = self._win
+            return None
         elif self._border_style == core.Screen_Border_Style.NO_SIDES:
-            self._sub_win = self._win.derwin(self._h - 1, self._w, 0, 0)
+            return (self._base_h - 2, self._base_w, 1, 0)
         else:
             raise NotImplementedError(f'Border style not implemented: {self._border_style}')
 
-
-        self._layout.assign_win(self._sub_win)
-
-        self._screen = screen.Screen(win, sub_screen=(not self._top_level))
-        self._screen.build(self._layout)
-        self._screen.force_needs_drawing()
-
     def process(self, current_time):
         if self._top_level is False:
             self._screen.process(current_time)
 
         super(Screen_Pane, self).process(current_time)
 
+    def set_profiler(self, profiler):
+        """Profile this screen and every nested screen with a profiling.Frame_Profiler (None stops profiling)"""
+        self._profiler = profiler
+        if self._screen is not None:
+            self._screen.set_profiler(profiler)
+
+    def get_screen(self):
+        return self._screen
+
+    def get_needs_drawing(self):
+        if super(Screen_Pane, self).get_needs_drawing():
+            return True
+        return self._top_level is False and self._screen is not None and self._screen.get_needs_drawing()
+
+    def cancel_tasks(self):
+        super(Screen_Pane, self).cancel_tasks()
+        if self._top_level is False and self._screen is not None:
+            self._screen.cancel_tasks()
+
+    def close(self):
+        super(Screen_Pane, self).close()
+        if self._top_level is False and self._screen is not None:
+            self._screen.close_panes()
+
+    def get_next_deadline(self, current_time):
+        if self._top_level is False and self._screen is not None:
+            return self._screen.get_next_deadline(current_time)
+        return super(Screen_Pane, self).get_next_deadline(current_time)
+
+    def get_captures_text_input(self):
+        return self._top_level is False and self._focus and self._screen is not None and self._screen.get_captures_text_input()
+
     def key_input(self, input_event):
         input_event = super(Screen_Pane, self).key_input(input_event)
         key = input_event.key
@@ -785,14 +1756,14 @@ class Screen_Pane(core.Pane):
         super(Screen_Pane, self).draw()
 
 
-    def configure_layout(self, width, height):
+    def configure_layout(self, width, height, columns=None, rows=None):
         self._layout = screen.Layout()
-        self._layout.set_size(width, height)
+        self._layout.set_size(width, height, columns=columns, rows=rows)
 
-    def add_pane(self, pane, x, y, width, height):
+    def add_pane(self, pane, x, y, width, height, focus_key=None):
         if self._layout is None:
             raise Exception('Configure the layout before adding panes: "self.configure_layout(width, height)"')
-        self._layout.add_pane(pane, x, y, width, height)
+        self._layout.add_pane(pane, x, y, width, height, focus_key=focus_key)
 
     def assign_footer(self, footer):
         if not isinstance(footer, core.Footer):
@@ -839,7 +1810,7 @@ class Notification_Box(core.Footer):
         return input_event
 
     def process(self, time):
-        if self._notification_timeout != -1 and time > self._notification_timeout:
+        if self._notification_timeout != -1 and time >= self._notification_timeout:
             self._notification_start_time = -1
             self._notification_timeout = -1
             self._notification_text = ''
@@ -851,6 +1822,13 @@ class Notification_Box(core.Footer):
                 self.needs_drawing()
                 self._loading_time_of_last_frame = cur_time
 
+    def get_next_deadline(self, time):
+        if self._notification_timeout != -1:
+            return self._notification_timeout
+        elif self._loading_square and not self._loading_square_done:
+            return self._loading_time_of_last_frame + self._loading_time_between_frames
+        return None
+
     def inc_animation(self):
         self._loading_animation_index = self._loading_animation_index + 1
         if self._loading_animation_index > self._loading_animation_length - 1:
@@ -895,13 +1873,17 @@ class Notification_Box(core.Footer):
             self._last_text = header + text
             super(Notification_Box, self).draw()
 
+    def post_notify(self, notification, **kwargs):
+        """Thread-safe version of notify. Only the latest notification posted before the next frame is shown."""
+        self.post(self.notify, notification, coalesce_key=(self, 'notify'), **kwargs)
+
     def notify(self, notification, notification_duration=2, loading_square=False, loading_square_done=False):
         self._notification_text = notification
         if notification_duration == -1:  # -1 indicates forever
             self._notification_start_time = -1
             self._notification_timeout = -1
         else:
-            self._notification_start_time = time.time()
+            self._notification_start_time = helpers.get_clock(self._base_win).time()
             self._notification_timeout = self._notification_start_time + notification_duration
         self._loading_square = loading_square
         self._loading_square_done = loading_square_done
@@ -914,8 +1896,12 @@ class Menu_Pane(core.Pane):
         self._selected_menu_item = -1
         self._last_selected_menu_item = -1
         self._subtle = subtle
+        # Menu items by hotkey, so a key finds its item without checking each one
+        self._hotkeys = {}
         for a in args:
             self._menu_items.append(a)
+            if a.get_hotkey() is not None:
+                self._hotkeys.setdefault(a.get_hotkey(), []).append(a)
 
     def __str__(self):
         return 'M'
@@ -969,11 +1955,20 @@ class Menu_Pane(core.Pane):
         return input_event
 
     def check_menu_hotkeys(self, input_event):
-        for m in self._menu_items:
+        if self._keymap is not None:
+            # The hotkeys are bound in the screen's keymap, which has already been checked
+            return input_event
+        for m in self._hotkeys.get(input_event.key, ()):
             input_event = m.key_input(input_event)
 
         return input_event
 
+    def register_keys(self, keymap):
+        super(Menu_Pane, self).register_keys(keymap)
+        for key, items in self._hotkeys.items():
+            for m in items:
+                keymap.bind(key, m.hotkey_pressed, owner=m)
+
     def key_input(self, input_event):
         input_event = super(Menu_Pane, self).key_input(input_event)
         key = input_event.key
@@ -1017,3 +2012,316 @@ class Menu_Pane(core.Pane):
             m.draw(self._win)
 
         super(Menu_Pane, self).draw()
+
+class Profiler_Pane(core.Pane):
+    """Profiler Pane
+
+    Shows the objects that took the most time over the last refresh interval, as recorded by a
+    profiling.Frame_Profiler. Add it to a layout like any other pane, and attach the same profiler to the screen
+    with set_profiler.
+
+    Columns are the phase, calls per second and mean time over the last interval, then the 95th percentile and
+    maximum time since the profiler was last reset.
+
+    Named Arguments:
+        refresh_interval: Seconds between updates [1.0]
+    """
+    def __init__(self, profiler, title='Profiler', refresh_interval=1.0):
+        super(Profiler_Pane, self).__init__(title=title)
+        self._profiler = profiler
+        self._refresh_interval = refresh_interval
+        self._next_refresh = None
+        self._last_totals = {}
+        self._rows = []
+
+    def process(self, time):
+        super(Profiler_Pane, self).process(time)
+        if self._next_refresh is not None and time < self._next_refresh:
+            return
+        interval = self._refresh_interval if self._next_refresh is None else self._refresh_interval + time - self._next_refresh
+        self._next_refresh = time + self._refresh_interval
+
+        totals = {}
+        rows = []
+        for s in self._profiler.get_stats():
+            key = (s.name, s.title, s.phase)
+            totals[key] = (s.count, s.total)
+            last_count, last_total = self._last_totals.get(key, (0, 0.0))
+            count = s.count - last_count
+            if count > 0:
+                rows.append((s.total - last_total, count, s))
+        self._last_totals = totals
+        rows.sort(key=lambda r: r[0], reverse=True)
+
+        self._rows = []
+        for total, count, s in rows:
+            name = s.name if s.title == '' else f'{s.name}:{s.title}'
+            self._rows.append(f'{s.phase:<9} {count / interval:>7.1f}/s {_format_seconds(total / count)} {_format_seconds(s.get_percentile(95))} {_format_seconds(s.max)}  {name}')
+        self.needs_drawing(reason='profile refresh')
+
+    def get_next_deadline(self, time):
+        return self._next_refresh
+
+    def draw(self):
+        if not self.get_needs_drawing():
+            return
+        self.init_frame(title=self._title, unfocused_line_color=curses.color_pair(2))
+        width = self._w - 4
+        try:
+            self.addstr(self.line_counter, 0, f'{"phase":<9} {"rate":>9} {"mean":>8} {"p95":>8} {"max":>8}  object'[0:width], color=curses.color_pair(2))
+            for i, row in enumerate(self._rows[0:self._h - 2]):
+                self.addstr(self.line_counter + 1 + i, 0, row[0:width])
+        except curses.error:
+            pass
+        super(Profiler_Pane, self).draw()
+
+def _format_seconds(seconds):
+    if seconds >= 1:
+        return f'{seconds:>7.2f}s'
+    elif seconds >= 0.001:
+        return f'{seconds * 1000:>6.2f}ms'
+    return f'{seconds * 1000000:>6.0f}us'
+
+class File_Lines(object):
+    """File Lines
+
+    A read only sequence of the lines of a file, for use as Scroll_Pane contents. The file is memory-mapped, and a
+    background thread indexes it, keeping the byte offset of every INDEX_STRIDE-th line. Text_Lines are only built
+    for lines that are read, and the most recently read ones are kept in a small LRU cache, so memory stays bounded
+    however big the file is.
+
+    The length of the sequence only changes when refresh is called, so a Scroll_Area sees a consistent number of
+    lines between updates.
+    """
+
+    INDEX_STRIDE = 64
+    CACHE_SIZE = 2048
+    # Longer lines are cut off, so a file without newlines can't build one enormous Text_Line
+    MAX_LINE_BYTES = 4096
+
+    def __init__(self, path, encoding='utf-8'):
+        self._path = path
+        self._encoding = encoding
+        self._file = open(path, 'rb')
+        self._size = os.fstat(self._file.fileno()).st_size
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self._size > 0 else None
+
+        self._lock = threading.Lock()
+        self._offsets = array.array('Q')
+        self._indexed_count = 0
+        self._indexing_done = self._mm is None
+        self._stop = threading.Event()
+
+        self._count = 0
+        self._cache = collections.OrderedDict()
+
+        if self._mm is not None:
+            self._thread = threading.Thread(target=self._build_index, name='tinywin-file-index', daemon=True)
+            self._thread.start()
+        else:
+            self._thread = None
+
+    def _build_index(self):
+        mm = self._mm
+        size = self._size
+        pos = 0
+        count = 0
+        stride = self.INDEX_STRIDE
+        while pos < size and not self._stop.is_set():
+            # Index a batch of lines, then publish them
+            offsets = array.array('Q')
+            for _ in range(0, stride * 64):
+                if count % stride == 0:
+                    offsets.append(pos)
+                count = count + 1
+                nl = mm.find(b'\n', pos)
+                if nl == -1 or nl + 1 >= size:
+                    pos = size
+                    break
+                pos = nl + 1
+            with self._lock:
+                self._offsets.extend(offsets)
+                self._indexed_count = count
+        with self._lock:
+            self._indexing_done = True
+
+    def refresh(self):
+        """Make the lines indexed since the last refresh visible. Returns the number of new lines."""
+        with self._lock:
+            count = self._indexed_count
+        new_lines = count - self._count
+        self._count = count
+        return new_lines
+
+    def get_indexing_done(self):
+        with self._lock:
+            return self._indexing_done and self._indexed_count == self._count
+
+    def close(self):
+        """Stop indexing and release the file"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._cache.clear()
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        self._file.close()
+
+    def _line_start(self, index):
+        with self._lock:
+            pos = self._offsets[index // self.INDEX_STRIDE]
+        for _ in range(0, index % self.INDEX_STRIDE):
+            pos = self._mm.find(b'\n', pos) + 1
+        return pos
+
+    def _make_line(self, start, end):
+        if end - start > self.MAX_LINE_BYTES:
+            end = start + self.MAX_LINE_BYTES
+        text = self._mm[start:end].decode(self._encoding, errors='replace').rstrip('\r').expandtabs()
+        return core.Text_Line(text, None)
+
+    def _read_lines(self, start, stop):
+        lines = []
+        pos = None
+        for i in range(start, stop):
+            line = self._cache.get(i)
+            if line is not None:
+                self._cache.move_to_end(i)
+                lines.append(line)
+                pos = None
+                continue
+            if pos is None:
+                pos = self._line_start(i)
+            end = self._mm.find(b'\n', pos)
+            if end == -1:
+                end = self._size
+            line = self._make_line(pos, end)
+            pos = end + 1
+            self._cache[i] = line
+            if len(self._cache) > self.CACHE_SIZE:
+                self._cache.popitem(last=False)
+            lines.append(line)
+        return lines
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._count)
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            return self._read_lines(start, stop)
+        if index < 0:
+            index = index + self._count
+        if index < 0 or index >= self._count:
+            raise IndexError('File_Lines index out of range')
+        return self._read_lines(index, index + 1)[0]
+
+    def __iter__(self):
+        for i in range(0, self._count):
+            yield self[i]
+
+class File_View_Pane(Scroll_Pane):
+    """File View Pane
+
+    A read only pane that shows a file of any size. The file is memory-mapped and indexed in the background (see
+    File_Lines), so opening it is instant, lines appear as they are indexed, and only the lines in view are ever
+    turned into Text_Lines. The footer shows the number of lines and the line at the top of the view.
+
+    Up and down scroll by a line, page up and page down by a page, and the left and right arrows jump to the start
+    and end of the file.
+
+    Named Arguments:
+        encoding: The encoding of the file. Undecodable bytes are replaced. ['utf-8']
+
+    User Functions:
+        goto_line(index):  Scrolls so the line at `index` (counting from 0) is at the top of the view
+        get_line_count():  Gets the number of lines indexed so far
+        get_indexing_done(): Gets whether or not the whole file has been indexed
+        close():           Stops indexing and closes the file
+    """
+
+    # How often the index is checked for new lines while it is being built, in seconds
+    INDEX_POLL_INTERVAL = 0.1
+
+    def __init__(self, path, title=None, header=None, encoding='utf-8', border_style=core.Screen_Border_Style.FULL):
+        super(File_View_Pane, self).__init__(Scroll_Pane_Type.READ_ONLY, header=header, footer=core.Text_Line('', None),
+                                             title=os.path.basename(path) if title is None else title,
+                                             border_style=border_style, virtualized=True, searchable=False)
+        self._file_lines = File_Lines(path, encoding=encoding)
+        self._footer_status = None
+        self._next_index_poll = None
+        self.set_contents(self._file_lines)
+        self._poll_index()
+
+    def goto_line(self, index):
+        if self.scroll_area is not None:
+            self.scroll_area.scroll_to(index)
+            self.needs_drawing(reason='goto line')
+
+    def get_line_count(self):
+        return len(self._file_lines)
+
+    def get_indexing_done(self):
+        return self._file_lines.get_indexing_done()
+
+    def close(self):
+        """Stop indexing and release the file. Called when the screen closes."""
+        super(File_View_Pane, self).close()
+        self._file_lines.close()
+
+    def _poll_index(self):
+        old_count = len(self._file_lines)
+        new_lines = self._file_lines.refresh()
+        if new_lines > 0:
+            self.z = len(self._file_lines)
+            self._num_options = self.z
+            if self.scroll_area is not None:
+                self.scroll_area.lines_inserted(old_count, new_lines)
+            self.needs_drawing(reason='lines indexed')
+        elif self._footer_status is not None and self._footer_status[2] != self.get_indexing_done():
+            self.needs_drawing(reason='indexing done')
+
+    def process(self, time):
+        super(File_View_Pane, self).process(time)
+        if self._next_index_poll is None or time >= self._next_index_poll:
+            self._next_index_poll = time + self.INDEX_POLL_INTERVAL
+            self._poll_index()
+
+    def get_next_deadline(self, time):
+        if self._footer_status is not None and self._footer_status[2]:
+            return None
+        return self._next_index_poll
+
+    def key_input(self, input_event):
+        key = input_event.key
+        if key is not None and self._focus and self.scroll_area is not None:
+            page = max(self.scroll_area._height - 1, 1)
+            if key == 261:  # Right Arrow
+                self.scroll_area.scroll_to_end()
+            elif key == 260:  # Left Arrow
+                self.scroll_area.scroll_to_start()
+            elif key == curses.KEY_NPAGE:
+                self.scroll_area.scroll_to(self.scroll_area.get_first_index() + page * input_event.repeat)
+            elif key == curses.KEY_PPAGE:
+                self.scroll_area.scroll_to(self.scroll_area.get_first_index() - page * input_event.repeat)
+            else:
+                return super(File_View_Pane, self).key_input(input_event)
+            self.needs_drawing(reason='scrolled')
+            input_event.absorb()
+            return input_event
+        return super(File_View_Pane, self).key_input(input_event)
+
+    def draw(self):
+        if not self.get_needs_drawing():
+            return
+        self.scroll_area.calculate_trimmed_lines()
+        status = (len(self._file_lines), self.scroll_area.get_first_index(), self.get_indexing_done())
+        if status != self._footer_status:
+            self._footer_status = status
+            count, first, done = status
+            self._footer_line = core.Text_Line(f'line {first + 1 if count > 0 else 0} of {count}' + ('' if done else ' (indexing)'), None)
+        super(File_View_Pane, self).draw()
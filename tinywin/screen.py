@@ -1,13 +1,25 @@
+import os
 import curses
 import math
-import time
+import asyncio
 import logging
 
-from tinywin import core, helpers
+from tinywin import core, helpers, tasks
+
+# Navigation keys whose consecutive repeats are delivered as a single event: Down, Up, Shift-Down, Shift-Up
+COALESCED_KEYS = frozenset([258, 259, 336, 337])
+# Mouse wheel events whose consecutive repeats are delivered as a single event
+COALESCED_MOUSE_STATES = frozenset([curses.BUTTON4_PRESSED, helpers.REPORT_MOUSE_POSITION])
 
 class Input_Event(object):
-    def __init__(self, key):
+    """Input Event
+
+    A key press read from the terminal. `repeat` is the number of identical navigation key presses (or mouse wheel
+    steps) that arrived back to back and were coalesced into this event.
+    """
+    def __init__(self, key, repeat=1):
         self.key = key
+        self.repeat = repeat
         self._mouse_event = False
         if key == curses.KEY_MOUSE:
             try:
@@ -30,13 +42,69 @@ class Input_Event(object):
         self.key = None
         self._mouse_event = None
 
+    def can_coalesce(self, other):
+        """Check if `other` is a repeat of this event that can be merged into it"""
+        if self.key != other.key:
+            return False
+        if self.key in COALESCED_KEYS:
+            return True
+        if self._mouse_event and other._mouse_event:
+            return self._bstate in COALESCED_MOUSE_STATES and (self._bstate, self._mx, self._my) == (other._bstate, other._mx, other._my)
+        return False
+
+class Focus_Manager(object):
+    """Focus Manager
+
+    Tracks which pane of a layout has focus. Panes report to it when they are focused or unfocused (see
+    core.Pane.set_focus_manager), so moving focus only unfocuses and redraws the pane losing it and the pane gaining
+    it, and finding the focused pane doesn't check every pane. Each layout, including the layout of a nested
+    Screen_Pane, has its own.
+    """
+    def __init__(self):
+        self._focused = None
+
+    def get_focused(self):
+        return self._focused
+
+    def focus(self, pane):
+        """Focus a pane, unfocusing the pane that had focus. Focus keys, tab chains and layouts focus panes through
+        this."""
+        if pane is self._focused and pane.get_focus():
+            return
+        pane.focus()
+        if self._focused is not pane:
+            # The pane doesn't report to the manager (it isn't a core.Pane)
+            self.pane_focused(pane)
+
+    def unfocus(self):
+        """Unfocus the pane that has focus, if any"""
+        if self._focused is not None:
+            self._focused.unfocus()
+
+    def pane_focused(self, pane):
+        previous = self._focused
+        self._focused = pane
+        if previous is not None and previous is not pane and previous.get_focus():
+            previous.unfocus()
+
+    def pane_unfocused(self, pane):
+        if pane is self._focused:
+            self._focused = None
+
 class Tab_Chain(core.Processable):
     def __init__(self, *args, wrap=True):
         self.chain_order = []
         self._wrap = wrap
+        self._focus_manager = None
+        # The position of each pane in chain_order, rebuilt if chain_order is changed
+        self._positions = {}
         for a in args:
             self.chain_order.append(a)
 
+    def set_focus_manager(self, focus_manager):
+        """Find the focused pane through a Focus_Manager instead of checking each pane in the chain"""
+        self._focus_manager = focus_manager
+
     def key_input(self, ie):
         if len(self.chain_order) == 0:
             return ie
@@ -49,56 +117,54 @@ class Tab_Chain(core.Processable):
                 ie.absorb()
         return ie
 
-    def tab_forward(self):
-        selected_pane = None
-        selected_index = 0
-        for i in range(0, len(self.chain_order)):
-            if self.chain_order[i]._focus is True:
-                selected_pane = self.chain_order[i]
-                selected_index = i
-                break
-
-        if selected_pane is None:
-            self.chain_order[0].focus()
-            return True
+    def _get_selected_index(self):
+        if self._focus_manager is None:
+            for i in range(0, len(self.chain_order)):
+                if self.chain_order[i]._focus is True:
+                    return i
+            return None
 
-        if selected_index == len(self.chain_order) - 1:
-            if not self._wrap:
-                # We're at the end of the list trying to tab forward. Not allowed.
-                return False
-            else:
-                selected_index = -1
+        focused = self._focus_manager.get_focused()
+        if focused is None:
+            return None
+        index = self._positions.get(id(focused))
+        if index is None or index >= len(self.chain_order) or self.chain_order[index] is not focused:
+            self._positions = {id(p): i for i, p in enumerate(self.chain_order)}
+            index = self._positions.get(id(focused))
+        return index
 
-        selected_pane.unfocus()
-        selected_index = selected_index + 1
-        self.chain_order[selected_index].focus()
-        return True
+    def tab_forward(self):
+        return self._tab(1)
 
     def tab_back(self):
-        selected_pane = None
-        selected_index = 0
-        for i in range(0, len(self.chain_order)):
-            if self.chain_order[i]._focus is True:
-                selected_pane = self.chain_order[i]
-                selected_index = i
-                break
+        return self._tab(-1)
+
+    def _tab(self, step):
+        selected_index = self._get_selected_index()
 
-        if selected_pane is None:
-            self.chain_order[0].focus()
+        if selected_index is None:
+            self._focus(self.chain_order[0])
             return True
 
-        if selected_index == 0:
+        next_index = selected_index + step
+        if next_index < 0 or next_index >= len(self.chain_order):
             if not self._wrap:
-                # We're at the end of the list trying to tab backwards. Not allowed.
+                # We're at the end of the list trying to tab past it. Not allowed.
                 return False
-            else:
-                selected_index = len(self.chain_order)
+            next_index = next_index % len(self.chain_order)
 
-        selected_pane.unfocus()
-        selected_index = selected_index - 1
-        self.chain_order[selected_index].focus()
+        if self._focus_manager is None:
+            self.chain_order[selected_index].unfocus()
+        self._focus(self.chain_order[next_index])
         return True
 
+    def _focus(self, pane):
+        if self._focus_manager is not None:
+            # The manager unfocuses the pane that had focus
+            self._focus_manager.focus(pane)
+        else:
+            pane.focus()
+
 # class Screen_Title(object):
 #     def __init__(self, stdscr, height, width, y, x, title, no_title=False, draw_lower=False, lower_y=-1):
 #         # raise Exception('here')
@@ -140,7 +206,82 @@ class Tab_Chain(core.Processable):
 #         except curses.error:
 #             pass
 
+class Fixed_Size(object):
+    """Fixed Size
+
+    A layout column or row that is always `cells` wide (or tall). It is given its size before any proportional
+    column or row.
+    """
+    def __init__(self, cells):
+        self.cells = cells
+
+class Proportional_Size(object):
+    """Proportional Size
+
+    A layout column or row that shares the space left over by the fixed columns or rows with the other proportional
+    ones, in proportion to its weight.
+
+    Named Arguments:
+        weight:   The share of the space this column or row gets, relative to the others. [1]
+        min_size: The fewest cells it shrinks to. [0]
+        max_size: The most cells it grows to. Space it can't use is left blank at the end of the layout. [None]
+    """
+    def __init__(self, weight=1, min_size=0, max_size=None):
+        self.weight = weight
+        self.min_size = min_size
+        self.max_size = max_size
+
+def solve_sizes(total, constraints):
+    """Split `total` cells between a list of Fixed_Size and Proportional_Size constraints. Returns the offsets of the
+    columns (or rows), with one extra entry at the end for the end of the last one."""
+    sizes = [0] * len(constraints)
+    flexible = []
+    remaining = total
+    for i, c in enumerate(constraints):
+        if isinstance(c, Fixed_Size):
+            sizes[i] = c.cells
+            remaining -= c.cells
+        else:
+            flexible.append(i)
+
+    # Share the remaining space by weight. A constraint whose share breaks its min or max is fixed at that bound,
+    # and the rest is shared again between the others.
+    shares = {}
+    while len(flexible) > 0:
+        total_weight = sum(constraints[i].weight for i in flexible)
+        shares = {i: max(remaining, 0) * constraints[i].weight / total_weight if total_weight > 0 else 0 for i in flexible}
+        bounded = []
+        for i in flexible:
+            c = constraints[i]
+            if shares[i] < c.min_size:
+                bounded.append((i, c.min_size))
+            elif c.max_size is not None and shares[i] > c.max_size:
+                bounded.append((i, c.max_size))
+        if len(bounded) == 0:
+            break
+        for i, size in bounded:
+            sizes[i] = size
+            remaining -= size
+            flexible.remove(i)
+            del shares[i]
+
+    # Round down, then give the cells lost to rounding to the largest remainders so the space is filled exactly
+    for i, share in shares.items():
+        sizes[i] = math.floor(share)
+    leftover = max(remaining, 0) - sum(sizes[i] for i in shares)
+    for i in sorted(shares, key=lambda i: sizes[i] - shares[i])[:leftover]:
+        sizes[i] += 1
+
+    # If the constraints don't fit (a small terminal), the last columns or rows are cut off at the end
+    offsets = [0]
+    for size in sizes:
+        offsets.append(min(offsets[-1] + size, total))
+    return offsets
+
 class Layout(core.Processable):
+    # The most solved sizes kept. Dragging the edge of a terminal passes through many sizes that are never seen again.
+    GEOMETRY_CACHE_SIZE = 16
+
     def __init__(self, title=None):
         super(Layout, self).__init__()
 
@@ -148,22 +289,49 @@ class Layout(core.Processable):
         self._footer = None
         self._tab_order = None
         self._title_text = title
-
-    def set_size(self, x_divs, y_divs):
+        self._columns = None
+        self._rows = None
+        self._geometry_cache = {}
+        self._keymap = core.Keymap()
+        self._focus_manager = Focus_Manager()
+
+    def set_size(self, x_divs, y_divs, columns=None, rows=None):
+        """Set the grid the panes are placed on. Without constraints the grid is split evenly.
+
+        Named Arguments:
+            columns: A Fixed_Size or Proportional_Size for each of the x_divs columns. [None]
+            rows:    A Fixed_Size or Proportional_Size for each of the y_divs rows. [None]
+        """
+        if columns is not None and len(columns) != x_divs:
+            raise Exception(f'Expected {x_divs} column constraints, got {len(columns)}')
+        if rows is not None and len(rows) != y_divs:
+            raise Exception(f'Expected {y_divs} row constraints, got {len(rows)}')
         self._x_divs = x_divs
         self._y_divs = y_divs
+        self._columns = columns
+        self._rows = rows
+        self._geometry_cache = {}
 
     def assign_win(self, win):
         self._stdscr = win
         self.process_resize(init=True)
 
+    def resize_win(self, win, erased=False):
+        """Fit the panes to a resized window (or a replacement for it), after the layout has been built. If the
+        window was erased, every pane is drawn again, otherwise only the panes whose geometry changed."""
+        self._stdscr = win
+        self.process_resize(erased=erased)
+
     def calc_per_block(self, height_reduction=0, width_reduction=1):
         self._y_per_block = math.floor((self._h - height_reduction) / self._y_divs)
         self._x_per_block = math.floor((self._w - width_reduction) / self._x_divs)
 
     def unfocus_all(self):
-        for p in self._panes:
-            p.get_pane().unfocus()
+        # Only the focused pane needs to be unfocused (and redrawn)
+        self._focus_manager.unfocus()
+
+    def get_focus_manager(self):
+        return self._focus_manager
 
     def get_panes(self):
         if self._footer is not None:
@@ -175,30 +343,80 @@ class Layout(core.Processable):
 
     def assign_footer(self, footer):
         self._footer = core.Pane_Holder(footer, 0, 0, 0, 0)
+        self._geometry_cache = {}
 
     def add_tab_order(self, tab_order):
         self._tab_order = tab_order
-
-    def add_pane(self, pane, start_x, start_y, width, height, one_line=False, fixed_to=None):
-        ph = core.Pane_Holder(pane, start_x, start_y, width, height, one_line=one_line, fixed_to=fixed_to, unfocus_callback=self.unfocus_all)
+        if getattr(tab_order, 'set_focus_manager', None) is not None:
+            tab_order.set_focus_manager(self._focus_manager)
+
+    def add_pane(self, pane, start_x, start_y, width, height, one_line=False, fixed_to=None, focus_key=None):
+        ph = core.Pane_Holder(pane, start_x, start_y, width, height, focus_key=focus_key, one_line=one_line, fixed_to=fixed_to, unfocus_callback=self.unfocus_all, focus_callback=self._focus_manager.focus)
+        ph.register_keys(self._keymap)
+        if getattr(pane, 'set_focus_manager', None) is not None:
+            pane.set_focus_manager(self._focus_manager)
         self._panes.append(ph)
+        self._geometry_cache = {}
 
     def calculate_all_pane_windows(self):
 
+        self._update_pane_windows()
+        if len(self._panes) > 0:
+            self._focus_manager.focus(self._panes[0].get_pane())
+
+    def _update_pane_windows(self):
+        """Fit every pane's window to the layout, reusing existing windows. Returns the panes whose geometry changed."""
+        changed = []
         if self._footer is not None:
-            win = self._stdscr.derwin(1, self._w, self._h - 1, 0)
-            self._footer.link_win(win)
+            if self._footer.update_win(self._stdscr, 1, self._w, self._h - 1, 0):
+                changed.append(self._footer)
             self._h = self._h - 1
 
             self.calc_per_block(height_reduction=1)
 
+        geometry = self._solve_geometry()
         for ph in self._panes:
-            new_win = self.calculate_win_for_pane(ph)
-            ph.link_win(new_win)
-        if len(self._panes) > 0:
-            self._panes[0].get_pane().focus()
+            if ph.update_win(self._stdscr, *geometry[ph]):
+                changed.append(ph)
+        return changed
 
     def calculate_win_for_pane(self, ph):
+        return self._stdscr.derwin(*self.calculate_geometry_for_pane(ph))
+
+    def calculate_geometry_for_pane(self, ph):
+        """Get the (nlines, ncols, begin_y, begin_x) of a pane's window, relative to the layout's window"""
+        return self._solve_geometry()[ph]
+
+    def _solve_geometry(self):
+        # The geometry of every pane is solved in one pass for the current size, and kept so that returning to a
+        # size (a terminal toggled between two sizes) doesn't solve it again
+        key = (self._h, self._w, self._y_offset, self._x_per_block, self._y_per_block)
+        geometry = self._geometry_cache.get(key)
+        if geometry is not None:
+            return geometry
+        if len(self._geometry_cache) >= self.GEOMETRY_CACHE_SIZE:
+            self._geometry_cache = {}
+
+        if self._columns is None and self._rows is None:
+            geometry = {ph: self._grid_geometry_for_pane(ph) for ph in self._panes}
+        else:
+            columns = self._columns if self._columns is not None else [Proportional_Size()] * self._x_divs
+            rows = self._rows if self._rows is not None else [Proportional_Size()] * self._y_divs
+            x_offsets = solve_sizes(self._w, columns)
+            y_offsets = solve_sizes(self._h, rows)
+            geometry = {}
+            for ph in self._panes:
+                (x, y, w, h) = ph.get_coords()
+                self._check_pane_bounds(ph)
+                begin_y = y_offsets[min(y, self._y_divs)] + self._y_offset
+                begin_x = x_offsets[x]
+                nlines = 1 if ph.get_is_one_line() else y_offsets[min(y + h, self._y_divs)] - y_offsets[min(y, self._y_divs)]
+                geometry[ph] = (nlines, x_offsets[x + w] - begin_x, begin_y, begin_x)
+
+        self._geometry_cache[key] = geometry
+        return geometry
+
+    def _check_pane_bounds(self, ph):
         (x, y, w, h) = ph.get_coords()
 
         # Check that this pane will fit on the screen
@@ -210,6 +428,10 @@ class Layout(core.Processable):
             # raise Exception(f'Pane is too tall or overruns the bounds of the screen: {ph.get_pane().__class__} : y:{y+h} > y:{self._y_divs}')
             pass
 
+    def _grid_geometry_for_pane(self, ph):
+        (x, y, w, h) = ph.get_coords()
+        self._check_pane_bounds(ph)
+
         y_shift = 0
         x_shift = 0
 
@@ -220,8 +442,8 @@ class Layout(core.Processable):
             x_shift = 0
 
         if ph.get_is_one_line():
-            #                         nlines,      ncols,                           begin_y,                                          begin_x
-            win = self._stdscr.derwin(1 - y_shift, w * self._x_per_block - x_shift, y * self._y_per_block + self._y_offset + y_shift, x * self._x_per_block+x_shift)
+            #       nlines,      ncols,                           begin_y,                                          begin_x
+            return (1 - y_shift, w * self._x_per_block - x_shift, y * self._y_per_block + self._y_offset + y_shift, x * self._x_per_block+x_shift)
         else:
             nlines = h * self._y_per_block - y_shift
             ncols = w * self._x_per_block - x_shift
@@ -237,14 +459,12 @@ class Layout(core.Processable):
                 if begin_x + ncols < self._w:
                     ncols = self._w - begin_x
 
-            
-            win = self._stdscr.derwin(nlines, ncols, begin_y, begin_x)
 
-        return win
+            return (nlines, ncols, begin_y, begin_x)
 
     def focus_default(self):
         if len(self._panes) > 0:
-            self._panes[0].get_pane().focus()
+            self._focus_manager.focus(self._panes[0].get_pane())
 
     # def move_focus(self, x_amt, y_amt):
     #     (x, y) = self.current_focus
@@ -284,12 +504,13 @@ class Layout(core.Processable):
     #     self.current_focus = (x, y)
     #     self.set_focus()
 
+    def get_keymap(self):
+        """Get the keymap that the panes' focus keys, menu hotkeys and key bindings are registered in"""
+        return self._keymap
+
     def key_input(self, ie):
+        # Focus keys are bound in the keymap, which the screen resolves before offering the key to each object
         tmp_ie = ie
-        for p in self._panes:  # Process direct focus keys
-            tmp_ie = p.key_input(tmp_ie)
-            if tmp_ie.key is None:
-                return tmp_ie
 
         if self._tab_order is not None:
             tmp_ie = self._tab_order.key_input(tmp_ie)
@@ -309,12 +530,9 @@ class Layout(core.Processable):
         # return tmp_ie
 
     def get_focused_pane(self):
-        for p in self._panes:
-            if p.get_pane().get_focus() is True:
-                return p.get_pane()
-        return None
+        return self._focus_manager.get_focused()
 
-    def process_resize(self, init=False):
+    def process_resize(self, init=False, erased=False):
         self._h, self._w = self._stdscr.getmaxyx()
 
         # self._pane_order_x_len = self._w
@@ -336,39 +554,62 @@ class Layout(core.Processable):
         self.calc_per_block()
 
         if not init: # This is a resize that happened after the creation of the window
-            # Save the current focused pane
-
-            last_focused_object = self.get_focused_pane()
-            self.unfocus_all()
-
-            # Resize each pane:
-            for ph in self._panes:
-                new_win = self.calculate_win_for_pane(ph)
-                ph.link_win(new_win)
-
-            for ph in self._panes:
+            # Resize each pane. Only panes whose geometry changed are given their window again. Focus is kept by the
+            # panes themselves, so it is left alone (moving it away and back would redraw the focused pane).
+            changed = self._update_pane_windows()
+            for ph in changed:
                 ph.get_pane().window_size_update()
 
-            # self.set_focus_location_from_object(last_focused_object)
-            last_focused_object.focus()
-
-            for p in self._panes:
-                p.get_pane().needs_drawing()
-                p.get_pane().clear()
+            if erased:
+                # The window is already blank, so every pane is drawn again without clearing it
+                for p in self.get_panes():
+                    p.get_pane().needs_drawing(reason='resize')
+            else:
+                # Panes that kept their geometry still show the right thing
+                for ph in changed:
+                    ph.get_pane().needs_drawing(reason='resize')
+                    ph.get_pane().clear()
 
 class Screen(object):
-    def __init__(self, stdscr, exit_key='q', process_rate_ps=30, frame_rate_ps=15, sub_screen=False):
+    """Screen
+
+    Runs the frame loop for a layout: reads key input, then processes and draws every object. Processing runs at
+    process_rate_ps. Drawing runs at up to frame_rate_ps, and only when an object needs to be drawn.
+
+    Named Arguments:
+        min_frame_rate_ps: The draw rate drops towards this while nothing changes or while the terminal can't keep
+                           up with drawing, and returns to frame_rate_ps on input. [2]
+        event_driven: Instead of polling at the process rate, sleep until a key arrives or an object's next deadline
+                      (see Processable.get_next_deadline) is reached. An idle screen then uses almost no CPU. [False]
+        max_wait:     The longest time, in seconds, that an event driven screen sleeps for. Terminal resizes are not
+                      seen until the screen wakes up. [0.25]
+        resize_settle_time: After the terminal is resized, the layout is only rebuilt once no further resize has
+                      arrived for this many seconds. Until then a placeholder showing the new size is drawn, so
+                      dragging the edge of a terminal doesn't rebuild the layout on every step. With 0, the layout
+                      is rebuilt in the same frame without the placeholder, and only panes whose size or position
+                      changed are drawn again. [0.15]
+        focused_key_input: Keys that no focus key, hotkey or key binding used are offered to every object on the
+                      screen by default. With True, they are only offered to the focused pane, the objects that set
+                      core.Processable.RECEIVES_ALL_KEYS and the tab chain, so handling a key costs the same however
+                      many panes there are. [False]
+    """
+    # The most input events read in a single frame. Anything beyond this is left for the next frame, so a flood of
+    # input can't stall drawing.
+    MAX_INPUT_EVENTS_PER_FRAME = 512
+
+    def __init__(self, stdscr, exit_key='q', process_rate_ps=30, frame_rate_ps=15, sub_screen=False, event_driven=False, max_wait=0.25, min_frame_rate_ps=2, resize_settle_time=0.15, focused_key_input=False):
         super(Screen, self).__init__()
 
         self._stdscr = stdscr
         self._h, self._w = self._stdscr.getmaxyx()
+        self._clock = helpers.get_clock(self._stdscr)
 
         self.drawable_objects = []
         self.processable_objects = []
 
         self._exit_key = ord(exit_key)
 
-        self._last_draw_time = time.time()
+        self._last_draw_time = self._clock.time()
         self._last_process_time = self._last_draw_time
         self._last_action_time = self._last_draw_time
 
@@ -379,14 +620,39 @@ class Screen(object):
         self._time_between_processes = 1 / self._process_rate_ps
         self._time_between_draws = 1 / self._draw_rate_ps
 
+        # The time between draws adapts between the frame rate and the minimum frame rate while drawing is slow,
+        # and is reset when input arrives. While nothing needs drawing, only the check for something to draw backs
+        # off, and it is reset as soon as something does.
+        self._draw_interval = self._time_between_draws
+        self._check_interval = self._time_between_draws
+        self._max_draw_interval = max(1 / min_frame_rate_ps, self._time_between_draws)
+        self._input_received = False
+
         self._ie = None
 
         self._force_close = False
 
-        self._recent_resize = False
-        self._resize_draw_frame_counter = 0
+        # Time of the last resize that the layout has not been rebuilt for yet, or None
+        self._resize_time = None
+        self._resize_settle_time = resize_settle_time
+        # Whether the resize placeholder erased the window, so every pane has to be drawn again after the relayout
+        self._resize_erased = False
 
         self._is_sub_screen = sub_screen
+        if not self._is_sub_screen:
+            # The frame loop paces itself and drains every pending key each frame, so reading input must never
+            # block (curses.wrapper hands over a blocking stdscr)
+            self._stdscr.nodelay(True)
+
+        self._event_driven = event_driven
+        self._max_wait = max_wait
+        self._focused_key_input = focused_key_input
+
+        self._profiler = None
+
+        # Written to by core.wake (from any thread) to end an event driven wait early
+        self._wake_fd_r = None
+        self._wake_fd_w = None
 
         self._layout = None
 
@@ -414,6 +680,7 @@ class Screen(object):
             elif isinstance(pane_obj, core.Processable):
                 self.processable_objects.append(pane_obj)
 
+        self._register_keys(*self.processable_objects, *self.drawable_objects)
 
         for p in self.processable_objects:
             if isinstance(p, core.Init):
@@ -425,75 +692,381 @@ class Screen(object):
     def add_processable_objects(self, *obj):
         for o in obj:
             self.processable_objects.append(o)
+        self._register_keys(*obj)
 
     def add_drawable_objects(self, *obj):
         for o in obj:
             self.drawable_objects.append(o)
+        self._register_keys(*obj)
 
     def add_drawable_object_to_begining_of_queue(self, obj):
         self.drawable_objects.insert(0, obj)
+        self._register_keys(obj)
+
+    def _register_keys(self, *obj):
+        # Objects added before the layout is built are registered when it is
+        if self._layout is None:
+            return
+        keymap = self._layout.get_keymap()
+        for o in obj:
+            register = getattr(o, 'register_keys', None)
+            if register is not None:
+                register(keymap)
+            if self._focused_key_input and getattr(o, 'RECEIVES_ALL_KEYS', False):
+                keymap.bind_any(lambda ie, o=o: self._offer_key(o, ie), owner=o)
+
+    def _offer_key(self, o, ie):
+        if self._profiler is not None:
+            ie = self._profiler.call(o, 'key_input', o.key_input, ie)
+        else:
+            ie = o.key_input(ie)
+        return ie.key is None
 
     def frame(self):
 
         if self._force_close:
             return False
 
-        current_time = time.time()
+        if self._event_driven:
+            return self._event_frame()
 
-        time_until_next_process = (self._last_process_time + self._time_between_processes) - current_time
-        time_until_next_draw = (self._last_process_time + self._time_between_processes) - current_time
-
-        process_due = time_until_next_process <= 0
-        draw_due = time_until_next_draw <= 0
-
-        if not process_due and not draw_due:
-            if time_until_next_process < time_until_next_draw:
-                time.sleep(time_until_next_process)
-            else:
-                time.sleep(time_until_next_draw)
-        else:
-            if process_due:
-                self.process(current_time)
-            if draw_due:
-                self.draw(current_time)
+        current_time = self._clock.time()
 
+        # Sleep until processing or drawing is due. Drawing only wakes the loop if something needs to be drawn.
+        wake_time = self._last_process_time + self._time_between_processes
+        if self.get_needs_drawing():
+            wake_time = min(wake_time, self._last_draw_time + self._draw_interval)
+        if wake_time > current_time:
+            self._clock.sleep(wake_time - current_time)
 
         #TODO: Try using get_wch to see if we can capture more complex key inputs
-        #TODO: Support mouse scrolling
-        c = self._stdscr.getch()
-        
-        self._ie = Input_Event(c)
+        return self._event_step()
+
+    def _event_frame(self):
+        if self._wake_fd_r is None and not self._is_sub_screen and helpers.get_input_fd(self._stdscr) is not None:
+            self._wake_fd_r, self._wake_fd_w = os.pipe()
+            os.set_blocking(self._wake_fd_r, False)
+            os.set_blocking(self._wake_fd_w, False)
+            core.set_wake_callback(self._write_wake_fd)
+
+        timeout = self._get_wait_timeout(self._clock.time())
+        if timeout > 0:
+            helpers.wait_for_input(self._stdscr, timeout, wake_fd=self._wake_fd_r)
+        return self._event_step()
+
+    def _write_wake_fd(self):
+        try:
+            os.write(self._wake_fd_w, b'\0')
+        except (BlockingIOError, OSError, TypeError):
+            # The pipe is already full (so the screen will wake), or the screen has been closed
+            pass
 
-        if c != -1:
-            curses.flushinp()
+    def close(self):
+        """Cancel every pane's tasks and release the resources used by the frame loop and the panes. Called when the
+        screen exits."""
+        self.cancel_tasks()
+        self.close_panes()
+        if self._wake_fd_r is not None:
+            core.set_wake_callback(None)
+            os.close(self._wake_fd_r)
+            os.close(self._wake_fd_w)
+            self._wake_fd_r = None
+            self._wake_fd_w = None
+
+    async def run_async(self):
+        """Run the frame loop on the running asyncio event loop until the screen exits.
+
+        Frames run when stdin becomes readable, when an object's next deadline is reached, or when core.wake()
+        is called (for example when a coroutine started with Pane.spawn finishes). Between frames, other
+        coroutines run freely.
+        """
+        loop = core.get_running_loop()
+        wake_event = asyncio.Event()
+        fd = helpers.get_input_fd(self._stdscr)
+        if fd is not None:
+            loop.add_reader(fd, wake_event.set)
+        # Worker threads wake the screen too, so the event is set through the loop
+        core.set_wake_callback(lambda: loop.call_soon_threadsafe(wake_event.set))
+        try:
+            while not self._force_close:
+                timeout = self._get_wait_timeout(self._clock.time())
+                if fd is None:
+                    # Headless windows wait on their own clock
+                    if helpers.wait_for_input(self._stdscr, timeout):
+                        wake_event.set()
+                    await asyncio.sleep(0)
+                elif timeout > 0 and not wake_event.is_set():
+                    try:
+                        await asyncio.wait_for(wake_event.wait(), timeout)
+                    except asyncio.TimeoutError:
+                        pass
+                wake_event.clear()
+                if not self._event_step():
+                    break
+        finally:
+            core.set_wake_callback(None)
+            if fd is not None:
+                loop.remove_reader(fd)
+            self.cancel_tasks()
+
+    def cancel_tasks(self):
+        """Cancel the coroutines and background tasks started by every pane on this screen"""
+        for d in self.drawable_objects:
+            if isinstance(d, core.Pane):
+                d.cancel_tasks()
 
-        if self._ie is not None and self._ie.key == self._exit_key:
+    def close_panes(self):
+        """Release the resources held by every pane on this screen (see core.Pane.close)"""
+        for d in self.drawable_objects:
+            if isinstance(d, core.Pane):
+                d.close()
+
+    def _get_wait_timeout(self, current_time):
+        timeout = self._max_wait
+        deadline = self.get_next_deadline(current_time)
+        if deadline is not None:
+            # Processing never runs faster than the process rate
+            deadline = max(deadline, self._last_process_time + self._time_between_processes)
+        if self.get_needs_drawing():
+            draw_time = self._last_draw_time + self._draw_interval
+            deadline = draw_time if deadline is None else min(deadline, draw_time)
+        if deadline is not None:
+            timeout = min(timeout, max(deadline - current_time, 0))
+        return timeout
+
+    def _event_step(self):
+        current_time = self._clock.time()
+
+        if not self._handle_input():
             return False
 
-        self._ie = self.key_input(self._ie)
+        if not self._is_sub_screen:
+            # Apply the updates other threads posted since the last frame
+            core.run_posted()
+
+        if self._resize_time is not None and current_time >= self._resize_time + self._resize_settle_time:
+            self._relayout()
+
+        if self._input_received:
+            # The user is interacting, so draw at the full frame rate again
+            self._draw_interval = self._time_between_draws
+            self._check_interval = self._time_between_draws
+
+        if self._input_received or current_time >= self._last_process_time + self._time_between_processes:
+            self.process(current_time)
+
+        needs_drawing = None
+        if self._check_interval > self._time_between_draws:
+            needs_drawing = self.get_needs_drawing()
+            if needs_drawing:
+                # Something changed without input (a task result, a posted update, a timeout), so it is drawn
+                # without waiting out the back off
+                self._check_interval = self._time_between_draws
+
+        if current_time >= self._last_draw_time + max(self._draw_interval, self._check_interval):
+            self._scheduled_draw(current_time, needs_drawing)
 
-        self.process(current_time)
-        self.draw(time=current_time)
-        
         self._last_action_time = current_time
         return True
 
+    def _scheduled_draw(self, current_time, needs_drawing=None):
+        if needs_drawing is None:
+            needs_drawing = self.get_needs_drawing()
+        if not needs_drawing:
+            # Nothing changed, so check less often until something does
+            self._check_interval = min(self._check_interval * 2, self._max_draw_interval)
+            self._last_draw_time = current_time
+            return
+
+        self.draw(time=current_time)
+        draw_duration = self._clock.time() - current_time
+
+        if draw_duration * 2 > self._draw_interval:
+            # The terminal can't keep up, so give it time to catch up between frames
+            self._draw_interval = min(draw_duration * 2, self._max_draw_interval)
+        else:
+            self._draw_interval = max(self._draw_interval / 2, self._time_between_draws)
+
+    def get_needs_drawing(self):
+        """Check if any object on this screen needs to be drawn"""
+        if self._resize_time is not None:
+            # Nothing is drawn until the layout has been rebuilt for the new size
+            return False
+        for d in self.drawable_objects:
+            if d.get_needs_drawing():
+                return True
+        return False
+
+    def read_input_events(self):
+        """Read every input event waiting in the buffer.
+
+        Runs of repeated navigation keys and mouse wheel steps are merged into one event with a repeat count, and
+        only the first resize event is kept, since the new size is read when it is processed.
+        """
+        events = []
+        resized = False
+        for _ in range(0, self.MAX_INPUT_EVENTS_PER_FRAME):
+            c = self._stdscr.getch()
+            if c == -1:
+                break
+            # Mouse events must be read (with getmouse) right after their key, so the event is built straight away
+            ie = Input_Event(c)
+            if ie.key is None:
+                continue
+            if ie.key == curses.KEY_RESIZE:
+                if resized:
+                    continue
+                resized = True
+            if len(events) > 0 and events[-1].can_coalesce(ie):
+                events[-1].repeat = events[-1].repeat + 1
+            else:
+                events.append(ie)
+        return events
+
+    def _handle_input(self):
+        events = self.read_input_events()
+        self._input_received = len(events) > 0
+        if len(events) == 0:
+            events.append(Input_Event(-1))
+
+        for ie in events:
+            if ie.key == self._exit_key and not self.get_captures_text_input():
+                return False
+            self._ie = self.key_input(ie)
+        return True
+
+    def get_captures_text_input(self):
+        """Whether or not a pane on this screen is taking typed text (see core.Pane.get_captures_text_input)"""
+        return self._get_text_input_object() is not None
+
+    def _get_text_input_object(self):
+        if self._focused_key_input:
+            # Panes stop taking typed text when they are unfocused, so only the focused pane needs to be checked
+            if self._layout is None:
+                return None
+            focused = self._layout.get_focus_manager().get_focused()
+            captures = getattr(focused, 'get_captures_text_input', None)
+            if captures is not None and captures():
+                return focused
+            return None
+        for d in self.drawable_objects:
+            captures = getattr(d, 'get_captures_text_input', None)
+            if captures is not None and captures():
+                return d
+        return None
+
+    def get_next_deadline(self, current_time):
+        """Get the earliest time at which any object on this screen needs to process or draw"""
+        if self._resize_time is not None:
+            return self._resize_time + self._resize_settle_time
+
+        deadline = None
+        for o in self.processable_objects + self.drawable_objects:
+            d = o.get_next_deadline(current_time)
+            if d is not None and (deadline is None or d < deadline):
+                deadline = d
+        return deadline
+
     def process_resize(self):
-        self._layout.process_resize()
-        self._recent_resize = True
-        self._resize_draw_frame_counter = 0
+        """Handle a terminal resize. The layout is rebuilt once the size has settled (see resize_settle_time)."""
+        self._resize_time = self._clock.time()
+        if self._resize_settle_time > 0:
+            self._draw_resize_placeholder()
+
+    def get_window(self):
+        return self._stdscr
+
+    def get_layout(self):
+        return self._layout
+
+    def get_resize_pending(self):
+        """Whether or not the terminal was resized and the layout has not been rebuilt for the new size yet"""
+        return self._resize_time is not None
+
+    def _relayout(self):
+        self._resize_time = None
+        erased = self._resize_erased
+        self._resize_erased = False
+        self._h, self._w = self._stdscr.getmaxyx()
+        for d in self.drawable_objects:
+            if getattr(d, 'fit_to_window', None) is not None and d.get_screen() is self:
+                # The pane that runs this screen (a top level Screen_Pane) fits its windows, and then the layout
+                d.fit_to_window(erased=erased)
+                d.needs_drawing(reason='resize')
+                break
+        else:
+            self._layout.process_resize(erased=erased)
+
+    def _draw_resize_placeholder(self):
+        # The panes' windows still have the old size, so only the new size is shown until the layout is rebuilt
+        h, w = self._stdscr.getmaxyx()
+        text = f'{w} x {h}'[0:max(w - 1, 0)]
+        self._resize_erased = True
+        try:
+            self._stdscr.erase()
+            self._stdscr.addstr(h // 2, max((w - len(text)) // 2, 0), text)
+        except curses.error:
+            pass
+        core.present(self._stdscr)
+        if core.get_batched_output() and not self._is_sub_screen:
+            curses.doupdate()
+
+    def post(self, func, *args, coalesce_key=None, **kwargs):
+        """Run func(*args, **kwargs) on the UI thread during the next frame. Safe to call from any thread:
+            screen.post(notification_box.notify, 'Build finished', coalesce_key='build status')
+        Calls with the same coalesce_key replace each other until they run (see core.Update_Queue).
+        """
+        core.post(func, *args, coalesce_key=coalesce_key, **kwargs)
+
+    def set_profiler(self, profiler):
+        """Record the time spent processing, drawing and handling input with a profiling.Frame_Profiler (None stops)"""
+        self._profiler = profiler
+        for d in self.drawable_objects:
+            if hasattr(d, 'set_profiler') and d.get_screen() is not self:
+                d.set_profiler(profiler)
+
+    def get_profiler(self):
+        return self._profiler
 
     def key_input(self, ie):
+        if self._profiler is not None:
+            return self._profiler.call(self, 'key_input', self._key_input, ie)
+        return self._key_input(ie)
+
+    def _key_input(self, ie):
         tmp_ie = ie
+        profiler = self._profiler
         if ie.key == curses.KEY_RESIZE:
-            #TODO: Implement resize code
             self.process_resize()
         else:
-            for p in self.processable_objects:
-                tmp_ie = p.key_input(tmp_ie)
-            for d in self.drawable_objects:
-                tmp_ie = d.key_input(tmp_ie)
-            
+            # A pane taking typed text gets keys first, so they don't trigger hotkeys or focus keys
+            text_input = self._get_text_input_object()
+            if text_input is not None:
+                tmp_ie = text_input.key_input(tmp_ie) if profiler is None else profiler.call(text_input, 'key_input', text_input.key_input, tmp_ie)
+                if tmp_ie.key is None:
+                    return tmp_ie
+            # Bound keys (focus keys, menu hotkeys and pane key bindings) are resolved with one lookup
+            keymap = self._layout.get_keymap()
+            tmp_ie = keymap.dispatch(tmp_ie)
+            if tmp_ie.key is None:
+                return tmp_ie
+            if self._focused_key_input:
+                # Any other key goes to the focused pane, then to the objects that asked for every key (see
+                # core.Processable.RECEIVES_ALL_KEYS), and then to the tab chain
+                focused = self._layout.get_focus_manager().get_focused()
+                if focused is not None and focused is not text_input:
+                    tmp_ie = focused.key_input(tmp_ie) if profiler is None else profiler.call(focused, 'key_input', focused.key_input, tmp_ie)
+                    if tmp_ie.key is None:
+                        return tmp_ie
+                tmp_ie = keymap.dispatch_any(tmp_ie, skip=focused)
+                if tmp_ie.key is None:
+                    return tmp_ie
+            else:
+                for p in self.processable_objects:
+                    tmp_ie = p.key_input(tmp_ie) if profiler is None else profiler.call(p, 'key_input', p.key_input, tmp_ie)
+                for d in self.drawable_objects:
+                    tmp_ie = d.key_input(tmp_ie) if profiler is None else profiler.call(d, 'key_input', d.key_input, tmp_ie)
+
             tmp_ie = self._layout.key_input(tmp_ie)
 
         return tmp_ie
@@ -503,28 +1076,49 @@ class Screen(object):
             d.needs_drawing()
 
     def process(self, current_time):
+        if self._profiler is not None:
+            return self._profiler.call(self, 'process', self._process, current_time)
+        return self._process(current_time)
+
+    def _process(self, current_time):
+        if not self._is_sub_screen:
+            # Hand the results of finished background tasks to their panes
+            tasks.deliver_completed()
+
+        profiler = self._profiler
         for p in self.processable_objects:
-            p.process(current_time)
+            if profiler is None:
+                p.process(current_time)
+            else:
+                profiler.call(p, 'process', p.process, current_time)
         for d in self.drawable_objects:
-            d.process(current_time)
+            if profiler is None:
+                d.process(current_time)
+            else:
+                profiler.call(d, 'process', d.process, current_time)
         self._last_process_time = current_time
 
     def draw(self, time=None):
-        if self._recent_resize is True:
-            self._resize_draw_frame_counter = self._resize_draw_frame_counter + 1
-            if self._resize_draw_frame_counter > 10:
-                for d in self.drawable_objects:
-                    if isinstance(d, core.Pane):
-                        d.needs_drawing()
-                self._resize_draw_frame_counter = 0
-                self._recent_resize = False
-            else:
-                self._last_draw_time = time
-                return
+        if self._profiler is not None:
+            return self._profiler.call(self, 'draw', self._draw, time)
+        return self._draw(time)
+
+    def _draw(self, time=None):
+        if self._resize_time is not None:
+            self._last_draw_time = time
+            return
 
+        profiler = self._profiler
         for d in self.drawable_objects:
             if not d.get_awaiting_window_update():
-                d.draw()
+                if profiler is None:
+                    d.draw()
+                else:
+                    profiler.call(d, 'draw', d.draw)
+
+        if core.get_batched_output() and not self._is_sub_screen:
+            # Push every change staged by the panes this frame to the terminal at once
+            curses.doupdate()
 
         self._last_draw_time = time
 
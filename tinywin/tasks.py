@@ -0,0 +1,140 @@
+import queue
+import logging
+import threading
+import concurrent.futures
+
+
+class Task_Pool(object):
+    """Task Pool
+
+    Runs blocking work (shelling out, database queries, parsing files) on a thread or process pool, and hands the
+    results back to the UI thread. Results are only delivered when deliver_completed is called, which the top level
+    Screen does at the start of every process step, so callbacks can safely change pane state.
+
+    Panes normally use Pane.submit_task, which submits to the shared pools from get_pool.
+
+    Named Arguments:
+        max_workers:   The number of worker threads or processes [executor default]
+        use_processes: Use a ProcessPoolExecutor instead of threads. Functions, arguments and results must be
+                       picklable. [False]
+
+    User Functions:
+        submit(owner, func, *args, callback=None, error_callback=None): Runs func(*args) on the pool
+        cancel(owner):        Cancels every task submitted for an owner. Results of running tasks are discarded.
+        deliver_completed():  Calls the callbacks of finished tasks. Must be called on the UI thread.
+        shutdown():           Cancels everything and stops the workers
+    """
+
+    def __init__(self, max_workers=None, use_processes=False):
+        self._max_workers = max_workers
+        self._use_processes = use_processes
+        self._executor = None
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._completed = queue.Queue()
+        self._logging = logging.getLogger('Task_Pool')
+
+    def _get_executor(self):
+        if self._executor is None:
+            if self._use_processes:
+                self._executor = concurrent.futures.ProcessPoolExecutor(max_workers=self._max_workers)
+            else:
+                self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix='tinywin-task')
+        return self._executor
+
+    def submit(self, owner, func, *args, callback=None, error_callback=None):
+        # core imports this module, so it is imported here rather than at the top
+        from tinywin import core
+        future = self._get_executor().submit(func, *args)
+        with self._lock:
+            self._pending.setdefault(owner, set()).add(future)
+
+        def done(future):
+            # Runs on a worker thread, so the result is only queued here
+            self._completed.put((owner, future, callback, error_callback))
+            core.wake()
+
+        future.add_done_callback(done)
+        return future
+
+    def cancel(self, owner):
+        with self._lock:
+            futures = self._pending.pop(owner, set())
+        for f in futures:
+            f.cancel()
+
+    def get_pending_count(self, owner=None):
+        with self._lock:
+            if owner is not None:
+                return len(self._pending.get(owner, ()))
+            return sum(len(f) for f in self._pending.values())
+
+    def deliver_completed(self):
+        delivered = 0
+        while True:
+            try:
+                owner, future, callback, error_callback = self._completed.get_nowait()
+            except queue.Empty:
+                return delivered
+
+            with self._lock:
+                futures = self._pending.get(owner)
+                if futures is None or future not in futures:
+                    # The owner cancelled its tasks after this one finished
+                    continue
+                futures.discard(future)
+                if len(futures) == 0:
+                    del self._pending[owner]
+
+            if future.cancelled():
+                continue
+            error = future.exception()
+            if error is not None:
+                if error_callback is not None:
+                    error_callback(error)
+                else:
+                    self._logging.error('task failed: %s', owner, exc_info=error)
+            elif callback is not None:
+                callback(future.result())
+            delivered = delivered + 1
+            if hasattr(owner, 'needs_drawing'):
+                owner.needs_drawing(reason='task finished')
+
+    def shutdown(self, wait=False):
+        with self._lock:
+            owners = list(self._pending.keys())
+        # Every submitted future belongs to an owner, so cancelling the owners cancels everything that hasn't started
+        for owner in owners:
+            self.cancel(owner)
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+
+_thread_pool = None
+_process_pool = None
+
+def get_pool(use_processes=False):
+    """Get the shared thread (or process) Task_Pool, creating it the first time it is used"""
+    global _thread_pool, _process_pool
+    if use_processes:
+        if _process_pool is None:
+            _process_pool = Task_Pool(use_processes=True)
+        return _process_pool
+    if _thread_pool is None:
+        _thread_pool = Task_Pool()
+    return _thread_pool
+
+def deliver_completed():
+    """Deliver the finished tasks of the shared pools. Called by the top level Screen on every process step."""
+    delivered = 0
+    for pool in (_thread_pool, _process_pool):
+        if pool is not None:
+            delivered = delivered + pool.deliver_completed()
+    return delivered
+
+def cancel(owner):
+    """Cancel the tasks an owner submitted to the shared pools"""
+    for pool in (_thread_pool, _process_pool):
+        if pool is not None:
+            pool.cancel(owner)
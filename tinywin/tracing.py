@@ -0,0 +1,85 @@
+import sys
+import time
+import queue
+import logging
+import logging.handlers
+import collections
+
+# Framework tracing (debug logging and draw reasons) is off unless enabled. Hot paths check this flag before
+# building any message, so disabled tracing costs a single attribute lookup:
+#     if tracing.enabled:
+#         self._logging.debug('assign_win: %s %s', self, win)
+enabled = False
+
+DEFAULT_CAPACITY = 1000
+
+_draw_reasons = collections.deque(maxlen=DEFAULT_CAPACITY)
+_listener = None
+_handler = None
+
+
+def enable(capacity=DEFAULT_CAPACITY):
+    """Turn on framework tracing, keeping the last `capacity` draws and their reasons"""
+    global enabled, _draw_reasons
+    if capacity != _draw_reasons.maxlen:
+        _draw_reasons = collections.deque(_draw_reasons, maxlen=capacity)
+    enabled = True
+
+def disable():
+    """Turn off framework tracing. Draws already recorded are kept until cleared."""
+    global enabled
+    enabled = False
+
+def record_draw(obj, reasons, logger=None):
+    """Record that an object was drawn, and why. Only call this while tracing is enabled."""
+    _draw_reasons.append((time.time(), obj, tuple(reasons)))
+    if logger is not None and logger.isEnabledFor(logging.DEBUG):
+        if len(reasons) == 0:
+            logger.debug('refresh: %s | no reasons given', obj)
+        else:
+            logger.debug('refresh: %s | reasons: %s', obj, '; '.join(reasons))
+
+def get_draw_reasons():
+    """Get the recorded draws, oldest first, as (time, object, reasons) tuples"""
+    return list(_draw_reasons)
+
+def clear_draw_reasons():
+    _draw_reasons.clear()
+
+def dump_draw_reasons(file=None):
+    """Write the recorded draws, oldest first, to a file (stderr by default)"""
+    if file is None:
+        file = sys.stderr
+    for t, obj, reasons in list(_draw_reasons):
+        file.write(f'{t:.6f} {obj} | {"; ".join(reasons) if len(reasons) > 0 else "no reasons given"}\n')
+
+def start_file_logging(filename='tinywin.log', level=logging.INFO, format='%(asctime)-15s %(levelname)s %(message)s'):
+    """Send log records to a file from a background thread, so a slow disk never stalls a frame.
+
+    Records are put on a queue by the root logger and written by a logging.handlers.QueueListener. Does nothing
+    if the root logger already has handlers (like logging.basicConfig), or if file logging is already running.
+    """
+    global _listener, _handler
+    root = logging.getLogger()
+    if _listener is not None or len(root.handlers) > 0:
+        return
+    file_handler = logging.FileHandler(filename)
+    file_handler.setFormatter(logging.Formatter(format))
+    log_queue = queue.Queue()
+    _handler = logging.handlers.QueueHandler(log_queue)
+    _listener = logging.handlers.QueueListener(log_queue, file_handler)
+    root.addHandler(_handler)
+    root.setLevel(level)
+    _listener.start()
+
+def stop_file_logging():
+    """Write any queued log records, and stop the background file logging started by start_file_logging"""
+    global _listener, _handler
+    if _listener is None:
+        return
+    logging.getLogger().removeHandler(_handler)
+    _listener.stop()
+    for h in _listener.handlers:
+        h.close()
+    _listener = None
+    _handler = None